@@ -0,0 +1,172 @@
+# admission.py
+"""
+Admission control and load shedding for the chat API.
+
+The controller sits in front of the /api view and decides, before any JSON
+parsing or NLP work happens, whether a request may run now, may wait briefly
+in a bounded queue, or must be shed with a cheap 503 response.
+
+The concurrency limit adapts with AIMD (additive increase, multiplicative
+decrease): every fully used window of fast requests raises the limit by one,
+while a request that exceeds the latency target (or fails) cuts it by a
+constant factor, at most once per cooldown period.
+"""
+import threading
+import time
+from functools import wraps
+from typing import Any, Callable, Dict
+
+from flask import Response
+
+from config import (
+    ADMISSION_INITIAL_LIMIT,
+    ADMISSION_MIN_LIMIT,
+    ADMISSION_MAX_LIMIT,
+    ADMISSION_MAX_QUEUE,
+    ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    ADMISSION_LATENCY_TARGET_SECONDS,
+    ADMISSION_DECREASE_FACTOR,
+)
+
+# Pre-rendered shed response: no serialization work while overloaded.
+SHED_BODY = (
+    '{"error": "Server busy", '
+    '"response": "We are receiving a lot of messages right now. '
+    'Please try again in a moment."}'
+)
+
+
+class AdmissionController:
+    """
+    Adaptive concurrency limiter with a bounded wait queue.
+    """
+    def __init__(self,
+                 initial_limit: int = ADMISSION_INITIAL_LIMIT,
+                 min_limit: int = ADMISSION_MIN_LIMIT,
+                 max_limit: int = ADMISSION_MAX_LIMIT,
+                 max_queue: int = ADMISSION_MAX_QUEUE,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT_SECONDS,
+                 latency_target: float = ADMISSION_LATENCY_TARGET_SECONDS,
+                 decrease_factor: float = ADMISSION_DECREASE_FACTOR):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self._queued = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+        # Counters exposed through snapshot()
+        self.admitted = 0
+        self.shed = 0
+        self.completed = 0
+        self.slow = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.latency_ewma = 0.0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def acquire(self) -> bool:
+        """
+        Try to take a concurrency slot. Returns False if the request must be shed.
+        """
+        with self._cond:
+            if self._in_flight < self.limit:
+                self._in_flight += 1
+                self.admitted += 1
+                return True
+            if self._queued >= self.max_queue:
+                self.shed += 1
+                return False
+
+            self._queued += 1
+            start = time.monotonic()
+            deadline = start + self.queue_timeout
+            try:
+                while self._in_flight >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.shed += 1
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self._queued -= 1
+
+            waited = time.monotonic() - start
+            self.queue_wait_total += waited
+            self.queue_wait_max = max(self.queue_wait_max, waited)
+            self._in_flight += 1
+            self.admitted += 1
+            return True
+
+    def release(self, latency: float, ok: bool = True):
+        """
+        Return a slot and feed the observed latency into the AIMD limit.
+        """
+        with self._cond:
+            self._in_flight -= 1
+            self.completed += 1
+            self.latency_ewma = latency if self.completed == 1 else (
+                0.9 * self.latency_ewma + 0.1 * latency
+            )
+
+            now = time.monotonic()
+            if not ok or latency > self.latency_target:
+                self.slow += 1
+                # One cut per cooldown so a burst of slow requests doesn't collapse the limit.
+                if now - self._last_decrease >= self.latency_target:
+                    self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+                    self._last_decrease = now
+            elif self._in_flight + 1 >= self.limit:
+                # Only grow when the current limit is actually being used.
+                self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+
+            self._cond.notify()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'limit': self.limit,
+                'in_flight': self._in_flight,
+                'queued': self._queued,
+                'admitted': self.admitted,
+                'shed': self.shed,
+                'completed': self.completed,
+                'slow': self.slow,
+                'queue_wait_avg_ms': round(
+                    1000 * self.queue_wait_total / self.admitted, 3) if self.admitted else 0.0,
+                'queue_wait_max_ms': round(1000 * self.queue_wait_max, 3),
+                'latency_ewma_ms': round(1000 * self.latency_ewma, 3),
+            }
+
+    def guard(self, view: Callable) -> Callable:
+        """
+        Decorator for Flask views: shed before the view body runs.
+        """
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not self.acquire():
+                return Response(SHED_BODY, status=503, mimetype='application/json',
+                                headers={'Retry-After': '1'})
+            start = time.monotonic()
+            ok = False
+            try:
+                result = view(*args, **kwargs)
+                status = result[1] if isinstance(result, tuple) else getattr(result, 'status_code', 200)
+                ok = status < 500
+                return result
+            finally:
+                self.release(time.monotonic() - start, ok)
+        return wrapper
+
+
+# Create a single global instance to be imported by other modules
+admission_controller = AdmissionController()
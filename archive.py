@@ -0,0 +1,279 @@
+# archive.py
+"""
+Columnar, memory-mapped archive of aged conversation turns.
+
+ContextManager keeps only the most recent turns of each conversation in
+memory; older ones are appended here. Each column lives in its own file so a
+query maps only the columns it needs:
+
+    ts.f8       float64  unix timestamp of the turn
+    user.u4     uint32   interned user id       (users.txt holds the names)
+    intent.u2   uint16   interned intent code   (intents.txt holds the names)
+    offset.u8   uint64   start of the message in text.blob
+    length.u4   uint32   length of the message in bytes
+
+Files are append-only. Readers use np.memmap and only trust the number of rows
+present in every column, so a reader never sees a half-written turn.
+"""
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from config import HISTORY_ARCHIVE_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development server only
+    fcntl = None
+
+COLUMNS = {
+    'ts': np.dtype('<f8'),
+    'user': np.dtype('<u4'),
+    'intent': np.dtype('<u2'),
+    'offset': np.dtype('<u8'),
+    'length': np.dtype('<u4'),
+}
+_FILE_NAMES = {'ts': 'ts.f8', 'user': 'user.u4', 'intent': 'intent.u2',
+               'offset': 'offset.u8', 'length': 'length.u4'}
+
+
+class _InternTable:
+    """
+    Append-only string <-> integer code table persisted one name per line.
+    Several worker processes may append to the same table, so refresh() picks
+    up names written by others (callers hold the archive file lock).
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.names: List[str] = []
+        self.codes: Dict[str, int] = {}
+        self._read_pos = 0
+        self.refresh()
+
+    def refresh(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as fh:
+            fh.seek(self._read_pos)
+            data = fh.read()
+        complete = data[:data.rfind(b'\n') + 1]
+        self._read_pos += len(complete)
+        # Only '\n' ends a line: str.splitlines() also splits on '\r', '\x1c'-'\x1e',
+        # '\x85', '\u2028' and others, which intern() keeps, shifting every later code.
+        for line in complete.decode('utf-8').split('\n')[:-1]:
+            self._add(line)
+
+    def _add(self, name: str) -> int:
+        code = len(self.names)
+        self.names.append(name)
+        self.codes[name] = code
+        return code
+
+    def intern(self, name: str) -> int:
+        code = self.codes.get(name)
+        if code is None:
+            # Codes are line numbers, so strip anything that would break the file format.
+            name = name.replace('\n', ' ')
+            code = self.codes.get(name)
+            if code is None:
+                code = self._add(name)
+                line = (name + '\n').encode('utf-8')
+                with open(self.path, 'ab') as fh:
+                    fh.write(line)
+                self._read_pos += len(line)
+        return code
+
+
+class HistoryArchive:
+    """
+    Append-only columnar store of conversation turns with vectorized queries.
+    """
+    def __init__(self, directory: str = HISTORY_ARCHIVE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._users: Optional[_InternTable] = None
+        self._intents: Optional[_InternTable] = None
+        self._maps: Dict[str, np.ndarray] = {}
+        self._mapped_rows = -1
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _open_tables(self):
+        if self._users is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._users = _InternTable(self._path('users.txt'))
+            self._intents = _InternTable(self._path('intents.txt'))
+        else:
+            self._users.refresh()
+            self._intents.refresh()
+
+    @contextmanager
+    def _file_lock(self):
+        # Serializes appends across gunicorn workers sharing the directory.
+        with open(self._path('.lock'), 'a') as fh:
+            if fcntl:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    def append(self, user_id: str, turns: Iterable[Dict[str, Any]]) -> int:
+        """
+        Append a user's turns ({'timestamp', 'message', 'intent'} dicts, as kept in
+        profile['conversation_history']). Returns the number of turns written.
+        """
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with self._file_lock():
+                return self._append_locked(user_id, turns)
+
+    def _append_locked(self, user_id: str, turns: Iterable[Dict[str, Any]]) -> int:
+        self._open_tables()
+        blob_path = self._path('text.blob')
+        offset = os.path.getsize(blob_path) if os.path.exists(blob_path) else 0
+        user_code = self._users.intern(user_id)
+
+        columns = {name: [] for name in COLUMNS}
+        chunks = []
+        for turn in turns:
+            text = str(turn.get('message', '')).encode('utf-8')
+            timestamp = turn.get('timestamp')
+            columns['ts'].append(timestamp.timestamp() if isinstance(timestamp, datetime)
+                                 else float(timestamp or 0))
+            columns['user'].append(user_code)
+            columns['intent'].append(self._intents.intern(str(turn.get('intent') or 'unknown')))
+            columns['offset'].append(offset)
+            columns['length'].append(len(text))
+            chunks.append(text)
+            offset += len(text)
+        if not chunks:
+            return 0
+
+        # Text first, columns after: a row becomes visible only once all of it exists.
+        with open(blob_path, 'ab') as fh:
+            fh.write(b''.join(chunks))
+        for name, dtype in COLUMNS.items():
+            with open(self._path(_FILE_NAMES[name]), 'ab') as fh:
+                fh.write(np.asarray(columns[name], dtype=dtype).tobytes())
+        return len(chunks)
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+    def _rows_on_disk(self) -> int:
+        rows = None
+        for name, dtype in COLUMNS.items():
+            path = self._path(_FILE_NAMES[name])
+            count = os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0
+            rows = count if rows is None else min(rows, count)
+        return rows or 0
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """
+        Memory-mapped, read-only views of every column, trimmed to complete rows.
+        """
+        with self._lock:
+            self._open_tables()
+            rows = self._rows_on_disk()
+            if rows != self._mapped_rows:
+                self._maps = {
+                    name: (np.memmap(self._path(_FILE_NAMES[name]), dtype=dtype, mode='r', shape=(rows,))
+                           if rows else np.empty(0, dtype=dtype))
+                    for name, dtype in COLUMNS.items()
+                }
+                self._mapped_rows = rows
+            return self._maps
+
+    def __len__(self) -> int:
+        return len(self.columns()['ts'])
+
+    def _read_messages(self, rows: np.ndarray) -> List[str]:
+        cols = self.columns()
+        if not len(rows):
+            return []
+        blob = np.memmap(self._path('text.blob'), dtype=np.uint8, mode='r')
+        return [
+            bytes(blob[int(cols['offset'][i]):int(cols['offset'][i]) + int(cols['length'][i])]).decode('utf-8')
+            for i in rows
+        ]
+
+    def intent_counts_per_hour(self, since: Optional[float] = None,
+                               until: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Count turns per (hour, intent), optionally restricted to [since, until) timestamps.
+        """
+        cols = self.columns()
+        ts, intents = cols['ts'], cols['intent']
+        mask = np.ones(len(ts), dtype=bool)
+        if since is not None:
+            mask &= ts >= since
+        if until is not None:
+            mask &= ts < until
+        if not mask.any():
+            return []
+
+        hours = (ts[mask] // 3600).astype(np.int64)
+        n_intents = max(len(self._intents.names), 1)
+        keys, counts = np.unique(hours * n_intents + intents[mask], return_counts=True)
+        return [
+            {
+                'hour': datetime.fromtimestamp(int(key // n_intents) * 3600).isoformat(),
+                'intent': self._intents.names[int(key % n_intents)],
+                'count': int(count),
+            }
+            for key, count in zip(keys, counts)
+        ]
+
+    def last_messages(self, user_id: str, n: int = 10) -> List[Dict[str, Any]]:
+        """
+        The user's n most recent archived turns, oldest first.
+        """
+        cols = self.columns()
+        user_code = self._users.codes.get(user_id)
+        if user_code is None or n <= 0:
+            return []
+        rows = np.flatnonzero(cols['user'] == user_code)[-n:]
+        messages = self._read_messages(rows)
+        return [
+            {
+                'timestamp': datetime.fromtimestamp(float(cols['ts'][i])).isoformat(),
+                'intent': self._intents.names[int(cols['intent'][i])],
+                'message': message,
+            }
+            for i, message in zip(rows, messages)
+        ]
+
+    def messages_with_intent(self, intent: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Archived turns logged with an intent (e.g. 'fallback'), most recent last.
+        """
+        cols = self.columns()
+        intent_code = self._intents.codes.get(intent)
+        if intent_code is None:
+            return []
+        rows = np.flatnonzero(cols['intent'] == intent_code)
+        if limit is not None:
+            rows = rows[-limit:]
+        messages = self._read_messages(rows)
+        return [
+            {
+                'user': self._users.names[int(cols['user'][i])],
+                'timestamp': float(cols['ts'][i]),
+                'message': message,
+            }
+            for i, message in zip(rows, messages)
+        ]
+
+
+# Create a single global instance to be imported by other modules
+history_archive = HistoryArchive()
@@ -0,0 +1,328 @@
+# booking.py
+"""
+Booking-engine adapters and a guarded availability service.
+
+Handlers ask `booking_service.availability(check_in, check_out)` for the
+rooms free over a stay and their nightly rates. Behind it sits a
+BookingAdapter:
+
+- LocalBookingEngine: a SQLite inventory seeded from the current tenant's
+  HOTEL_INFO["rooms"] (BOOKING_ROOM_UNITS units per type), used until a real
+  engine is wired up;
+- HttpBookingEngine: a JSON availability endpoint reached through one pooled
+  urllib3 PoolManager with short timeouts and no retries.
+
+The service keeps the chat path cheap whatever the adapter does:
+
+- answers are cached per (check_in, check_out) for BOOKING_CACHE_TTL_SECONDS;
+- identical concurrent lookups share a single upstream call (single flight);
+- a circuit breaker stops calling an engine that keeps failing, and while it
+  is open the last cached answer (even if stale) or None is returned, so the
+  handler falls back to the booking link instead of waiting.
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from config import (
+    BOOKING_ENGINE_URL,
+    BOOKING_ROOM_UNITS,
+    BOOKING_POOL_SIZE,
+    BOOKING_TIMEOUT_SECONDS,
+    BOOKING_CACHE_TTL_SECONDS,
+    BOOKING_CACHE_SIZE,
+    BOOKING_BREAKER_FAILURES,
+    BOOKING_BREAKER_RESET_SECONDS,
+)
+from stay_parser import nightly_rate
+from tenants import current_tenant
+
+# {room_type: {'available': int, 'rate': float}}
+Availability = Dict[str, Dict[str, Any]]
+
+
+class BookingUnavailable(Exception):
+    """The booking engine could not answer (error, timeout or open circuit)."""
+
+
+class BookingAdapter:
+    """
+    Interface every booking engine implements. Dates are ISO 'YYYY-MM-DD'
+    strings; check_out is exclusive.
+    """
+    name = 'adapter'
+
+    def availability(self, check_in: str, check_out: str) -> Availability:
+        raise NotImplementedError
+
+
+class LocalBookingEngine(BookingAdapter):
+    """
+    In-process stand-in for the hotel's booking engine, backed by SQLite.
+    Without explicit rooms, each tenant's rooms are added the first time it
+    asks, and it only sees those.
+    """
+    name = 'local'
+
+    def __init__(self, rooms=None, units: int = BOOKING_ROOM_UNITS, path: str = ':memory:'):
+        self.units = units
+        self._rooms = rooms
+        self._seeded = set()    # tenant ids whose rooms are in the table
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS rooms (
+                room_type TEXT PRIMARY KEY, units INTEGER NOT NULL, rate REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS reservations (
+                id INTEGER PRIMARY KEY, room_type TEXT NOT NULL,
+                check_in TEXT NOT NULL, check_out TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS reservations_by_type ON reservations (room_type, check_in);
+        """)
+        if rooms is not None:
+            self._seed(rooms)
+
+    def _seed(self, rooms):
+        with self._db:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO rooms VALUES (?, ?, ?)",
+                [(room['type'], self.units, nightly_rate(room['price'])) for room in rooms]
+            )
+
+    def _room_types(self) -> Optional[set]:
+        # The current tenant's room types, added to the inventory on first use.
+        if self._rooms is not None:
+            return None
+        tenant = current_tenant()
+        rooms = tenant.hotel_info['rooms']
+        if tenant.id not in self._seeded:
+            with self._lock:
+                if tenant.id not in self._seeded:
+                    self._seed(rooms)
+                    self._seeded.add(tenant.id)
+        return {room['type'] for room in rooms}
+
+    def availability(self, check_in: str, check_out: str) -> Availability:
+        # Free units per type = units minus the busiest night of the stay.
+        query = """
+            WITH RECURSIVE nights(night) AS (
+                SELECT date(?1)
+                UNION ALL
+                SELECT date(night, '+1 day') FROM nights WHERE date(night, '+1 day') < date(?2)
+            ),
+            booked AS (
+                SELECT r.room_type, n.night, COUNT(*) AS taken
+                FROM nights n JOIN reservations r
+                  ON r.check_in <= n.night AND r.check_out > n.night
+                GROUP BY r.room_type, n.night
+            )
+            SELECT rooms.room_type, rooms.units - COALESCE(MAX(booked.taken), 0), rooms.rate
+            FROM rooms LEFT JOIN booked ON booked.room_type = rooms.room_type
+            GROUP BY rooms.room_type
+        """
+        room_types = self._room_types()
+        with self._lock:
+            rows = self._db.execute(query, (check_in, check_out)).fetchall()
+        return {room_type: {'available': max(free, 0), 'rate': rate} for room_type, free, rate in rows
+                if room_types is None or room_type in room_types}
+
+    def reserve(self, room_type: str, check_in: str, check_out: str) -> int:
+        """Hold one unit (local engine only; lets availability be exercised end to end)."""
+        self._room_types()
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "INSERT INTO reservations (room_type, check_in, check_out) VALUES (?, ?, ?)",
+                (room_type, check_in, check_out)
+            )
+        return cursor.lastrowid
+
+
+class HttpBookingEngine(BookingAdapter):
+    """
+    Remote engine exposing GET {base_url}/availability?check_in=&check_out=,
+    answering with the same {room_type: {'available', 'rate'}} JSON.
+    """
+    name = 'http'
+
+    def __init__(self, base_url: str, pool_size: int = BOOKING_POOL_SIZE,
+                 timeout: float = BOOKING_TIMEOUT_SECONDS):
+        import urllib3
+
+        self.base_url = base_url.rstrip('/')
+        # One pool per process: connections are reused across chat requests.
+        self._http = urllib3.PoolManager(
+            maxsize=pool_size, block=False, retries=False,
+            timeout=urllib3.Timeout(connect=timeout, read=timeout),
+        )
+
+    def availability(self, check_in: str, check_out: str) -> Availability:
+        response = self._http.request(
+            'GET', self.base_url + '/availability',
+            fields={'check_in': check_in, 'check_out': check_out},
+        )
+        if response.status != 200:
+            raise BookingUnavailable(f"booking engine answered HTTP {response.status}")
+        return json.loads(response.data)
+
+
+class CircuitBreaker:
+    """
+    closed -> (N consecutive failures) -> open -> (reset period) -> half-open,
+    where a single trial call decides between closed and open again.
+    """
+    def __init__(self, failures: int = BOOKING_BREAKER_FAILURES,
+                 reset_seconds: float = BOOKING_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failures
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = 'half-open'
+                return True
+            return False
+
+    def record(self, ok: bool):
+        with self._lock:
+            if ok:
+                self.state = 'closed'
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == 'half-open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[Availability] = None
+        self.error: Optional[BaseException] = None
+
+
+class BookingService:
+    """
+    Cached, coalesced and circuit-broken availability lookups over an adapter.
+    """
+    def __init__(self, adapter: BookingAdapter, ttl: float = BOOKING_CACHE_TTL_SECONDS,
+                 cache_size: int = BOOKING_CACHE_SIZE, breaker: CircuitBreaker = None):
+        self.adapter = adapter
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.breaker = breaker or CircuitBreaker()
+        self._lock = threading.Lock()
+        self._cache: 'OrderedDict[Tuple[str, str, str], Tuple[float, Availability]]' = OrderedDict()
+        self._flights: Dict[Tuple[str, str, str], _Flight] = {}
+
+        # Counters exposed through snapshot()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream_calls = 0
+        self.upstream_errors = 0
+        self.stale_served = 0
+        self.short_circuited = 0
+
+    def availability(self, check_in: str, check_out: str) -> Optional[Availability]:
+        """
+        Rooms free for the stay, or None when the engine cannot answer in time
+        and nothing is cached.
+        """
+        if not check_in or not check_out or check_out <= check_in:
+            return None
+        # Tenants have their own rooms, so they never share an answer.
+        key = (current_tenant().id, check_in, check_out)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and cached[0] > now:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            return flight.result if flight.error is None else self._stale(key)
+
+        try:
+            flight.result = self._fetch(key)
+        except BookingUnavailable as e:
+            flight.error = e
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result if flight.error is None else self._stale(key)
+
+    def _fetch(self, key: Tuple[str, str, str]) -> Availability:
+        if not self.breaker.allow():
+            self.short_circuited += 1
+            raise BookingUnavailable("circuit open")
+        self.upstream_calls += 1
+        try:
+            result = self.adapter.availability(*key[1:])
+        except Exception as e:
+            self.upstream_errors += 1
+            self.breaker.record(False)
+            raise BookingUnavailable(str(e)) from e
+        self.breaker.record(True)
+        with self._lock:
+            self._cache[key] = (time.monotonic() + self.ttl, result)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def _stale(self, key: Tuple[str, str, str]) -> Optional[Availability]:
+        with self._lock:
+            cached = self._cache.get(key)
+        if cached:
+            self.stale_served += 1
+            return cached[1]
+        return None
+
+    def invalidate(self):
+        with self._lock:
+            self._cache.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            cached = len(self._cache)
+            in_flight = len(self._flights)
+        return {
+            'adapter': self.adapter.name,
+            'cached_ranges': cached,
+            'in_flight': in_flight,
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'upstream_calls': self.upstream_calls,
+            'upstream_errors': self.upstream_errors,
+            'stale_served': self.stale_served,
+            'short_circuited': self.short_circuited,
+            'breaker': {'state': self.breaker.state, 'failures': self.breaker.failures},
+        }
+
+
+def create_adapter(url: str = BOOKING_ENGINE_URL) -> BookingAdapter:
+    return HttpBookingEngine(url) if url else LocalBookingEngine()
+
+
+# Create a single global instance to be imported by other modules
+booking_service = BookingService(create_adapter())
@@ -6,10 +6,15 @@ templates to provide intelligent, context-aware replies for user interactions.
 """
 
 import random
-from config import RESPONSES, HOTEL_INFO
+from typing import List, Optional
+from config import FAQ_ENABLED, DIALOG_INTENT_TOKENS, DIALOG_TYPED_INTENTS, DIALOG_LIVE_CHAT_PHRASES
 from context import context_manager
-from nlp import nlp_processor
-from handlers import handle_fallback
+from dialog import ANY, NORMAL, UNKNOWN, DialogMachine
+from request_watchdog import request_watchdog
+from tenants import RESPONSES, HOTEL_INFO, nlp_processor, intent_handler, current_tenant
+from handlers import handle_booking, handle_fallback, handle_help, handle_rooms, is_room_followup
+from escalation import escalation_outbox, escalation_reply
+from normalize import NORMALIZERS, normalizer_for, tokenize
 
 
 def handle_language_selection(user_id: str, message: str) -> str:
@@ -28,57 +33,134 @@ def handle_language_selection(user_id: str, message: str) -> str:
     Returns:
         str: A greeting in the selected language or a prompt for language selection.
     """
-    profile = context_manager.get_user_profile(user_id)
     msg = message.strip().lower()
 
     if msg in ['en', 'english', '1']:
-        profile.update({'preferred_language': 'en', 'state': 'normal'})
+        context_manager.update_profile(user_id, {'preferred_language': 'en', 'state': 'normal'})
         return random.choice(RESPONSES['en']['greetings'])
     elif msg in ['so', 'somali', 'soomaali', '2']:
-        profile.update({'preferred_language': 'so', 'state': 'normal'})
+        context_manager.update_profile(user_id, {'preferred_language': 'so', 'state': 'normal'})
         return random.choice(RESPONSES['so']['greetings'])
     else:
         # If the language cannot be determined, prompt the user with the default language selection message.
         return RESPONSES['en']['language_prompt']
 
+def _logged(user_id: str, message: str, intent: str, reply: str) -> str:
+    """Record the turn in the user's conversation history and return the reply unchanged."""
+    request_watchdog.mark('handler')
+    context_manager.log_interaction(user_id, message, intent)
+    request_watchdog.mark('log')
+    return reply
+
+# --------------------------
+# Dialog Transitions
+# --------------------------
+
+def _greet(message: str, user_id: str, lang: str) -> str:
+    return random.choice(RESPONSES[lang]["greetings"])
+
+def _location(message: str, user_id: str, lang: str) -> str:
+    return f"{HOTEL_INFO['name']} is located at {HOTEL_INFO['address']}."
+
+def _live_chat(message: str, user_id: str, lang: str) -> str:
+    # The desk is notified in the background (see escalation.py)
+    escalation_outbox.escalate(user_id, lang, "live_chat", message)
+    return escalation_reply("live_chat")
+
+def _faq(message: str, user_id: str, lang: str) -> Optional[str]:
+    # Questions about policies, services and terms: the best-matching passage (see faq.py)
+    if not FAQ_ENABLED:
+        return None
+    answer = current_tenant().faq.answer(message, lang)
+    request_watchdog.mark('faq')
+    return answer
+
+def _fallback(message: str, user_id: str, lang: str) -> str:
+    return handle_fallback(user_id, lang, message)
+
+def _asks_for_person(message: str, user_id: str) -> bool:
+    text = message.lower()
+    return any(phrase in text for phrase in DIALOG_LIVE_CHAT_PHRASES)
+
+def build_dialog() -> DialogMachine:
+    """
+    The conversation's states and transitions (see dialog.py). Multi-turn
+    flow: a room question moves the guest to 'rooms', a price or stay
+    follow-up to 'quoted', and from either a "yes" or a booking request
+    books the remembered room and stay.
+    """
+    machine = DialogMachine()
+    machine.capture('awaiting_language', lambda message, user_id, lang: handle_language_selection(user_id, message),
+                    topic="language_selection")
+
+    # Room questions are recognised from entities, before the (costlier) synonym expansion.
+    machine.add_detector("rooms", lambda message, user_id: bool(nlp_processor.match_room_types(message)),
+                         before_nlp=True)
+    machine.add_detector("price", is_room_followup, before_nlp=True)
+    for intent, tokens in DIALOG_INTENT_TOKENS.items():
+        # Typed intents are also matched on the message's normalized words, spelled
+        # as each language's normalizer spells them (normalize_so: "haa" -> "ha").
+        typed = [normalize(token) for normalize in NORMALIZERS.values() for token in tokens] \
+            if intent in DIALOG_TYPED_INTENTS else []
+        machine.add_intent(intent, tokens, typed=dict.fromkeys(typed))
+    machine.add_detector("live_chat", _asks_for_person)
+
+    machine.add_transition(ANY, "rooms", lambda message, user_id, lang: handle_rooms(message, user_id, lang),
+                           next_state='rooms')
+    machine.add_transition(ANY, "price", lambda message, user_id, lang: handle_rooms(message, user_id, lang),
+                           next_state='quoted', topic="rooms")
+    machine.add_transition(ANY, "greetings", _greet, next_state=NORMAL)
+    machine.add_transition(ANY, "booking", handle_booking, next_state='booking')
+    machine.add_transition(ANY, "location", _location, next_state=NORMAL)
+    machine.add_transition(ANY, "live_chat", _live_chat, next_state=NORMAL)
+    machine.add_transition(ANY, "help", handle_help)
+    machine.add_transition(ANY, UNKNOWN, _faq, topic="faq")
+    machine.add_transition(ANY, UNKNOWN, _fallback, topic="fallback")
+
+    for state in ('rooms', 'quoted'):
+        machine.add_transition(state, "affirm", handle_booking, next_state='booking', topic="booking")
+    machine.add_state('booking')
+    return machine
+
+# Compiled on first use (or by warm-up, see preload.py)
+dialog = build_dialog()
+
 def generate_response(user_id: str, message: str) -> str:
     """
-    Generate a context-aware response based on the user's input and profile.
+    Generate a context-aware response based on the user's input and profile:
+    the dialog machine picks the transition for the user's state and the
+    message's intent.
     """
 
     profile = context_manager.get_user_profile(user_id)
-    
+    request_watchdog.mark('profile')
+
     # Prompt for language selection if the user's preference is not set or they are in a pending state.
-    if profile.get('preferred_language') is None or profile.get('state') == 'awaiting_language':
-        return handle_language_selection(user_id, message)
+    if profile.get('preferred_language') is None:
+        state = 'awaiting_language'
+    else:
+        state = profile.get('state') or NORMAL
 
     # Retrieve the user's preferred language; default to English if somehow unset.
-    lang = profile.get('preferred_language', 'en')
-
-    # Use NLP to process the input message.
-    expanded_tokens = nlp_processor.expand_to_canonical_fuzzy(message)
-    token_set = set(expanded_tokens)
-    # Handle greetings
-    if "greetings" in token_set:
-        return random.choice(RESPONSES[lang]["greetings"])
-
-    # Handle room bookings
-    if "book" in token_set or "room" in token_set:
-        return (
-            "For room reservations, please visit our online booking portal: "
-            "<a href='https://live.ipms247.com/booking/book-rooms-jeeshotel' "
-        )
-
-    # Handle location inquiries
-    if "location" in token_set:
-        return f"Jees Hotel is located at {HOTEL_INFO['address']}."
-
-    # Handle live chat
-    if "live chat" in message.lower() or "support" in message.lower():
-        return (
-            "You can talk to a live agent now! "
-            "<a href='https://wa.me/2526347470907'>Click here to chat on WhatsApp</a>"
-        )
-
-    # For any other inputs, use the fallback mechanism.
-    return handle_fallback(user_id, lang)
+    lang = profile.get('preferred_language') or 'en'
+
+    def expand(text: str) -> List[str]:
+        request_watchdog.mark('room_match')
+        tokens = nlp_processor.expand_to_canonical_fuzzy(text, lang)
+        request_watchdog.mark('expand')
+        return tokens
+
+    def words(text: str) -> List[str]:
+        return tokenize(normalizer_for(lang)(text))
+
+    def match_patterns(tokens: List[str]) -> Optional[str]:
+        # The tenant's registered intents (handlers.py), with their context requirements
+        handler = intent_handler.match_tokens(tokens, context_manager.get_context(user_id))
+        return handler['name'] if handler else None
+
+    topic, reply, next_state = dialog.respond(
+        state, message, user_id, lang,
+        lambda: dialog.classify(message, user_id, expand, match_patterns, words))
+    if next_state and next_state != state:
+        context_manager.update_profile(user_id, {'state': next_state})
+    return _logged(user_id, message, topic, reply)
@@ -0,0 +1,87 @@
+# check_import_time.py
+"""
+Import-time budget for the web entry point.
+
+Imports the app in a fresh interpreter with `python -X importtime`, parses the
+per-module timings it prints to stderr and fails (exit status 1) when:
+
+- importing the module takes longer than IMPORT_TIME_BUDGET_MS, or
+- any of IMPORT_FORBIDDEN_MODULES (spaCy, setuptools) was imported: those
+  belong to warm-up or the first request, not to starting a worker. Entries
+  are dotted names matching the module and its submodules, so "spacy" also
+  catches "spacy.lang.en" and "numpy.linalg" only that subpackage.
+
+The slowest imports are listed either way, so a regression points at its cause.
+Run it in CI next to the smoke tests:
+
+    python check_import_time.py
+    python check_import_time.py --module jees_hotel_bot --budget-ms 300 --top 15
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+from config import IMPORT_TIME_BUDGET_MS, IMPORT_FORBIDDEN_MODULES
+
+# import time: self [us] | cumulative | imported package
+_LINE = re.compile(r"^import time:\s+(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)\s*$")
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """(module, self µs, cumulative µs, nesting depth) per line of -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return rows
+
+
+def measure(module: str) -> List[Tuple[str, int, int, int]]:
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, env=env,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        raise SystemExit(f"importing {module} failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def check(module: str, budget_ms: float, forbidden: List[str], top: int) -> bool:
+    rows = measure(module)
+    cumulative: Dict[str, int] = {name: total for name, _, total, _ in rows}
+    total_ms = cumulative.get(module, 0) / 1000.0
+    imported = [name for name, _, _, _ in rows]
+    offenders = [name for name in forbidden
+                 if any(module == name or module.startswith(name + '.') for module in imported)]
+
+    print(f"import {module}: {total_ms:.1f} ms (budget {budget_ms:.0f} ms)")
+    print("slowest modules (self time):")
+    for name, self_us, total_us, _ in sorted(rows, key=lambda row: -row[1])[:top]:
+        print(f"  {self_us / 1000.0:8.1f} ms  (cumulative {total_us / 1000.0:8.1f} ms)  {name}")
+    ok = True
+    if total_ms > budget_ms:
+        print(f"FAIL: import took {total_ms:.1f} ms, over the {budget_ms:.0f} ms budget")
+        ok = False
+    if offenders:
+        print(f"FAIL: imported at startup: {', '.join(offenders)}")
+        ok = False
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail when importing the web app is too slow")
+    parser.add_argument('--module', default='jees_hotel_bot')
+    parser.add_argument('--budget-ms', type=float, default=IMPORT_TIME_BUDGET_MS)
+    parser.add_argument('--forbid', nargs='*', default=IMPORT_FORBIDDEN_MODULES)
+    parser.add_argument('--top', type=int, default=10, help="slowest modules to list")
+    args = parser.parse_args()
+    sys.exit(0 if check(args.module, args.budget_ms, args.forbid, args.top) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,8 @@
 # Please ensure that any modifications to these settings are thoroughly tested
 # in a development environment prior to deployment.
 
+import os
+
 # -----------------------------------------------------------------------------
 # HOTEL GENERAL INFORMATION
 # -----------------------------------------------------------------------------
@@ -190,6 +192,32 @@ RESPONSES = {
             "To proceed with a booking, please visit our online booking portal: [👉 Book Here](https://live.ipms247.com/booking/book-rooms-jeeshotel)."
         ),
         # ---------------------------------------------------------------------
+        # Stay Quotes (dates and nights parsed from the guest's message)
+        # ---------------------------------------------------------------------
+        "stay_quote": (
+            "A {room_type} for {nights} night(s){dates} comes to ${total:,.0f} ({price} x {nights})."
+        ),
+        "stay_dates": " from {check_in} to {check_out}",
+        "stay_room_list": (
+            "For {nights} night(s){dates}, our rooms come to:\n{room_list}\n\n"
+            "Let me know which room you would like more details about."
+        ),
+        "stay_available": "{available} {room_type} unit(s) are still free for those dates.",
+        "stay_sold_out": "Unfortunately the {room_type} is fully booked for those dates.",
+        "sold_out_label": "fully booked",
+        "booking_availability": (
+            "For {nights} night(s) from {check_in} to {check_out}, we have:\n{room_list}\n\n"
+            "To reserve, please visit our online booking portal: {booking_url}"
+        ),
+        "booking_sold_out": (
+            "Sorry, we are fully booked from {check_in} to {check_out}. "
+            "Please try other dates or call us on {phone}."
+        ),
+        "booking_portal": (
+            "For room reservations, please visit our online booking portal: "
+            "<a href='{booking_url}' target='_blank'>Book online</a>"
+        ),
+        # ---------------------------------------------------------------------
         # Amenities Information
         # ---------------------------------------------------------------------
         "amenities": (
@@ -353,6 +381,32 @@ RESPONSES = {
             "Haddii aad rabto inaad qolka qabsato, fadlan booqo boggayaga: [👉 Guji Halkan](https://live.ipms247.com/booking/book-rooms-jeeshotel)"
         ),
         # ---------------------------------------------------------------------
+        # Stay Quotes in Somali
+        # ---------------------------------------------------------------------
+        "stay_quote": (
+            "Qolka {room_type} muddo {nights} habeen{dates} wuxuu ku kacayaa ${total:,.0f} ({price} x {nights})."
+        ),
+        "stay_dates": " ({check_in} ilaa {check_out})",
+        "stay_room_list": (
+            "Muddo {nights} habeen{dates}, qiimaha qolalkayagu waa:\n{room_list}\n\n"
+            "Ii sheeg qolka aad rabto inaad wax badan ka ogaato."
+        ),
+        "stay_available": "Qolka {room_type} waxaa taariikhahaas bannaan {available}.",
+        "stay_sold_out": "Waan ka xunnahay, qolka {room_type} taariikhahaas waa buuxaa.",
+        "sold_out_label": "waa buuxaa",
+        "booking_availability": (
+            "Muddo {nights} habeen ({check_in} ilaa {check_out}), waxaa bannaan:\n{room_list}\n\n"
+            "Si aad u qabsato, fadlan booqo boggayaga: {booking_url}"
+        ),
+        "booking_sold_out": (
+            "Waan ka xunnahay, waan buuxnaa {check_in} ilaa {check_out}. "
+            "Fadlan isku day taariikho kale ama na soo wac {phone}."
+        ),
+        "booking_portal": (
+            "Si aad qol u qabsato, fadlan booqo boggayaga ballansashada: "
+            "<a href='{booking_url}' target='_blank'>Ballanso hadda</a>"
+        ),
+        # ---------------------------------------------------------------------
         # Amenities Information in Somali
         # ---------------------------------------------------------------------
         "amenities": (
@@ -435,15 +489,167 @@ DEBUG_MODE = True
 LOG_FILE_PATH = "logs/jees_hotel_chatbot.log"
 MAX_LOG_SIZE_MB = 5
 BACKUP_COUNT = 3
+LOG_TO_STDERR = True                      # Also write the JSON lines to stderr (the platform's log stream)
+LOG_QUEUE_SIZE = 10000                    # Records waiting for the writer thread; beyond this they are dropped
+LOG_BATCH_SIZE = 256                      # Lines per write() while the writer is catching up
+LOG_DEBUG_SAMPLE_RATE = 0.1               # Fraction of requests whose DEBUG lines are kept (DEBUG_MODE only)
+WATCHDOG_ENABLED = True                   # Flag /api requests slower than the threshold
+WATCHDOG_THRESHOLD_MS = 500               # Requests slower than this are captured (also via /admin/slow)
+WATCHDOG_POLL_MS = 50                     # How often in-flight requests are checked
+WATCHDOG_BUFFER_SIZE = 200                # Slow requests kept in memory for /admin/slow
+WATCHDOG_STACK_DEPTH = 30                 # Frames kept from the stack sampled at the threshold
 
 # -----------------------------------------------------------------------------
 # Application Behavior Settings
 # -----------------------------------------------------------------------------
 RESPONSE_TIMEOUT_SECONDS = 30     # Timeout duration for chatbot responses (in seconds)
 MAX_CHAT_HISTORY = 50             # Maximum number of messages stored per conversation
+HISTORY_ARCHIVE_DIR = "data/history_archive"  # Older turns are moved here (see archive.py)
+ENTITY_MEMORY_PER_KIND = 5        # Remembered room types/dates/numbers per session and kind
+FUZZY_GATE_ENABLED = True         # Skip WRatio for synonyms that provably cannot reach the threshold
+FUZZY_GATE_CACHE_SIZE = 4096      # Tokens whose gate decision is memoized per language
+FUZZY_SCORER = "WRatio"           # rapidfuzz scorer for fuzzy synonym matching (compare with fuzzy_tuning.py)
+FUZZY_THRESHOLD = 80              # Score a token needs to match a synonym
+FUZZY_LANGUAGE_SETTINGS = {}      # Per-language overrides, e.g. {"so": {"scorer": "QRatio", "threshold": 85}}
+API_MAX_MESSAGE_LENGTH = 2000            # Longer chat messages are rejected while decoding
+API_BATCH_MAX_MESSAGES = 10               # Messages accepted in one {"action": "batch"} request
 DEFAULT_LANGUAGE = "en"
 SUPPORTED_LANGUAGES = ["en", "so"]
 
+# Number of reverse proxies in front of the app whose X-Forwarded-For is trusted
+# (Heroku router, nginx, or the load-test harness). 0 = use the socket address.
+TRUSTED_PROXY_COUNT = int(os.environ.get("JEES_TRUSTED_PROXIES", 0))
+
+# -----------------------------------------------------------------------------
+# Session Store Settings
+# -----------------------------------------------------------------------------
+SESSION_STORE_PATH = os.environ.get("JEES_SESSION_STORE")  # SQLite file shared by all workers; unset = in-process
+SESSION_LOCAL_CACHE_SIZE = 2048           # Sessions each worker keeps in its local LRU
+SESSION_INVALIDATION_POLL_MS = 20         # How often a worker reads the invalidation log
+SESSION_INVALIDATION_KEEP = 10000         # Invalidation log entries kept before pruning
+SESSION_WRITE_RETRIES = 3                 # Write-through attempts when another worker wrote first
+
+# -----------------------------------------------------------------------------
+# Session Event Log Settings
+# -----------------------------------------------------------------------------
+EVENT_LOG_ENABLED = os.environ.get("JEES_EVENT_LOG", "0") == "1"  # Append every session change; off until retention is configurable
+EVENT_LOG_DIR = os.environ.get("JEES_EVENT_LOG_DIR", "data/events")  # Segments and snapshots
+EVENT_COMPACT_EVERY = 100000              # Appends (per worker) between snapshot compactions
+EVENT_RESTORE_ON_START = True             # Rebuild in-process sessions from the log at warm-up
+
+# -----------------------------------------------------------------------------
+# Multi-Tenant Settings
+# -----------------------------------------------------------------------------
+TENANTS_FILE = os.environ.get("JEES_TENANTS_FILE")  # JSON tenant definitions; unset = this hotel only
+TENANT_CACHE_SIZE = 32                    # Compiled tenants each worker keeps (LRU, default pinned)
+TENANT_API_KEY_HEADER = "X-API-Key"       # Header selecting a tenant by API key (else Host)
+
+# -----------------------------------------------------------------------------
+# FAQ Retrieval Settings
+# -----------------------------------------------------------------------------
+FAQ_ENABLED = True                        # Answer policy/service questions from faq.py before falling back
+FAQ_SCORER = "bm25"                       # "bm25" (inverted index) or "tfidf" (NumPy vectors, cosine)
+FAQ_MIN_SCORE = {"bm25": 0.9, "tfidf": 0.25}  # Best passage must score at least this to be used
+FAQ_MIN_MATCHED_TERMS = 2                 # ...and contain at least this many of the question's terms
+FAQ_MIN_TERM_SHARE = 0.5                  # ...and at least this share of them
+FAQ_CHUNK_MAX_WORDS = 60                  # Longer paragraphs are split into passages by sentence
+FAQ_BM25_K1 = 1.2                         # BM25 term-frequency saturation
+FAQ_BM25_B = 0.75                         # BM25 passage-length normalization
+
+# -----------------------------------------------------------------------------
+# Live-Agent Escalation Settings
+# -----------------------------------------------------------------------------
+ESCALATION_ENABLED = True                 # Queue a handoff event when a guest is sent to a live agent
+ESCALATION_QUEUE_SIZE = 1000              # Handoffs waiting for delivery; beyond this they are dropped
+ESCALATION_HISTORY_TURNS = 5              # Recent turns included in a handoff
+ESCALATION_COOLDOWN_SECONDS = 300         # A user is escalated at most once in this window
+ESCALATION_WEBHOOK_URL = os.environ.get("JEES_ESCALATION_WEBHOOK")  # POST handoffs here; unset = log them
+ESCALATION_MAX_RETRIES = 3                # Delivery retries (with backoff) before a handoff is given up
+ESCALATION_TIMEOUT_SECONDS = 5            # Webhook request timeout
+
+# -----------------------------------------------------------------------------
+# Synonym Learning Settings
+# -----------------------------------------------------------------------------
+LEARNED_SYNONYMS_FILE = os.environ.get("JEES_LEARNED_SYNONYMS_FILE", "data/learned_synonyms.json")  # Approved entries
+SYNONYM_LEARNING_MIN_COUNT = 3            # Fallback messages a cluster needs to become a proposal
+SYNONYM_LEARNING_MAX_MESSAGES = 2000      # Most frequent distinct fallback messages clustered per language
+SYNONYM_LEARNING_CLUSTER_SIMILARITY = 0.6 # Trigram cosine similarity joining a message to a cluster
+SYNONYM_LEARNING_ASSIGN_SIMILARITY = 0.3  # Similarity to a synonym / trigger phrase needed to propose a target
+SYNONYM_LEARNING_RELOAD_SECONDS = 5       # How often workers check for entries approved elsewhere
+
+# -----------------------------------------------------------------------------
+# Admission Control Settings
+# -----------------------------------------------------------------------------
+ADMISSION_INITIAL_LIMIT = 16              # Starting number of concurrent /api requests
+ADMISSION_MIN_LIMIT = 2                   # The adaptive limit never drops below this
+ADMISSION_MAX_LIMIT = 128                 # ...and never grows above this
+ADMISSION_MAX_QUEUE = 32                  # Requests allowed to wait for a slot before shedding
+ADMISSION_QUEUE_TIMEOUT_SECONDS = 0.25    # Longest a request waits for a slot
+ADMISSION_LATENCY_TARGET_SECONDS = 0.5    # Slower requests shrink the limit (AIMD)
+ADMISSION_DECREASE_FACTOR = 0.9           # Multiplicative decrease applied on slow requests
+
+# -----------------------------------------------------------------------------
+# Conversation Sharding Settings
+# -----------------------------------------------------------------------------
+USER_LOCK_STRIPES = 64                    # Per-user lock stripes; same user = same stripe, in order
+
+# -----------------------------------------------------------------------------
+# Admin Endpoints and Profiling Settings
+# -----------------------------------------------------------------------------
+ADMIN_TOKEN = os.environ.get("JEES_ADMIN_TOKEN")  # Required as X-Admin-Token on /admin/*; unset = localhost only
+PROFILING_SAMPLE_RATE = 0.05              # Fraction of chat requests profiled while profiling is on
+PROFILING_MODE = "both"                   # "cprofile" (hotspot tables), "stack" (flame graphs) or "both"
+PROFILING_STACK_INTERVAL_MS = 5           # Stack sampler period
+PROFILING_MAX_STACKS = 5000               # Distinct collapsed stacks kept before truncating
+PROFILING_TOGGLE_SIGNAL = "SIGUSR2"       # kill -USR2 <worker pid> toggles profiling
+
+# -----------------------------------------------------------------------------
+# Startup Settings
+# -----------------------------------------------------------------------------
+SERVE_ONLY = os.environ.get("JEES_SERVE_ONLY", "0") == "1"  # Serve at once, warm up in the background, no /admin
+IMPORT_TIME_BUDGET_MS = 500               # check_import_time.py fails when importing the web app takes longer
+IMPORT_FORBIDDEN_MODULES = ["spacy", "setuptools"]  # ...or when these are imported before the first request
+HEALTH_DETAIL_TTL_SECONDS = 5             # /readyz recomputes session counts at most this often
+
+# -----------------------------------------------------------------------------
+# Dialog State Machine Settings
+# -----------------------------------------------------------------------------
+DIALOG_INTENT_TOKENS = {                  # Canonical tokens that signal each intent; earlier intents win
+    "greetings": ["greetings"],
+    "booking": ["booking", "book", "room"],
+    "location": ["location"],
+    "affirm": ["yes", "yeah", "yep", "sure", "okay", "haa", "hagaag"],
+}
+DIALOG_TYPED_INTENTS = ["affirm"]         # Also matched on the words as typed, before fuzzy expansion
+DIALOG_LIVE_CHAT_PHRASES = ["live chat", "support"]  # Substrings that ask for a person
+
+# -----------------------------------------------------------------------------
+# Input Suggestion (Autocomplete) Settings
+# -----------------------------------------------------------------------------
+SUGGESTION_LIMIT = 5                      # Maximum completions returned per keystroke
+SUGGESTION_PHRASES = {                    # Each must route to a handled intent (tests/test_dialog.py)
+    "en": [
+        "Tell me about the deluxe room", "Book a room", "Check-in time", "Check-out time",
+        "Hotel amenities", "Special offers", "Hotel location", "Live chat", "Help"
+    ],
+    "so": [
+        "Qolka deluxe", "Qiimaha qolka deluxe", "Waqtiga check-in", "Waqtiga check-out",
+        "Adeegyada aad bixisaan", "Meesha hotelka"
+    ]
+}
+
+# -----------------------------------------------------------------------------
+# Booking Engine Settings
+# -----------------------------------------------------------------------------
+BOOKING_ENGINE_URL = os.environ.get("JEES_BOOKING_ENGINE_URL")  # Unset = local SQLite inventory (booking.py)
+BOOKING_ROOM_UNITS = 5                    # Units per room type in the local inventory
+BOOKING_POOL_SIZE = 10                    # Pooled keep-alive connections to the booking engine
+BOOKING_TIMEOUT_SECONDS = 1.5             # Connect/read timeout; the chat path never waits longer
+BOOKING_CACHE_TTL_SECONDS = 30            # Availability answers are reused this long per date range
+BOOKING_CACHE_SIZE = 512                  # Cached date ranges kept per process (LRU)
+BOOKING_BREAKER_FAILURES = 5              # Consecutive failures before the circuit opens
+BOOKING_BREAKER_RESET_SECONDS = 30        # Time before a trial call is let through again
+
 # -----------------------------------------------------------------------------
 # API Endpoint Configuration
 # -----------------------------------------------------------------------------
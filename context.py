@@ -1,50 +1,112 @@
 # context.py
 import os
-from typing import Dict, Any
+import time
+from typing import Dict, Any, Optional
 from datetime import datetime
+from config import MAX_CHAT_HISTORY, EVENT_LOG_ENABLED
+from archive import history_archive
+from events import apply_event, event_log
+from sessions import TwoTierSessionCache, create_store
+
+def _new_session() -> Dict[str, Dict[str, Any]]:
+    return {
+        # 'context' holds arbitrary context data per user
+        'context': {},
+        # 'profile' holds richer data per user
+        # Extended profile with additional fields for increased context "density"
+        'profile': {
+            'preferred_language': None,    # e.g., 'en', 'so'
+            'state': 'awaiting_language',    # or 'normal', etc.
+            'last_interaction': time.time(),  # unix timestamps: cheap to serialize
+            'conversation_history': [],
+            'preferred_room_type': None,
+            'booking_history': [],
+            'message_count': 0,            # Count of messages exchanged
+            'fallback_attempts': 0,        # How many times fallback has been used
+            'current_topic': None          # Could be used to track conversation topics
+        },
+    }
 
 class ContextManager:
     def __init__(self):
-        # 'contexts' holds arbitrary context data per user
-        self.contexts: Dict[str, Dict[str, Any]] = {}
-        # 'user_profiles' holds richer data per user
-        self.user_profiles: Dict[str, Dict[str, Any]] = {}
+        # Profiles and contexts live in the two-tier session cache (see sessions.py).
+        # Read them through get_*, change them through update_* / log_interaction so
+        # every change is written through to the shared store.
+        self.sessions = TwoTierSessionCache(create_store(), _new_session)
+        # Every change is also appended to the event log (see events.py), from
+        # which sessions can be rebuilt after a restart or followed by a replica.
+        self.events = event_log if EVENT_LOG_ENABLED else None
+        if self.events:
+            self.events.factory = _new_session
         # 'rate_limits' to avoid spamming
         self.rate_limits: Dict[str, datetime] = {}
     
     def get_context(self, user_id: str) -> Dict[str, Any]:
-        return self.contexts.get(user_id, {})
+        return self.sessions.get(user_id)['context']
     
+    def _apply(self, user_id: str, kind: str, payload: Any = None) -> Dict[str, Any]:
+        # One session change: applied and written through, then logged as an event.
+        session = self.sessions.mutate(user_id, lambda session: apply_event(session, kind, payload))
+        if self.events:
+            self.events.append(user_id, kind, payload)
+        return session
+
     def update_context(self, user_id: str, updates: Dict[str, Any]):
-        self.contexts.setdefault(user_id, {}).update(updates)
+        self._apply(user_id, 'context', updates)
     
     def clear_context(self, user_id: str):
-        self.contexts.pop(user_id, None)
+        self._apply(user_id, 'cleared')
+
+    def forget_user(self, user_id: str):
+        # Drop every trace of a user (context, profile and rate limit entry)
+        self.sessions.delete(user_id)
+        self.rate_limits.pop(user_id, None)
+        if self.events:
+            self.events.append(user_id, 'forgotten')
     
     def get_user_profile(self, user_id: str) -> Dict[str, Any]:
-        # Extended profile with additional fields for increased context "density"
-        return self.user_profiles.setdefault(user_id, {
-            'preferred_language': None,    # e.g., 'en', 'so'
-            'state': 'awaiting_language',    # or 'normal', etc.
-            'last_interaction': datetime.now(),
-            'conversation_history': [],
-            'preferred_room_type': None,
-            'booking_history': [],
-            'message_count': 0,            # Count of messages exchanged
-            'fallback_attempts': 0,        # How many times fallback has been used
-            'current_topic': None          # Could be used to track conversation topics
-        })
+        return self.sessions.get(user_id)['profile']
+
+    def peek_user_profile(self, user_id: str) -> Optional[Dict[str, Any]]:
+        # The profile of a user seen before, without creating one
+        session = self.sessions.peek(user_id)
+        return session['profile'] if session else None
+
+    def update_profile(self, user_id: str, updates: Dict[str, Any]):
+        self._apply(user_id, 'profile', updates)
     
     def log_interaction(self, user_id: str, message: str, intent: str):
-        profile = self.get_user_profile(user_id)
-        # Log message details with timestamp
-        profile['conversation_history'].append({
-            'timestamp': datetime.now(),
-            'message': message,
-            'intent': intent
-        })
-        profile['last_interaction'] = datetime.now()
-        profile['message_count'] += 1  # Increase message count with every interaction
+        # Appends the turn to the history, bumps message_count and sets
+        # last_interaction and current_topic (see events._append_turn)
+        profile = self._apply(user_id, 'turn', [time.time(), message, intent])['profile']
+        if len(profile['conversation_history']) > MAX_CHAT_HISTORY:
+            self.archive_history(user_id, keep=MAX_CHAT_HISTORY // 2)
+
+    def archive_history(self, user_id: str, keep: int = 0) -> int:
+        # Move all but the 'keep' most recent turns into the columnar archive.
+        # Done in batches (down to half the cap) so most messages never touch disk.
+        aged = []
+
+        def cut_history(session):
+            history = session['profile']['conversation_history']
+            aged[:] = history[:len(history) - keep] if keep else history[:]
+            del history[:len(aged)]
+
+        self.sessions.mutate(user_id, cut_history)
+        if not aged:
+            return 0
+        if self.events:
+            self.events.append(user_id, 'archived', len(aged))
+        return history_archive.append(user_id, aged)
+
+    def restore_from_events(self) -> Dict[str, Any]:
+        # Rebuild in-process sessions from the event log at start-up. A shared
+        # store (JEES_SESSION_STORE) already outlives restarts and is left alone.
+        if not self.events or self.sessions.store.shared:
+            return {'restored': 0}
+        sessions, _ = self.events.restore(_new_session)
+        self.sessions.store.seed(sessions)
+        return dict(self.events.last_restore, restored=len(sessions))
     
     def check_rate_limit(self, user_id: str) -> bool:
         last_req = self.rate_limits.get(user_id)
@@ -0,0 +1,89 @@
+# entity_memory.py
+"""
+Per-session entity memory with incremental, on-demand extraction.
+
+Each session remembers the room types, stays, dates and numbers mentioned so far,
+with the turn they were last seen on. Handlers ask only for the entity kinds
+they need: room types come from the compiled room matcher, and spaCy NER runs
+only when dates or numbers are requested. Kinds missing from the current
+message are filled in from memory, so "how much is it?" still knows which
+room the guest was talking about.
+
+The memory lives in the user's context as a plain dict, so it is copied,
+cleared and serialized together with the rest of the session, and written
+through to the session store after every merge that sets a slot; sessions
+that never mention an entity store nothing.
+"""
+from typing import Dict, List, Optional
+
+from config import ENTITY_MEMORY_PER_KIND
+from context import context_manager
+from tenants import nlp_processor
+
+
+class EntityMemory:
+    """
+    View over a session's {kind: [[value, turn], ...]} store (newest last).
+    """
+    def __init__(self, store: Dict[str, List[list]]):
+        self.store = store
+
+    def remember(self, kind: str, values: List[str], turn: int):
+        entries = self.store.setdefault(kind, [])
+        for value in values:
+            entries[:] = [entry for entry in entries if entry[0] != value]
+            entries.append([value, turn])
+        del entries[:-ENTITY_MEMORY_PER_KIND]
+
+    def merge(self, entities: Dict[str, List[str]], turn: int) -> bool:
+        """Remember the non-empty kinds; True when any slot was set."""
+        changed = False
+        for kind, values in entities.items():
+            if values:
+                self.remember(kind, values, turn)
+                changed = True
+        return changed
+
+    def recall(self, kind: str) -> List[str]:
+        """Remembered values of a kind, most recent first."""
+        return [value for value, _ in reversed(self.store.get(kind, []))]
+
+    def latest(self, kind: str) -> Optional[str]:
+        entries = self.store.get(kind)
+        return entries[-1][0] if entries else None
+
+    def last_seen(self, kind: str) -> Optional[int]:
+        entries = self.store.get(kind)
+        return entries[-1][1] if entries else None
+
+
+def memory_for(user_id: str) -> EntityMemory:
+    """The session's memory; an empty, unsaved one until a slot is set."""
+    store = context_manager.get_context(user_id).get('entity_memory')
+    return EntityMemory({} if store is None else store)
+
+
+def resolve_entities(user_id: str, message: str, kinds: List[str],
+                     carry_over: bool = True) -> Dict[str, List[str]]:
+    """
+    Extract only the requested kinds from the message, merge them into the
+    session memory and, if carry_over is set, fill kinds the message does not
+    mention from memory. 'carried_over' lists the kinds taken from memory.
+    """
+    turn = context_manager.get_user_profile(user_id)['message_count']
+    extracted = nlp_processor.extract_entities(message, kinds)
+    memory = memory_for(user_id)
+    if memory.merge({kind: extracted[kind] for kind in kinds}, turn):
+        # Write the merged memory through to the session store.
+        context_manager.update_context(user_id, {'entity_memory': memory.store})
+
+    entities = {kind: list(extracted[kind]) for kind in kinds}
+    entities['carried_over'] = []
+    if carry_over:
+        for kind in kinds:
+            if not entities[kind]:
+                latest = memory.latest(kind)
+                if latest is not None:
+                    entities[kind] = [latest]
+                    entities['carried_over'].append(kind)
+    return entities
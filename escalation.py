@@ -0,0 +1,236 @@
+# escalation.py
+"""
+Live-agent escalation, off the request path.
+
+When a guest asks for a person, or the fallback gives up, the chat reply
+links to the hotel's WhatsApp (HOTEL_INFO['whatsapp'] of the tenant) and a
+handoff event is put on an in-process outbox:
+
+    id, time, tenant, user, language, reason ('live_chat' / 'fallback'),
+    the message that triggered it and the last ESCALATION_HISTORY_TURNS turns
+
+The request thread only builds that small dict and does a put_nowait(); a
+background worker (one per process, started on first use) delivers events
+to the sink, retrying failures with backoff. The outbox is bounded
+(ESCALATION_QUEUE_SIZE): in a burst beyond that, events are dropped and
+counted rather than blocking the reply. A user escalated within
+ESCALATION_COOLDOWN_SECONDS is not escalated again, so repeated fallbacks
+do not page the desk every message.
+
+Sinks are callables taking one event. WebhookSink POSTs it as JSON to
+ESCALATION_WEBHOOK_URL; without a URL, LogSink writes it (messages
+redacted, as 'guest_message' so the log line's own 'message' stays
+intact) to the 'jees.escalation' log. MemorySink keeps events in memory
+as a local stand-in for tests:
+
+    sink = MemorySink()
+    escalation_outbox.sink = sink
+    ...
+    sink.wait(1)
+"""
+import logging
+import os
+import queue
+import threading
+import time
+import urllib.request
+import uuid
+from collections import deque
+from typing import Any, Callable, Dict
+
+from config import (
+    ESCALATION_ENABLED,
+    ESCALATION_QUEUE_SIZE,
+    ESCALATION_HISTORY_TURNS,
+    ESCALATION_COOLDOWN_SECONDS,
+    ESCALATION_WEBHOOK_URL,
+    ESCALATION_MAX_RETRIES,
+    ESCALATION_TIMEOUT_SECONDS,
+)
+from context import context_manager
+from request_watchdog import redact
+from serialization import dumps
+from tenants import HOTEL_INFO, current_tenant
+
+Event = Dict[str, Any]
+
+_log = logging.getLogger('jees.escalation')
+
+REPLIES = {
+    'live_chat': "You can talk to a live agent now! "
+                 "<a href='{whatsapp}' target='_blank'>Click here to chat on WhatsApp</a>",
+    'fallback': "I'm having trouble understanding. Let me connect you to a live agent. "
+                "<a href='{whatsapp}' target='_blank'>Click here to chat on WhatsApp</a>",
+}
+
+
+def escalation_reply(reason: str) -> str:
+    """The chat reply for an escalation, linking to the tenant's WhatsApp."""
+    return REPLIES[reason].format(whatsapp=HOTEL_INFO['whatsapp'])
+
+
+class LogSink:
+    """Writes handoffs to the log (the default when no webhook is configured)."""
+    def __call__(self, event: Event):
+        fields = {key: value for key, value in event.items() if key != 'message'}
+        fields['guest_message'] = redact(event['message'] or '')
+        fields['history'] = [dict(turn, message=redact(turn['message'])) for turn in event['history']]
+        _log.warning("escalation", extra={'fields': fields})
+
+
+class WebhookSink:
+    """POSTs each handoff as JSON to a URL (the help desk or a chat-ops bridge)."""
+    def __init__(self, url: str, timeout: float = ESCALATION_TIMEOUT_SECONDS):
+        self.url = url
+        self.timeout = timeout
+
+    def __call__(self, event: Event):
+        request = urllib.request.Request(self.url, data=dumps(event), method='POST',
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class MemorySink:
+    """Keeps delivered events in memory; a stand-in for the real sink in tests."""
+    def __init__(self, maxlen: int = 1000):
+        self.events: deque = deque(maxlen=maxlen)
+        self._condition = threading.Condition()
+
+    def __call__(self, event: Event):
+        with self._condition:
+            self.events.append(event)
+            self._condition.notify_all()
+
+    def wait(self, count: int, timeout: float = 5.0) -> bool:
+        """Block until at least 'count' events were delivered (or the timeout passes)."""
+        with self._condition:
+            return self._condition.wait_for(lambda: len(self.events) >= count, timeout)
+
+
+def default_sink() -> Callable[[Event], None]:
+    return WebhookSink(ESCALATION_WEBHOOK_URL) if ESCALATION_WEBHOOK_URL else LogSink()
+
+
+class EscalationOutbox:
+    """
+    Bounded outbox of handoff events, drained by a background worker.
+    """
+    def __init__(self, sink: Callable[[Event], None] = None, capacity: int = ESCALATION_QUEUE_SIZE,
+                 enabled: bool = ESCALATION_ENABLED):
+        self.sink = sink or default_sink()
+        self.enabled = enabled
+        self._queue: queue.Queue = queue.Queue(maxsize=capacity)
+        self._last: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._pid = None
+
+        # Counters exposed through snapshot()
+        self.enqueued = 0
+        self.suppressed = 0
+        self.dropped = 0
+        self.delivered = 0
+        self.failed = 0
+        self.retries = 0
+
+    # ------------------------------------------------------------------
+    # Request side
+    # ------------------------------------------------------------------
+    def escalate(self, user_id: str, lang: str, reason: str, message: str = None) -> bool:
+        """Queue a handoff for the user; never blocks. Returns whether it was queued."""
+        if not self.enabled:
+            return False
+        now = time.time()
+        with self._lock:
+            if now - self._last.get(user_id, 0.0) < ESCALATION_COOLDOWN_SECONDS:
+                self.suppressed += 1
+                return False
+            if len(self._last) >= 10000:
+                self._last = {user: ts for user, ts in self._last.items()
+                              if now - ts < ESCALATION_COOLDOWN_SECONDS}
+            self._last[user_id] = now
+        profile = context_manager.peek_user_profile(user_id) or {}
+        history = profile.get('conversation_history', [])[-ESCALATION_HISTORY_TURNS:]
+        event = {
+            'id': uuid.uuid4().hex,
+            'time': round(now, 3),
+            'tenant': current_tenant().id,
+            'user': user_id,
+            'lang': lang,
+            'reason': reason,
+            'message': message,
+            'history': [dict(turn) for turn in history],
+        }
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    # ------------------------------------------------------------------
+    # Worker side
+    # ------------------------------------------------------------------
+    def _ensure_worker(self):
+        # Threads do not survive fork(), so each worker process starts its own.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                threading.Thread(target=self._worker, name='escalation-outbox', daemon=True).start()
+                self._pid = os.getpid()
+
+    def _deliver(self, event: Event) -> bool:
+        for attempt in range(ESCALATION_MAX_RETRIES + 1):
+            try:
+                self.sink(event)
+                return True
+            except Exception:
+                if attempt == ESCALATION_MAX_RETRIES:
+                    _log.exception("escalation %s could not be delivered", event['id'])
+                    return False
+                self.retries += 1
+                time.sleep(min(0.5 * 2 ** attempt, 30.0))
+        return False
+
+    def _worker(self):
+        while True:
+            event = self._queue.get()
+            delivered = self._deliver(event)
+            with self._lock:
+                if delivered:
+                    self.delivered += 1
+                else:
+                    self.failed += 1
+            self._queue.task_done()
+
+    def drain(self, timeout: float = 5.0) -> bool:
+        """Wait until every queued event was handled (for tests and shutdown)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'sink': type(self.sink).__name__,
+                'queued': self._queue.qsize(),
+                'enqueued': self.enqueued,
+                'suppressed': self.suppressed,
+                'dropped': self.dropped,
+                'delivered': self.delivered,
+                'failed': self.failed,
+                'retries': self.retries,
+            }
+
+
+# Create a single global instance to be imported by other modules
+escalation_outbox = EscalationOutbox()
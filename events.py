@@ -0,0 +1,321 @@
+# events.py
+"""
+Append-only event stream of session changes, with snapshot compaction.
+
+Every change ContextManager makes to a session is one small event:
+
+    profile   {field: value, ...}     language set, state, fallback counter, ...
+    context   {field: value, ...}     room viewed, entity memory, ...
+    cleared   null                    context cleared
+    turn      [ts, message, intent]   one logged message (history, counters, topic)
+    archived  n                       n oldest history turns moved to the archive
+    forgotten null                    session dropped
+
+apply_event() is the only place those changes are defined: ContextManager
+applies events to live sessions with it and replay applies the same events
+to rebuild them, so the two cannot drift apart.
+
+On disk each event is one orjson line [ts, user, kind, payload] appended to
+the current segment (events-NNNNNN.log), so a write is O(1) per message.
+compact() rotates to a new segment, folds everything before it into
+snapshot-NNNNNN.json (the materialized session records) and deletes the
+folded segments. restore() loads the newest snapshot and replays the
+segments after it; tail() returns the events after a position, which is all
+a replica on another worker or node needs to follow along.
+
+Several worker processes append to the same segment; writes and rotation
+are serialized with an fcntl lock on the segment, as in the history archive.
+"""
+import glob
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import EVENT_LOG_DIR, EVENT_COMPACT_EVERY
+from serialization import dumps, loads
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development server only
+    fcntl = None
+
+Record = Dict[str, Dict[str, Any]]
+Event = Tuple[float, str, str, Any]
+# (segment number, byte offset in that segment)
+Position = Tuple[int, int]
+
+_SEGMENT = re.compile(r"events-(\d+)\.log$")
+_SNAPSHOT = re.compile(r"snapshot-(\d+)\.json$")
+
+
+def _append_turn(profile: Dict[str, Any], payload: List[Any]):
+    ts, message, intent = payload
+    profile['conversation_history'].append({'timestamp': ts, 'message': message, 'intent': intent})
+    profile['last_interaction'] = ts
+    profile['message_count'] += 1
+    profile['current_topic'] = intent
+
+
+_APPLY: Dict[str, Callable[[Record, Any], None]] = {
+    'profile': lambda session, fields: session['profile'].update(fields),
+    'context': lambda session, fields: session['context'].update(fields),
+    'cleared': lambda session, _: session['context'].clear(),
+    'turn': lambda session, payload: _append_turn(session['profile'], payload),
+    'archived': lambda session, n: session['profile']['conversation_history'].__delitem__(slice(0, n)),
+}
+
+
+def apply_event(session: Record, kind: str, payload: Any):
+    """Apply one event to a session record ('forgotten' is handled by the caller)."""
+    _APPLY[kind](session, payload)
+
+
+def replay(sessions: Dict[str, Record], events: List[Event], factory: Callable[[], Record]):
+    """Apply events, in order, to a {user: session} map."""
+    for ts, user_id, kind, payload in events:
+        if kind == 'forgotten':
+            sessions.pop(user_id, None)
+            continue
+        session = sessions.get(user_id)
+        if session is None:
+            session = sessions[user_id] = factory()
+            session['profile']['last_interaction'] = ts
+        _APPLY[kind](session, payload)
+
+
+class EventLog:
+    """
+    Segmented, append-only event log shared by the workers of one host.
+    """
+    def __init__(self, directory: str = EVENT_LOG_DIR, compact_every: int = EVENT_COMPACT_EVERY):
+        self.directory = directory
+        self.compact_every = compact_every
+        self.factory: Optional[Callable[[], Record]] = None
+        self._lock = threading.Lock()
+        self._pid = None
+        self._handle = None
+        self._segment = None
+        self._compacting = False
+
+        # Counters exposed through snapshot()
+        self.appended = 0
+        self.since_compaction = 0
+        self.last_compaction: Dict[str, Any] = {}
+        self.last_restore: Dict[str, Any] = {}
+
+    # ------------------------------------------------------------------
+    # Files
+    # ------------------------------------------------------------------
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _segments(self) -> List[int]:
+        return sorted(int(_SEGMENT.search(p).group(1))
+                      for p in glob.glob(self._path('events-*.log')))
+
+    def _snapshots(self) -> List[int]:
+        return sorted(int(_SNAPSHOT.search(p).group(1))
+                      for p in glob.glob(self._path('snapshot-*.json')))
+
+    def _segment_path(self, segment: int) -> str:
+        return self._path(f'events-{segment:06d}.log')
+
+    def _head(self) -> int:
+        segments = self._segments()
+        if segments:
+            return segments[-1]
+        snapshots = self._snapshots()
+        return snapshots[-1] + 1 if snapshots else 1
+
+    @contextmanager
+    def _locked(self, fh):
+        if fcntl:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _open_head(self):
+        # Handles must not cross fork(), and every process follows rotations.
+        os.makedirs(self.directory, exist_ok=True)
+        if self._handle:
+            self._handle.close()
+        self._segment = self._head()
+        self._handle = open(self._segment_path(self._segment), 'ab')
+        self._pid = os.getpid()
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    def append(self, user_id: str, kind: str, payload: Any = None):
+        """Append one event: a single write to the current segment."""
+        line = dumps([round(time.time(), 3), user_id, kind, payload]) + b'\n'
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open_head()
+            while True:
+                with self._locked(self._handle):
+                    # A compaction that rotated meanwhile leaves a newer segment behind
+                    # (and may already have folded ours into a snapshot).
+                    current = self._segment_path(self._segment)
+                    if os.path.exists(self._segment_path(self._segment + 1)) or not os.path.exists(current):
+                        rotated = True
+                    else:
+                        self._handle.write(line)
+                        self._handle.flush()
+                        rotated = False
+                if not rotated:
+                    break
+                self._open_head()
+            self.appended += 1
+            self.since_compaction += 1
+            due = self.factory is not None and self.since_compaction >= self.compact_every \
+                and not self._compacting
+            if due:
+                self._compacting = True
+        if due:
+            threading.Thread(target=self._compact_in_background, name='event-compaction',
+                             daemon=True).start()
+
+    def _compact_in_background(self):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self._path('compaction.lock'), 'ab') as lock:
+                # Every worker reaches the threshold at about the same time; one compacts.
+                if fcntl:
+                    try:
+                        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        return
+                self.compact()
+        finally:
+            self._compacting = False
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+    def read_segment(self, segment: int, offset: int = 0) -> Tuple[List[Event], int]:
+        """Complete events of a segment from a byte offset, and the offset after them."""
+        try:
+            with open(self._segment_path(segment), 'rb') as fh:
+                fh.seek(offset)
+                data = fh.read()
+        except FileNotFoundError:
+            return [], offset
+        end = data.rfind(b'\n') + 1   # a line still being written is left for later
+        events = []
+        for line in data[:end].splitlines():
+            try:
+                events.append(tuple(loads(line)))
+            except ValueError:
+                continue   # torn line from a crash mid-write
+        return events, offset + end
+
+    def tail(self, position: Position) -> Tuple[List[Event], Position]:
+        """
+        Events after a position, for replicas following the stream. Returns the
+        new position; ([], None) means the position was compacted away and the
+        replica must restore() from the snapshot first.
+        """
+        segment, offset = position
+        segments = [s for s in self._segments() if s >= segment]
+        if not segments or segments[0] != segment:
+            return [], None
+        events: List[Event] = []
+        for current in segments:
+            batch, end = self.read_segment(current, offset if current == segment else 0)
+            events.extend(batch)
+            position = (current, end)
+        return events, position
+
+    def _load_snapshot(self) -> Tuple[int, Dict[str, Record]]:
+        snapshots = self._snapshots()
+        if not snapshots:
+            return 0, {}
+        with open(self._path(f'snapshot-{snapshots[-1]:06d}.json'), 'rb') as fh:
+            return snapshots[-1], loads(fh.read())['sessions']
+
+    def restore(self, factory: Callable[[], Record],
+                through_segment: int = None) -> Tuple[Dict[str, Record], Position]:
+        """
+        Rebuild every session: newest snapshot plus the segments written after it.
+        Returns the sessions and the position a replica should tail from.
+        """
+        start = time.perf_counter()
+        covered, sessions = self._load_snapshot()
+        replayed = 0
+        position: Position = (covered + 1, 0)
+        for segment in self._segments():
+            if segment <= covered or (through_segment is not None and segment > through_segment):
+                continue
+            events, end = self.read_segment(segment)
+            replay(sessions, events, factory)
+            replayed += len(events)
+            position = (segment, end)
+        self.last_restore = {
+            'snapshot_segment': covered,
+            'events_replayed': replayed,
+            'sessions': len(sessions),
+            'seconds': round(time.perf_counter() - start, 3),
+        }
+        return sessions, position
+
+    # ------------------------------------------------------------------
+    # Compaction
+    # ------------------------------------------------------------------
+    def compact(self, factory: Callable[[], Record] = None) -> Dict[str, Any]:
+        """
+        Rotate to a new segment, write a snapshot covering everything before it
+        and delete the segments and snapshots it replaces. Runs by itself in a
+        background thread every compact_every appends (see append()).
+        """
+        factory = factory or self.factory
+        start = time.perf_counter()
+        os.makedirs(self.directory, exist_ok=True)
+        head = self._head()
+        with open(self._segment_path(head), 'ab') as fh, self._locked(fh):
+            # Creating the next segment under the head's lock is the rotation:
+            # appenders re-check for it after taking the same lock.
+            open(self._segment_path(head + 1), 'ab').close()
+
+        sessions, _ = self.restore(factory, through_segment=head)
+        temp = self._path(f'snapshot-{head:06d}.json.tmp')
+        with open(temp, 'wb') as fh:
+            fh.write(dumps({'segment': head, 'sessions': sessions}))
+        os.replace(temp, self._path(f'snapshot-{head:06d}.json'))
+
+        for segment in self._segments():
+            if segment <= head:
+                os.remove(self._segment_path(segment))
+        for snapshot in self._snapshots():
+            if snapshot < head:
+                os.remove(self._path(f'snapshot-{snapshot:06d}.json'))
+        with self._lock:
+            self.since_compaction = 0
+        self.last_compaction = {
+            'snapshot_segment': head,
+            'sessions': len(sessions),
+            'seconds': round(time.perf_counter() - start, 3),
+        }
+        return self.last_compaction
+
+    def snapshot(self) -> Dict[str, Any]:
+        segments = self._segments()
+        return {
+            'directory': self.directory,
+            'segments': segments,
+            'bytes': sum(os.path.getsize(self._segment_path(s)) for s in segments),
+            'appended': self.appended,
+            'since_compaction': self.since_compaction,
+            'last_compaction': self.last_compaction,
+            'last_restore': self.last_restore,
+        }
+
+
+# Create a single global instance to be imported by other modules
+event_log = EventLog()
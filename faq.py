@@ -0,0 +1,451 @@
+# faq.py
+"""
+Retrieval-based answers over the hotel's policies, services and terms.
+
+Most of what the hotel has written down (HOTEL_INFO policies, guest
+services, loyalty program, TERMS_AND_CONDITIONS, PRIVACY_POLICY,
+RESERVATION_INSTRUCTIONS, and the service answers in RESPONSES) had no
+handler, so questions about it went to the fallback. This module chunks that
+content at load time into short passages and answers with the passage that
+best matches the question, in the guest's language:
+
+- each language has its own PassageIndex: an inverted index of
+  term -> {passage: term frequency} scored with BM25, plus (optionally,
+  FAQ_SCORER = "tfidf") L2-normalized NumPy TF-IDF vectors scored by cosine;
+- HOTEL_INFO and the documents are written in English, so they are indexed
+  for 'en'; every language also indexes the answer templates it has
+  (RESPONSES[lang]["wifi"], ["policies"], ...), so Somali guests get Somali text;
+- passages are grouped by source (e.g. 'policies', 'guest_services.spa');
+  refresh() re-reads the content and only re-indexes the sources whose text
+  changed, on a copy of each index that then replaces the live one in a
+  single assignment: lookups, which take no lock, always see a whole index.
+
+A lookup tokenizes the question once and walks the postings of its terms, a
+few microseconds for a corpus this size. Answers below FAQ_MIN_SCORE, or
+whose passage shares fewer than FAQ_MIN_MATCHED_TERMS (and FAQ_MIN_TERM_SHARE)
+of the question's terms, are not given: one rare word in common ("room
+availability" -> "complimentary upgrades subject to availability") is not an
+answer. The message goes to the fallback as before.
+"""
+import hashlib
+import math
+import re
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from config import (
+    API_ENDPOINTS,
+    TERMS_AND_CONDITIONS,
+    PRIVACY_POLICY,
+    RESERVATION_INSTRUCTIONS,
+    SUPPORTED_LANGUAGES,
+    FAQ_SCORER,
+    FAQ_MIN_SCORE,
+    FAQ_MIN_MATCHED_TERMS,
+    FAQ_MIN_TERM_SHARE,
+    FAQ_CHUNK_MAX_WORDS,
+    FAQ_BM25_K1,
+    FAQ_BM25_B,
+)
+from normalize import normalizer_for, tokenize
+
+# Language HOTEL_INFO and the documents are written in.
+CONTENT_LANGUAGE = 'en'
+
+# RESPONSES entries that answer a question on their own.
+ANSWER_TEMPLATES = (
+    'amenities', 'check_times', 'contact', 'policies', 'promotion', 'wifi', 'laundry',
+    'family', 'gym', 'restaurant', 'taxi', 'airport',
+)
+
+STOPWORDS = {
+    'en': set("""
+        a an and are as at be by can could do does for from have how i in is it me my of on or
+        our please the there this to us we what when where which will with would you your yours
+        tell know about any like get need want some just also much many im
+    """.split()),
+    'so': set("""
+        a aad ah ama an ayaa baa iyo ka ku la ma miyaa oo u waa wax waxaan yahay
+    """.split()),
+}
+
+_NUMBERED = re.compile(r"^\s*\d+[.)]\s")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+Passage = Dict[str, Any]
+
+
+class Match(NamedTuple):
+    score: float
+    passage: Passage
+    matched: int     # distinct query terms found in the passage
+    terms: int       # distinct query terms
+
+
+def _stem_en(term: str) -> str:
+    # Light suffix folding: "policies" -> "policy", "smoking"/"smoke" -> "smok".
+    if len(term) > 4 and term.endswith('ies'):
+        return term[:-3] + 'y'
+    if len(term) > 5 and term.endswith('ing'):
+        term = term[:-3]
+    elif len(term) > 3 and term.endswith('s') and not term.endswith('ss'):
+        term = term[:-1]
+    return term[:-1] if len(term) > 3 and term.endswith('e') else term
+
+
+def analyze(text: str, lang: str) -> List[str]:
+    """Index terms of a text: normalized tokens, stopwords dropped, plurals folded."""
+    stopwords = STOPWORDS.get(lang, set())
+    terms = [t for t in tokenize(normalizer_for(lang)(text)) if t not in stopwords]
+    return [_stem_en(t) for t in terms] if lang == 'en' else terms
+
+
+def _split_long(passage: str, max_words: int) -> List[str]:
+    # Paragraphs over max_words become several passages, cut between sentences.
+    if len(passage.split()) <= max_words:
+        return [passage]
+    passages = []
+    current: List[str] = []
+    for sentence in _SENTENCE_END.split(passage):
+        if current and len(" ".join(current + [sentence]).split()) > max_words:
+            passages.append(" ".join(current))
+            current = []
+        current.append(sentence)
+    if current:
+        passages.append(" ".join(current))
+    return passages
+
+
+def chunk_text(text: str, max_words: int = FAQ_CHUNK_MAX_WORDS) -> List[str]:
+    """
+    Split a document into passages: one per numbered item, one per lettered
+    sub-item (after its item's lead-in line), a leading line on its own and
+    long paragraphs by sentence.
+    """
+    chunks: List[List[str]] = []
+    for line in text.strip().splitlines():
+        if not line.strip():
+            continue
+        if _NUMBERED.match(line) or not chunks or not line.startswith(' '):
+            chunks.append([line.strip()])
+        else:
+            chunks[-1].append(line.strip())
+
+    passages = []
+    for lines in chunks:
+        for passage in ([f"{lines[0]}\n{line}" for line in lines[1:]] or lines):
+            passages.extend(_split_long(passage, max_words))
+    return passages
+
+
+def collect_sources(hotel_info: Dict[str, Any], responses: Dict[str, Dict[str, Any]],
+                    lang: str) -> Dict[str, List[Tuple[str, str]]]:
+    """
+    {source: [(indexed text, answer text), ...]} for one language. Templates
+    filled with English content are indexed without it in other languages,
+    so a Somali question is matched against Somali words only.
+    """
+    fields = {
+        'amenities': "\n".join(f"- {a}" for a in hotel_info.get('amenities', [])),
+        'policies': "\n".join(hotel_info.get('policies', [])),
+        'check_in': hotel_info.get('check_in', ''),
+        'check_out': hotel_info.get('check_out', ''),
+        'phone': hotel_info.get('phone', ''),
+        'email': hotel_info.get('email', ''),
+        'whatsapp': hotel_info.get('whatsapp', ''),
+        'address': hotel_info.get('address', ''),
+    }
+    sources: Dict[str, List[Tuple[str, str]]] = {}
+    templates = responses.get(lang, {})
+    for key in ANSWER_TEMPLATES:
+        if isinstance(templates.get(key), str):
+            answer = templates[key].format(**fields)
+            indexed = answer if lang == CONTENT_LANGUAGE else templates[key].format(**dict.fromkeys(fields, ''))
+            sources[f"responses.{key}"] = [(indexed, answer)]
+
+    if lang != CONTENT_LANGUAGE:
+        return sources
+    documents = {
+        'policies': fields['policies'],
+        'terms_and_conditions': TERMS_AND_CONDITIONS,
+        'privacy_policy': PRIVACY_POLICY,
+        'reservation_instructions': RESERVATION_INSTRUCTIONS.format(booking_url=API_ENDPOINTS['booking']),
+        'special_offers': "\n".join(hotel_info.get('special_offers', [])),
+        'covid_guidelines': hotel_info.get('covid_guidelines', ''),
+    }
+    for service, text in hotel_info.get('guest_services', {}).items():
+        documents[f"guest_services.{service}"] = text
+    loyalty = hotel_info.get('loyalty_program')
+    if loyalty:
+        documents['loyalty_program'] = (
+            f"{loyalty['program_name']} loyalty program benefits:\n"
+            + "\n".join(f"- {b}" for b in loyalty.get('benefits', []))
+            + f"\nJoin at {loyalty['join_url']}"
+        )
+    for source, text in documents.items():
+        if text and text.strip():
+            sources[source] = [(passage, passage) for passage in chunk_text(text)]
+    return sources
+
+
+class PassageIndex:
+    """
+    BM25 inverted index (and optional TF-IDF vectors) over one language's passages.
+    """
+    def __init__(self, lang: str, k1: float = FAQ_BM25_K1, b: float = FAQ_BM25_B):
+        self.lang = lang
+        self.k1 = k1
+        self.b = b
+        self.passages: Dict[int, Passage] = {}
+        self._terms: Dict[int, set] = {}      # passage id -> its distinct terms, for removal
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.sources: Dict[str, Tuple[str, List[int]]] = {}   # source -> (digest, passage ids)
+        self.total_length = 0
+        self._next_id = 0
+        self._vectors = None     # (passage ids, vocabulary, matrix), rebuilt lazily
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+    def copy(self) -> 'PassageIndex':
+        """An independent copy to update while this one keeps serving lookups."""
+        clone = PassageIndex(self.lang, self.k1, self.b)
+        clone.passages = dict(self.passages)
+        clone._terms = dict(self._terms)
+        clone.postings = {term: dict(postings) for term, postings in self.postings.items()}
+        clone.sources = {source: (digest, list(ids)) for source, (digest, ids) in self.sources.items()}
+        clone.total_length = self.total_length
+        clone._next_id = self._next_id
+        clone._vectors = self._vectors
+        return clone
+
+    def _add(self, source: str, indexed: str, text: str) -> int:
+        # The source name is indexed too ("guest_services.spa" -> "guest services spa").
+        terms = analyze(source.split('.', 1)[-1].replace('_', ' ') + " " + indexed, self.lang)
+        passage_id = self._next_id
+        self._next_id += 1
+        self.passages[passage_id] = {'source': source, 'text': text, 'length': len(terms)}
+        self._terms[passage_id] = set(terms)
+        self.total_length += len(terms)
+        for term in terms:
+            postings = self.postings.setdefault(term, {})
+            postings[passage_id] = postings.get(passage_id, 0) + 1
+        return passage_id
+
+    def _remove(self, passage_id: int):
+        passage = self.passages.pop(passage_id)
+        self.total_length -= passage['length']
+        for term in self._terms.pop(passage_id):
+            postings = self.postings[term]
+            del postings[passage_id]
+            if not postings:
+                del self.postings[term]
+
+    def update(self, sources: Dict[str, List[Tuple[str, str]]]) -> Dict[str, int]:
+        """Bring the index in line with 'sources', touching only changed sources."""
+        changes = {'added': 0, 'removed': 0, 'unchanged': 0}
+        for source in [s for s in self.sources if s not in sources]:
+            for passage_id in self.sources.pop(source)[1]:
+                self._remove(passage_id)
+            changes['removed'] += 1
+        for source, passages in sources.items():
+            digest = hashlib.sha1(repr(passages).encode('utf-8')).hexdigest()
+            current = self.sources.get(source)
+            if current and current[0] == digest:
+                changes['unchanged'] += 1
+                continue
+            if current:
+                for passage_id in current[1]:
+                    self._remove(passage_id)
+                changes['removed'] += 1
+            self.sources[source] = (digest, [self._add(source, *passage) for passage in passages])
+            changes['added'] += 1
+        if changes['added'] or changes['removed']:
+            self._vectors = None
+        return changes
+
+    # ------------------------------------------------------------------
+    # Scoring
+    # ------------------------------------------------------------------
+    def bm25(self, terms: List[str]) -> Optional[Tuple[float, int]]:
+        """
+        (score, passage id) of the best passage, or None when no term matches.
+        Scores are in units of the idf of a term found in a single passage, so
+        one threshold works for corpora of any size (English has three times
+        the passages of Somali).
+        """
+        count = len(self.passages)
+        if not count:
+            return None
+        average = self.total_length / count
+        scores: Dict[int, float] = {}
+        for term in set(terms):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for passage_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.passages[passage_id]['length'] / average)
+                scores[passage_id] = scores.get(passage_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        if not scores:
+            return None
+        best = max(scores, key=scores.get)
+        return scores[best] / math.log(1 + (count - 0.5) / 1.5), best
+
+    def _build_vectors(self):
+        ids = sorted(self.passages)
+        vocabulary = {term: i for i, term in enumerate(sorted(self.postings))}
+        matrix = np.zeros((len(ids), len(vocabulary)))
+        row_of = {passage_id: row for row, passage_id in enumerate(ids)}
+        for term, postings in self.postings.items():
+            column = vocabulary[term]
+            for passage_id, tf in postings.items():
+                matrix[row_of[passage_id], column] = tf
+        idf = np.log((1 + len(ids)) / (1 + (matrix > 0).sum(axis=0))) + 1
+        matrix *= idf
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        self._vectors = (ids, vocabulary, matrix, idf)
+
+    def tfidf(self, terms: List[str]) -> Optional[Tuple[float, int]]:
+        """(cosine similarity, passage id) of the best passage by TF-IDF."""
+        if not self.passages:
+            return None
+        if self._vectors is None:
+            self._build_vectors()
+        ids, vocabulary, matrix, idf = self._vectors
+        query = np.zeros(len(vocabulary))
+        for term in terms:
+            column = vocabulary.get(term)
+            if column is not None:
+                query[column] += 1
+        if not query.any():
+            return None
+        query *= idf
+        similarity = matrix @ (query / np.linalg.norm(query))
+        row = int(similarity.argmax())
+        return float(similarity[row]), ids[row]
+
+    def search(self, text: str, scorer: str = FAQ_SCORER) -> Optional[Match]:
+        terms = analyze(text, self.lang)
+        found = self.tfidf(terms) if scorer == 'tfidf' else self.bm25(terms)
+        if found is None:
+            return None
+        distinct = set(terms)
+        return Match(found[0], self.passages[found[1]], len(distinct & self._terms[found[1]]), len(distinct))
+
+
+class FAQIndex:
+    """
+    One PassageIndex per supported language over a hotel's content.
+    """
+    def __init__(self, hotel_info: Dict[str, Any], responses: Dict[str, Dict[str, Any]],
+                 scorer: str = FAQ_SCORER, min_score: float = None,
+                 min_terms: int = FAQ_MIN_MATCHED_TERMS, min_share: float = FAQ_MIN_TERM_SHARE):
+        self.hotel_info = hotel_info
+        self.responses = responses
+        self.scorer = scorer
+        self.min_score = FAQ_MIN_SCORE[scorer] if min_score is None else min_score
+        self.min_terms = min_terms
+        self.min_share = min_share
+        self.indexes = {lang: PassageIndex(lang) for lang in SUPPORTED_LANGUAGES}
+        self._lock = threading.Lock()
+        self.refresh()
+
+        # Counters exposed through stats()
+        self.lookups = 0
+        self.answered = 0
+        self.lookup_seconds = 0.0
+
+    def refresh(self, hotel_info: Dict[str, Any] = None,
+                responses: Dict[str, Dict[str, Any]] = None) -> Dict[str, Dict[str, int]]:
+        """
+        Re-read the content (optionally replacing it) and re-index what changed.
+        The changes go into copies; the indexes are swapped in one assignment.
+        """
+        with self._lock:
+            self.hotel_info = hotel_info or self.hotel_info
+            self.responses = responses or self.responses
+            indexes = {lang: index.copy() for lang, index in self.indexes.items()}
+            changes = {lang: index.update(collect_sources(self.hotel_info, self.responses, lang))
+                       for lang, index in indexes.items()}
+            self.indexes = indexes
+            return changes
+
+    def search(self, message: str, lang: str) -> Optional[Match]:
+        indexes = self.indexes
+        index = indexes.get(lang) or indexes[CONTENT_LANGUAGE]
+        return index.search(message, self.scorer)
+
+    def answer(self, message: str, lang: str) -> Optional[str]:
+        """The best passage for the question, or None when nothing scores high enough."""
+        start = time.perf_counter()
+        found = self.search(message, lang)
+        answered = (found is not None and found.score >= self.min_score
+                    and found.matched >= self.min_terms and found.matched >= self.min_share * found.terms)
+        self.lookups += 1
+        self.answered += answered
+        self.lookup_seconds += time.perf_counter() - start
+        return found.passage['text'] if answered else None
+
+    def stats(self) -> Dict[str, Any]:
+        indexes = self.indexes
+        return {
+            'scorer': self.scorer,
+            'passages': {lang: len(index.passages) for lang, index in indexes.items()},
+            'terms': {lang: len(index.postings) for lang, index in indexes.items()},
+            'lookups': self.lookups,
+            'answer_rate': round(self.answered / self.lookups, 4) if self.lookups else 0.0,
+            'avg_lookup_us': round(self.lookup_seconds / self.lookups * 1e6, 2) if self.lookups else 0.0,
+        }
+
+
+if __name__ == "__main__":
+    # Fallback rate of generate_response on FAQ-style questions, without and with retrieval.
+    import timeit
+    import config
+    import chat_handlers
+    from context import context_manager
+    from tenants import current_tenant
+
+    questions = {
+        'en': [
+            "can I smoke in my room", "are weapons allowed", "what happens to lost items",
+            "is there room service at night", "do you have a spa", "how does the rewards program work",
+            "what is your cancellation policy", "do you share my personal information",
+            "how do I make a reservation", "is there a discount for long stays", "do you have a gym",
+            "is wifi free", "do you have laundry service", "what time is check out",
+            "is there a concierge", "what are the covid measures", "can I install a satellite dish",
+            "what is the weather like", "asdf qwerty",
+        ],
+        'so': [
+            "ma jiraa wifi", "jimicsi ma leedihiin", "dhar dhaqis ma jiraa", "taksi ma heli karaa",
+            "maqaaxi ma leedihiin", "qaanuunnada hotelka", "garoonka gaadiid ma jiraa",
+        ],
+    }
+
+    def fallback_rate(lang: str) -> float:
+        fallbacks = 0
+        for n, question in enumerate(questions[lang]):
+            user_id = f"__faq_bench_{lang}_{n}"
+            context_manager.update_profile(user_id, {'preferred_language': lang, 'state': 'normal'})
+            chat_handlers.generate_response(user_id, question)
+            fallbacks += context_manager.get_user_profile(user_id)['current_topic'] == 'fallback'
+            context_manager.forget_user(user_id)
+        return fallbacks / len(questions[lang])
+
+    faq = current_tenant().faq
+    for lang in questions:
+        config.FAQ_ENABLED = chat_handlers.FAQ_ENABLED = False
+        before = fallback_rate(lang)
+        chat_handlers.FAQ_ENABLED = True
+        after = fallback_rate(lang)
+        print(f"{lang}: fallback rate {before:.0%} -> {after:.0%} over {len(questions[lang])} questions")
+    for scorer in ('bm25', 'tfidf'):
+        index = faq.indexes['en']
+        runs = 5000
+        seconds = timeit.timeit(lambda: index.search("what is your cancellation policy", scorer), number=runs)
+        print(f"{scorer}: {seconds / runs * 1e6:.1f} us/lookup over {len(index.passages)} passages")
+    print(faq.stats())
@@ -0,0 +1,169 @@
+# fuzzy_gate.py
+"""
+Keyword gate in front of the WRatio fuzzy matcher.
+
+expand_to_canonical_fuzzy scores every token against every canonical group
+with fuzz.WRatio (threshold 80), one process.extractOne call per group. Most
+of those pairs cannot succeed: the token is too short or too long for the
+synonym, or shares too few characters with it.
+
+Every branch of WRatio (ratio, partial_ratio, token_ratio, partial_token_ratio,
+with their 0.95 / 0.9 / 0.6 scales) is an Indel ratio 200 * LCS / (len1 + len2)
+over substrings or reorderings of the two strings. The LCS can use at most
+x = min(A, B) characters, where A counts the token's characters present in
+the synonym and B the synonym's characters present in the token. So for a
+token of length m the best score against a synonym depends only on (m, x)
+and the synonym's lengths, and every synonym gets a precomputed table
+reachable[m][x].
+
+At run time one token needs its character counts, two small matrix-vector
+products (A and B for every synonym at once, from per-synonym count and
+presence matrices) and a table lookup. Groups and synonyms that cannot reach
+the threshold are dropped, and the survivors are scored with WRatio exactly
+as before, so results are bit-for-bit identical. A synonym containing the
+token as a whole word always survives (the token-set branches return 100).
+Gate decisions are memoized per token, since real traffic repeats the same
+few hundred words.
+
+The bound only holds for fuzz.WRatio without a processor. NLPProcessor builds
+one gate per language for its configured threshold and bypasses it when a
+language is configured with another scorer (see fuzzy_tuning.py).
+"""
+import threading
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from config import FUZZY_GATE_CACHE_SIZE
+
+# Bounds are compared with a little slack so float rounding can never prune a match.
+_EPSILON = 1e-6
+# Tokens longer than this skip the gate (and are always scored).
+MAX_GATED_LENGTH = 40
+
+
+def _partial_bound(m: int, x: int, n: int) -> float:
+    # partial_ratio aligns the shorter string with windows of the longer one:
+    # each window shares at most x characters with it.
+    return max(200.0 * x / (m + x), 200.0 * x / (n + x)) if x else 0.0
+
+
+def wratio_upper_bound(m: int, x: int, synonym: str) -> float:
+    """
+    Upper bound of fuzz.WRatio(token, synonym) for a whitespace-free token of
+    length m sharing at most x characters with the synonym (x = min(A, B)),
+    unless the token is one of the synonym's words.
+    """
+    n = len(synonym)
+    n_sort = len(' '.join(sorted(synonym.split())))
+    n_set = len(' '.join(sorted(set(synonym.split()))))
+    ratio = 200.0 * min(x, n) / (m + n)
+    len_ratio = max(m, n) / min(m, n)
+    if len_ratio < 1.5:
+        token_ratio = max(200.0 * min(x, n_sort) / (m + n_sort),
+                          200.0 * min(x, n_set) / (m + n_set))
+        return max(ratio, 0.95 * token_ratio)
+    partial_scale = 0.9 if len_ratio <= 8.0 else 0.6
+    partial_token = max(_partial_bound(m, x, n_sort), _partial_bound(m, x, n_set))
+    return max(ratio, partial_scale * _partial_bound(m, x, n), 0.95 * partial_scale * partial_token)
+
+
+class SynonymGate:
+    """
+    Precomputed WRatio reachability for one canonical map (one language).
+    """
+    def __init__(self, canonical_map: Dict[str, List[str]], threshold: float = 80,
+                 cache_size: int = FUZZY_GATE_CACHE_SIZE):
+        self.threshold = threshold
+        self.canonicals = list(canonical_map)
+        rows = [(group, synonym) for group, synonyms in enumerate(canonical_map.values())
+                for synonym in synonyms]
+        self._synonyms = [synonym for _, synonym in rows]
+        self._group_rows = [[row for row, (g, _) in enumerate(rows) if g == group]
+                            for group in range(len(self.canonicals))]
+        self._rows = np.arange(len(rows))
+
+        self._word_rows: Dict[str, List[int]] = {}
+        for row, (_, synonym) in enumerate(rows):
+            for word in set(synonym.split()):
+                self._word_rows.setdefault(word, []).append(row)
+
+        alphabet = sorted({ch for synonym in self._synonyms for ch in synonym})
+        self._alphabet = {ch: i for i, ch in enumerate(alphabet)}
+        counts = np.zeros((len(rows), len(alphabet)))
+        for row, synonym in enumerate(self._synonyms):
+            for ch, n in Counter(synonym).items():
+                counts[row, self._alphabet[ch]] = n
+        self._counts = counts
+        self._present = (counts > 0).astype(np.float64)
+
+        # reachable[row, m, x]
+        size = MAX_GATED_LENGTH + 1
+        self._reachable = np.zeros((len(rows), size, size), dtype=bool)
+        for row, synonym in enumerate(self._synonyms):
+            for m in range(1, size):
+                for x in range(m + 1):
+                    self._reachable[row, m, x] = wratio_upper_bound(m, x, synonym) >= threshold - _EPSILON
+
+        self._candidates = lru_cache(maxsize=cache_size)(self._compute)
+
+        # Counters exposed through stats()
+        self._lock = threading.Lock()
+        self.tokens = 0
+        self.tokens_rejected = 0
+        self.pairs_checked = 0
+        self.pairs_pruned = 0
+
+    def _compute(self, token: str) -> Tuple[Tuple[str, List[str]], ...]:
+        m = len(token)
+        if m > MAX_GATED_LENGTH:
+            alive = np.ones(len(self._synonyms), dtype=bool)
+        else:
+            token_counts = np.zeros(len(self._alphabet))
+            for ch in token:
+                index = self._alphabet.get(ch)
+                if index is not None:
+                    token_counts[index] += 1
+            a = self._present @ token_counts
+            b = self._counts @ (token_counts > 0)
+            x = np.minimum(a, b).astype(np.intp)
+            alive = self._reachable[self._rows, m, x]
+            alive[self._word_rows.get(token, [])] = True
+
+        survivors = []
+        for group, rows in enumerate(self._group_rows):
+            synonyms = [self._synonyms[row] for row in rows if alive[row]]
+            if synonyms:
+                survivors.append((self.canonicals[group], synonyms))
+        return tuple(survivors)
+
+    def candidates(self, token: str) -> Tuple[Tuple[str, List[str]], ...]:
+        """
+        (canonical, synonyms) pairs, in map order, restricted to the synonyms
+        that might still reach the threshold for this token.
+        """
+        survivors = self._candidates(token)
+        kept = sum(len(synonyms) for _, synonyms in survivors)
+        with self._lock:
+            self.tokens += 1
+            self.pairs_checked += len(self._synonyms)
+            self.pairs_pruned += len(self._synonyms) - kept
+            if not survivors:
+                self.tokens_rejected += 1
+        return survivors
+
+    def stats(self) -> Dict[str, Any]:
+        cache = self._candidates.cache_info()
+        with self._lock:
+            return {
+                'tokens': self.tokens,
+                'tokens_rejected': self.tokens_rejected,
+                'token_reject_rate': round(self.tokens_rejected / self.tokens, 4) if self.tokens else 0.0,
+                'pairs_pruned': self.pairs_pruned,
+                'pair_prune_rate': round(self.pairs_pruned / self.pairs_checked, 4)
+                if self.pairs_checked else 0.0,
+                'cached_tokens': cache.currsize,
+                'cache_hits': cache.hits,
+            }
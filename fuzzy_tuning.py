@@ -0,0 +1,222 @@
+# fuzzy_tuning.py
+"""
+Scorer / threshold evaluation for fuzzy synonym matching.
+
+Runs NLPProcessor.expand_to_canonical_fuzzy over a labelled corpus for every
+(scorer, threshold) pair of a grid, one grid cell per worker process, and
+reports for each cell and language:
+
+- precision / recall / F1 per canonical group, counting the groups a
+  message expands to against the groups it is labelled with (messages
+  labelled with no group measure false positives);
+- per-message latency (mean, p50, p95 in microseconds), timed in the worker.
+  The WRatio gate is built before timing, as warm-up does in production.
+
+The best cell per language (highest F1, then lowest p50) is printed as a
+FUZZY_LANGUAGE_SETTINGS entry for config.py. It can also be applied to a
+running worker with POST /admin/fuzzy/settings {"lang", "scorer", "threshold"}.
+
+The corpus is JSON lines, {"lang": "en", "message": "...", "canonicals": [...]};
+without --corpus a small built-in sample is used.
+
+    python fuzzy_tuning.py
+    python fuzzy_tuning.py --corpus traffic.jsonl --scorers WRatio QRatio --thresholds 75 80 85 --json report.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+# (lang, message, canonical groups it should expand to)
+Example = Tuple[str, str, List[str]]
+
+SAMPLE_CORPUS: List[Example] = [
+    ('en', "hello", ['greetings']),
+    ('en', "helo there", ['greetings']),
+    ('en', "hii", ['greetings']),
+    ('en', "good morning", ['greetings']),
+    ('en', "gud evening", ['greetings']),
+    ('en', "hey how are you", ['greetings']),
+    ('en', "thanks a lot", ['thanks']),
+    ('en', "thank you so much", ['thanks']),
+    ('en', "thnx", ['thanks']),
+    ('en', "cheers mate", ['thanks']),
+    ('en', "where are you located", ['location']),
+    ('en', "what is your adress", ['location']),
+    ('en', "directions to the hotel please", ['location']),
+    ('en', "send me the map location", ['location']),
+    ('en', "i want to book a room", ['booking']),
+    ('en', "can i reserve for friday", ['booking']),
+    ('en', "make a reservaton", ['booking']),
+    ('en', "bookng for two nights", ['booking']),
+    ('en', "any discounts this week", ['special_offer']),
+    ('en', "do you have special offers", ['special_offer']),
+    ('en', "promo code", ['special_offer']),
+    ('en', "what amenities do you have", ['amenities']),
+    ('en', "list your facilites", ['amenities']),
+    ('en', "hotel services", ['amenities']),
+    ('en', "how much is the deluxe room", []),
+    ('en', "what time is check out", []),
+    ('en', "is wifi free", []),
+    ('en', "asdf qwer", []),
+    ('en', "tell me about the rooms", []),
+    ('en', "do you allow pets", []),
+    ('en', "my flight is delayed", []),
+    ('so', "asc", ['greetings']),
+    ('so', "salaam", ['greetings']),
+    ('so', "asalaamu calaykum", ['greetings']),
+    ('so', "mahadsanid", ['thanks']),
+    ('so', "waad mahadsantahay", ['thanks']),
+    ('so', "mahadsnid walaal", ['thanks']),
+    ('so', "wa xagee meeshu", ['location']),
+    ('so', "meesha hotelka xagee ku taal", ['location']),
+    ('so', "qol ma heli karaa", []),
+    ('so', "immisa waaye qolka", []),
+    ('so', "ma jiraa wifi", []),
+]
+
+DEFAULT_THRESHOLDS = [70, 75, 80, 85, 90]
+
+
+def load_corpus(path: str) -> List[Example]:
+    corpus = []
+    with open(path, encoding='utf-8') as fh:
+        for line in fh:
+            if line.strip():
+                item = json.loads(line)
+                corpus.append((item['lang'], item['message'], list(item.get('canonicals', []))))
+    return corpus
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)] if ordered else 0.0
+
+
+def _scores(tp: int, fp: int, fn: int) -> Dict[str, float]:
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    recall = tp / (tp + fn) if tp + fn else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {'precision': round(precision, 4), 'recall': round(recall, 4), 'f1': round(f1, 4),
+            'tp': tp, 'fp': fp, 'fn': fn}
+
+
+def evaluate(scorer: str, threshold: float, corpus: List[Example], repeat: int = 3) -> Dict[str, Any]:
+    """Accuracy and latency of one (scorer, threshold) over the corpus, per language."""
+    from config import FUZZY_GATE_ENABLED
+    from nlp import nlp_processor
+
+    canonicals = set(nlp_processor.canonical_map)
+    languages = sorted({lang for lang, _, _ in corpus})
+    if FUZZY_GATE_ENABLED and scorer == 'WRatio':
+        for lang in languages:
+            nlp_processor.fuzzy_gate(lang, threshold)
+
+    counts = defaultdict(lambda: defaultdict(lambda: [0, 0, 0]))   # lang -> group -> [tp, fp, fn]
+    latencies = defaultdict(list)                                  # lang -> microseconds per message
+    for lang, message, expected in corpus:
+        predicted = set()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            tokens = nlp_processor.expand_to_canonical_fuzzy(message, lang, scorer, threshold)
+            latencies[lang].append((time.perf_counter() - start) * 1e6)
+            predicted = {token for token in tokens if token in canonicals}
+        expected = set(expected)
+        for group in predicted | expected:
+            cell = counts[lang][group]
+            if group in predicted and group in expected:
+                cell[0] += 1
+            elif group in predicted:
+                cell[1] += 1
+            else:
+                cell[2] += 1
+
+    result = {'scorer': scorer, 'threshold': threshold, 'languages': {}}
+    for lang in languages:
+        groups = {group: _scores(*counts[lang][group]) for group in sorted(counts[lang])}
+        total = [sum(cell[i] for cell in counts[lang].values()) for i in range(3)]
+        times = latencies[lang]
+        result['languages'][lang] = dict(
+            _scores(*total),
+            messages=sum(1 for item in corpus if item[0] == lang),
+            mean_us=round(sum(times) / len(times), 1),
+            p50_us=round(_percentile(times, 0.5), 1),
+            p95_us=round(_percentile(times, 0.95), 1),
+            groups=groups,
+        )
+    return result
+
+
+def _evaluate_cell(args) -> Dict[str, Any]:
+    return evaluate(*args)
+
+
+def run_grid(corpus: List[Example], scorers: List[str], thresholds: List[float],
+             workers: int = None, repeat: int = 3) -> List[Dict[str, Any]]:
+    """Evaluate every (scorer, threshold) pair, one cell per worker process."""
+    cells = [(scorer, threshold, corpus, repeat) for scorer in scorers for threshold in thresholds]
+    workers = workers or min(len(cells), os.cpu_count() or 1)
+    # fork shares the already loaded models with the workers where available.
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        return list(pool.map(_evaluate_cell, cells))
+
+
+def recommend(results: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Per language, the cell with the highest F1 (then the lowest p50 latency)."""
+    best: Dict[str, Dict[str, Any]] = {}
+    for result in results:
+        for lang, stats in result['languages'].items():
+            key = (stats['f1'], -stats['p50_us'])
+            current = best.get(lang)
+            if current is None or key > current['key']:
+                best[lang] = {'key': key, 'scorer': result['scorer'], 'threshold': result['threshold'],
+                              'stats': stats}
+    return {lang: {'scorer': cell['scorer'], 'threshold': cell['threshold'], 'stats': cell['stats']}
+            for lang, cell in best.items()}
+
+
+def print_report(results: List[Dict[str, Any]], best: Dict[str, Dict[str, Any]]):
+    print(f"{'scorer':<18}{'thr':>5}  {'lang':<5}{'P':>7}{'R':>7}{'F1':>7}{'mean us':>10}{'p50 us':>9}{'p95 us':>9}")
+    for result in results:
+        for lang, stats in sorted(result['languages'].items()):
+            print(f"{result['scorer']:<18}{result['threshold']:>5g}  {lang:<5}"
+                  f"{stats['precision']:>7.2f}{stats['recall']:>7.2f}{stats['f1']:>7.2f}"
+                  f"{stats['mean_us']:>10.1f}{stats['p50_us']:>9.1f}{stats['p95_us']:>9.1f}")
+    for lang, cell in sorted(best.items()):
+        print(f"\nbest for {lang}: {cell['scorer']} at {cell['threshold']:g}")
+        for group, stats in cell['stats']['groups'].items():
+            print(f"  {group:<16} P {stats['precision']:.2f}  R {stats['recall']:.2f}"
+                  f"  (tp {stats['tp']}, fp {stats['fp']}, fn {stats['fn']})")
+    settings = {lang: {'scorer': cell['scorer'], 'threshold': cell['threshold']} for lang, cell in best.items()}
+    print(f"\nFUZZY_LANGUAGE_SETTINGS = {json.dumps(settings)}")
+
+
+def main():
+    from nlp import FUZZY_SCORERS
+
+    parser = argparse.ArgumentParser(description="Fuzzy synonym matching: scorer / threshold grid evaluation")
+    parser.add_argument('--corpus', help="labelled JSON-lines corpus; the built-in sample if omitted")
+    parser.add_argument('--scorers', nargs='+', default=list(FUZZY_SCORERS), choices=list(FUZZY_SCORERS))
+    parser.add_argument('--thresholds', nargs='+', type=float, default=DEFAULT_THRESHOLDS)
+    parser.add_argument('--workers', type=int, help="worker processes (default: one per cell, up to the CPU count)")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per message")
+    parser.add_argument('--json', help="also write the full report to this file")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else SAMPLE_CORPUS
+    results = run_grid(corpus, args.scorers, args.thresholds, args.workers, args.repeat)
+    best = recommend(results)
+    print_report(results, best)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as fh:
+            json.dump({'results': results, 'best': best}, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
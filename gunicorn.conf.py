@@ -0,0 +1,42 @@
+# gunicorn.conf.py
+# Preload the app in the master so spaCy and the indexes are loaded once and
+# shared copy-on-write by every worker (see preload.py).
+import os
+
+preload_app = True
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+
+def when_ready(server):
+    # Runs in the master after the app is imported and before any worker forks.
+    from config import SERVE_ONLY
+    from preload import warm_up
+    if SERVE_ONLY:
+        return   # each worker warms up in the background instead (post_worker_init)
+    report = warm_up()
+    for stage in report['stages']:
+        if stage['ok']:
+            server.log.info("warm-up %s: %.1f ms %s", stage['stage'], stage['ms'], stage['detail'])
+        else:
+            # Workers still start, but /readyz keeps them out of rotation.
+            server.log.error("warm-up %s failed: %s", stage['stage'], stage['error'])
+    server.log.info("warm-up finished in %.1f ms (%d objects frozen)",
+                    report['total_ms'], report['frozen_objects'])
+
+
+def post_worker_init(worker):
+    from config import SERVE_ONLY
+    from logging_setup import setup_logging
+    from preload import memory_report, warm_up_in_background
+    from profiling import intent_profiler
+    # The log writer thread does not survive fork; each worker starts its own.
+    setup_logging()
+    if SERVE_ONLY:
+        warm_up_in_background()
+    # Workers reset inherited signal handlers, so install the toggle per worker.
+    intent_profiler.install_signal_handler()
+    memory = memory_report()
+    if memory:
+        worker.log.info("worker %s memory: shared %d kB, private %d kB (pss %d kB)",
+                        worker.pid, memory['shared_kb'], memory['private_kb'], memory['pss_kb'])
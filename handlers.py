@@ -1,8 +1,7 @@
 # handlers.py
-from typing import Callable, Optional, List, Dict
+from typing import Any, Callable, Optional, List, Dict, Iterable
 import random
-from config import HOTEL_INFO, RESPONSES
-from nlp import nlp_processor
+from tenants import HOTEL_INFO, RESPONSES, nlp_processor, intent_handler
 from context import context_manager
 
 # --------------------------
@@ -18,25 +17,79 @@ class IntentHandler:
     def __init__(self):
         self.handlers = []
         self.fallback_handler = None
+        self._ordered = None  # handlers sorted by priority, built on first match
+        self._by_token = None  # first pattern token -> [(rank, handler, pattern)], built with _ordered
 
     def register_handler(self, 
                         intents: List[str], 
                         handler: Callable,
                         priority: int = 0,
-                        context_requirements: List[str] = None):
+                        context_requirements: List[str] = None,
+                        entities: List[str] = None,
+                        name: str = None):
         """
         Register a new intent handler with:
         - intents: List of trigger phrases
         - handler: Function to execute
         - priority: Higher executes first
         - context_requirements: Required context keys
+        - entities: Entity kinds the handler needs (see entity_memory.py)
+        - name: The intent it answers (default: the handler's name without 'handle_')
         """
         self.handlers.append({
+            'name': name or handler.__name__.replace('handle_', '', 1),
             'patterns': [p.lower().split() for p in intents],
             'handler': handler,
             'priority': priority,
-            'context_requirements': context_requirements or []
+            'context_requirements': context_requirements or [],
+            'entities': entities or []
         })
+        self._ordered = None
+
+    def compile(self) -> List[Dict]:
+        """Sort handlers by priority once instead of on every match."""
+        if self._ordered is None:
+            self._ordered = sorted(self.handlers, key=lambda x: -x['priority'])
+            by_token: Dict[str, List] = {}
+            for rank, handler in enumerate(self._ordered):
+                for pattern in handler['patterns']:
+                    if pattern:
+                        by_token.setdefault(pattern[0], []).append((rank, handler, pattern))
+            self._by_token = by_token
+        return self._ordered
+
+    def add_patterns(self, intent: str, phrases: List[str]) -> int:
+        """
+        Add trigger phrases to the handler already triggered by 'intent'
+        (e.g. approved in synonym_learning.py). Returns how many were new.
+        """
+        key = intent.lower().split()
+        for handler in self.handlers:
+            if key in handler['patterns']:
+                new = [p.lower().split() for p in phrases if p.lower().split() not in handler['patterns']]
+                handler['patterns'] = handler['patterns'] + new
+                self._ordered = None
+                return len(new)
+        raise KeyError(intent)
+
+    def match_tokens(self, tokens: Iterable[str], context: Dict[str, Any]) -> Optional[Dict]:
+        """
+        The highest-priority handler whose pattern is contained in 'tokens' and
+        whose context requirements are met, or None. Looks up each token in an
+        index of pattern first tokens instead of scanning every handler.
+        """
+        self.compile()
+        token_set = set(tokens)
+        best = None
+        for token in token_set:
+            for rank, handler, pattern in self._by_token.get(token, ()):
+                if best is not None and rank >= best[0]:
+                    break
+                if all(p in token_set for p in pattern) and \
+                        all(context.get(req) for req in handler['context_requirements']):
+                    best = (rank, handler)
+                    break
+        return best[1] if best else None
 
     def set_fallback(self, handler: Callable):
         """Set fallback handler for unmatched intents"""
@@ -51,16 +104,17 @@ class IntentHandler:
         """
         message_tokens = message.lower().split()
         context = context_manager.get_context(user_id)
+        ordered = self.compile()
 
         # Check context-specific handlers first
-        for handler in sorted(self.handlers, key=lambda x: -x['priority']):
+        for handler in ordered:
             if all(context.get(req) for req in handler['context_requirements']):
                 if any(all(p in message_tokens for p in pattern) 
                      for pattern in handler['patterns']):
                     return handler['handler']
 
         # General intent matching
-        for handler in sorted(self.handlers, key=lambda x: -x['priority']):
+        for handler in ordered:
             if any(all(p in message_tokens for p in pattern) 
                  for pattern in handler['patterns']):
                 return handler['handler']
@@ -68,22 +122,118 @@ class IntentHandler:
         return self.fallback_handler
 
 import random
-from config import HOTEL_INFO, RESPONSES
+import re
+from config import API_ENDPOINTS
 from context import context_manager
-from nlp import nlp_processor
+from tenants import HOTEL_INFO, RESPONSES, current_tenant
+from entity_memory import memory_for, resolve_entities
+from stay_parser import parse_stay, nightly_rate
+from booking import booking_service
+from escalation import escalation_outbox, escalation_reply
 from handlers import IntentHandler  # Ensure this is imported from the correct module
 
+# Entity kinds handle_rooms needs: room names and the stay (rule-based), so spaCy NER never runs for it.
+ROOM_ENTITY_KINDS = ['room_types', 'stay']
+
+_PRICE_QUESTION = re.compile(r"\b(how much|price|prices|cost|costs|rate|rates|qiimaha|qiime|imisa)\b")
+
+
+def is_room_followup(message: str, user_id: str) -> bool:
+    """
+    True for a price question ("how much is it?") or a stay length/dates
+    ("2 nights from next friday") when the session already remembers a room
+    type from an earlier turn, and for a priced stay ("how much for 3 nights?")
+    even without one.
+    """
+    price_question = bool(_PRICE_QUESTION.search(message.lower()))
+    remembered = memory_for(user_id).latest('room_types') is not None
+    if price_question and remembered:
+        return True
+    return (price_question or remembered) and parse_stay(message) is not None
+
 # --------------------------
 # Conversation Handlers
 # --------------------------
 
+def render_room_list() -> str:
+    """
+    Render the bullet list of rooms shared by the room responses.
+    HOTEL_INFO is static, so this is computed once per tenant.
+    """
+    return current_tenant().template('room_list', lambda: "\n".join(
+        f"- {room['type']} ({room['price']})" for room in HOTEL_INFO["rooms"]
+    ))
+
+
+def _stay_dates(stay: dict, lang: str) -> str:
+    if not stay.get('check_in') or not stay.get('check_out'):
+        return ""
+    return RESPONSES[lang]["stay_dates"].format(**stay)
+
+
+def stay_availability(stay: dict):
+    """
+    Live availability for a dated stay from the booking engine, or None when
+    the stay has no dates or the engine cannot answer right now.
+    """
+    if not stay or not stay.get('check_in') or not stay.get('check_out'):
+        return None
+    return booking_service.availability(stay['check_in'], stay['check_out'])
+
+
+def _room_rate(room: dict, availability) -> float:
+    # The engine's current rate when we have one, otherwise the listed price.
+    live = availability.get(room["type"]) if availability else None
+    return live['rate'] if live else nightly_rate(room["price"])
+
+
+def render_stay_quote(room: dict, stay: dict, lang: str, availability=None) -> str:
+    """Total price of a stay in one room, e.g. 3 nights x $49, plus what is still free."""
+    rate = _room_rate(room, availability)
+    quote = RESPONSES[lang]["stay_quote"].format(
+        room_type=room["type"],
+        nights=stay['nights'],
+        dates=_stay_dates(stay, lang),
+        total=rate * stay['nights'],
+        price=f"${rate:,.0f}/night",
+    )
+    live = availability.get(room["type"]) if availability else None
+    if live:
+        key = "stay_available" if live['available'] > 0 else "stay_sold_out"
+        quote += " " + RESPONSES[lang][key].format(room_type=room["type"], available=live['available'])
+    return quote
+
+
+def _render_stay_rows(stay: dict, lang: str, availability=None, only_available: bool = False) -> str:
+    rows = []
+    for room in HOTEL_INFO["rooms"]:
+        live = availability.get(room["type"]) if availability else None
+        sold_out = live is not None and live['available'] <= 0
+        if sold_out and only_available:
+            continue
+        row = f"- {room['type']}: ${_room_rate(room, availability) * stay['nights']:,.0f}"
+        if sold_out:
+            row += f" ({RESPONSES[lang]['sold_out_label']})"
+        rows.append(row)
+    return "\n".join(rows)
+
+
+def render_stay_room_list(stay: dict, lang: str, availability=None) -> str:
+    """All rooms with their total for the stay."""
+    room_list = _render_stay_rows(stay, lang, availability)
+    return RESPONSES[lang]["stay_room_list"].format(
+        nights=stay['nights'], dates=_stay_dates(stay, lang), room_list=room_list
+    )
+
+
 def handle_rooms(message: str, user_id: str, lang: str) -> str:
     """
     Handle room-related queries with context tracking.
     
     This function extracts entities from the user's message and attempts to find
     a matching room from HOTEL_INFO. It updates the user's context and returns either
-    detailed room information or a list of available rooms.
+    detailed room information or a list of available rooms. When the guest gave
+    a stay length or dates, the total for the stay is quoted as well.
     
     Args:
         message (str): The user's input message.
@@ -93,7 +243,9 @@ def handle_rooms(message: str, user_id: str, lang: str) -> str:
     Returns:
         str: A response with room details or a list of available rooms.
     """
-    entities = nlp_processor.extract_entities(message)
+    # Rooms named in this message, or the last one the guest talked about.
+    entities = resolve_entities(user_id, message, ROOM_ENTITY_KINDS)
+    stay = entities['stay'][0] if entities.get('stay') else None
     user_context = context_manager.get_context(user_id)
     
     if entities.get('room_types'):
@@ -102,9 +254,7 @@ def handle_rooms(message: str, user_id: str, lang: str) -> str:
             room = next(r for r in HOTEL_INFO["rooms"] if r["type"].lower() == room_type)
         except StopIteration:
             # If no room is found, return a default message with the room list.
-            room_list = "\n".join(
-                f"- {room['type']} ({room['price']})" for room in HOTEL_INFO["rooms"]
-            )
+            room_list = render_room_list()
             return RESPONSES[lang].get(
                 "room_not_found", 
                 "Sorry, we could not find that room. Here are the available options:\n{room_list}"
@@ -115,16 +265,42 @@ def handle_rooms(message: str, user_id: str, lang: str) -> str:
             'last_room_viewed': room_type,
             'fallback_attempts': 0
         })
-        return RESPONSES[lang]["room_details"].format(**room)
+        details = RESPONSES[lang]["room_details"].format(room_type=room["type"], **room)
+        if stay and stay.get('nights'):
+            details += "\n\n" + render_stay_quote(room, stay, lang, stay_availability(stay))
+        return details
     
+    # A stay without a room: quote every room for that many nights.
+    if stay and stay.get('nights'):
+        return render_stay_room_list(stay, lang, stay_availability(stay))
+
     # If no specific room type is mentioned, return a list of available rooms.
-    room_list = "\n".join(
-        f"- {room['type']} ({room['price']})" for room in HOTEL_INFO["rooms"]
-    )
+    room_list = render_room_list()
     return RESPONSES[lang]["room_list"].format(room_list=room_list)
 
 
-def handle_fallback(user_id: str, lang: str) -> str:
+def handle_booking(message: str, user_id: str, lang: str) -> str:
+    """
+    Answer a booking request. With dates for the stay, list the rooms the
+    booking engine still has free and their totals; otherwise (or when the
+    engine cannot answer) point to the online booking portal.
+    """
+    entities = resolve_entities(user_id, message, ['stay'])
+    stay = entities['stay'][0] if entities['stay'] else None
+    availability = stay_availability(stay)
+    if availability is None:
+        return RESPONSES[lang]["booking_portal"].format(booking_url=API_ENDPOINTS['booking'])
+
+    if not any(live['available'] > 0 for live in availability.values()):
+        return RESPONSES[lang]["booking_sold_out"].format(phone=HOTEL_INFO["phone"], **stay)
+    return RESPONSES[lang]["booking_availability"].format(
+        room_list=_render_stay_rows(stay, lang, availability, only_available=True),
+        booking_url=API_ENDPOINTS['booking'],
+        **stay
+    )
+
+
+def handle_fallback(user_id: str, lang: str, message: str = None) -> str:
     """
     Improved fallback handling to reduce unnecessary live agent escalations.
     """
@@ -151,10 +327,8 @@ def handle_fallback(user_id: str, lang: str) -> str:
 
     # Escalate only after 3 failed attempts
     if attempts >= 3:
-        return (
-            "I'm having trouble understanding. Let me connect you to a live agent. "
-            "<a href='https://wa.me/252638533333' target='_blank'>Click here to chat on WhatsApp</a>"
-        )
+        escalation_outbox.escalate(user_id, lang, "fallback", message)
+        return escalation_reply("fallback")
 
     return random.choice(RESPONSES[lang]["fallback"])
 
@@ -187,24 +361,31 @@ def handle_help(message: str, user_id: str, lang: str) -> str:
 # Intent Handler Setup
 # --------------------------
 
-# Instantiate the intent handler.
-intent_handler = IntentHandler()
-
-# Register core intents.
-intent_handler.register_handler(
-    intents=["room", "rooms", "accommodation", "suite"],
-    handler=handle_rooms,
-    priority=2,
-    context_requirements=["booking_stage"]  # Adjust or remove based on your context design.
-)
-
-intent_handler.register_handler(
-    intents=["help", "assist", "confused"],
-    handler=handle_help,
-    priority=3
-)
-
-# Set the fallback handler.
-intent_handler.set_fallback(
-    lambda msg, uid, lang: handle_fallback(uid, lang)
-)
+def build_intent_handler() -> IntentHandler:
+    """
+    Build the intent table. Each tenant compiles its own (see tenants.py);
+    the module-level intent_handler is the current tenant's.
+    """
+    # Instantiate the intent handler.
+    handler_table = IntentHandler()
+
+    # Register core intents.
+    handler_table.register_handler(
+        intents=["room", "rooms", "accommodation", "suite"],
+        handler=handle_rooms,
+        priority=2,
+        context_requirements=["booking_stage"],  # Adjust or remove based on your context design.
+        entities=ROOM_ENTITY_KINDS
+    )
+
+    handler_table.register_handler(
+        intents=["help", "assist", "confused"],
+        handler=handle_help,
+        priority=3
+    )
+
+    # Set the fallback handler.
+    handler_table.set_fallback(
+        lambda msg, uid, lang: handle_fallback(uid, lang, msg)
+    )
+    return handler_table
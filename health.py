@@ -0,0 +1,85 @@
+# health.py
+"""
+Liveness and readiness probes for orchestrated deployments.
+
+- GET /healthz (liveness): the process is up and answering. It touches no
+  index or store, so it stays green while a worker warms up, and a failing
+  session store does not get healthy workers restarted.
+- GET /readyz (readiness): 200 once warm-up (preload.py) has run in this
+  process or its master, every stage passed, the chat self-test included,
+  and the session store answers a trivial query; 503 otherwise.
+
+/readyz reports the warm state: per-stage load timings, the index sizes
+recorded by the stages, and session counts. Everything except the store ping
+comes from the warm-up report in memory; the session counts (a COUNT(*) on a
+SQLite store) are recomputed at most every HEALTH_DETAIL_TTL_SECONDS, so
+probing every second costs next to nothing.
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, Tuple
+
+from config import HEALTH_DETAIL_TTL_SECONDS
+from context import context_manager
+from preload import warm_state
+
+
+class HealthProbe:
+    def __init__(self, detail_ttl: float = HEALTH_DETAIL_TTL_SECONDS):
+        self.detail_ttl = detail_ttl
+        self.started = time.time()
+        self._sessions: Dict[str, Any] = {}
+        self._sessions_at = 0.0
+        self._lock = threading.Lock()
+
+    def liveness(self) -> Dict[str, Any]:
+        return {'status': 'ok', 'pid': os.getpid(), 'uptime_s': round(time.time() - self.started, 3)}
+
+    def _session_backend(self) -> Tuple[bool, str]:
+        try:
+            return context_manager.sessions.store.ping(), None
+        except Exception as e:
+            return False, f"{type(e).__name__}: {e}"
+
+    def _session_counts(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._sessions_at >= self.detail_ttl:
+                snapshot = context_manager.sessions.snapshot()
+                self._sessions = {key: snapshot[key] for key in ('store', 'stored_sessions', 'cached_sessions')}
+                self._sessions_at = now
+            return self._sessions
+
+    def readiness(self) -> Tuple[bool, Dict[str, Any]]:
+        """Whether this worker should receive traffic, and why."""
+        report = warm_state()
+        stages = report['stages']
+        backend_ok, backend_error = self._session_backend()
+        checks = {
+            'warmed': report['warmed'],
+            'stages': report['warmed'] and report['ok'],
+            'self_test': any(stage['stage'] == 'warmup_query' and stage['ok'] for stage in stages),
+            'session_backend': backend_ok,
+        }
+        ready = all(checks.values())
+        body: Dict[str, Any] = {
+            'status': 'ready' if ready else ('warming' if report['warming'] else 'not_ready'),
+            'pid': os.getpid(),
+            'checks': checks,
+            'warm_up_ms': report.get('total_ms'),
+            'warmed_at': report.get('finished_at'),
+            'stages': {stage['stage']: stage['ms'] for stage in stages},
+            'details': {stage['stage']: stage['detail'] for stage in stages if stage['ok']},
+            'sessions': self._session_counts() if backend_ok else {},
+        }
+        errors = {stage['stage']: stage['error'] for stage in stages if not stage['ok']}
+        if backend_error:
+            errors['session_backend'] = backend_error
+        if errors:
+            body['errors'] = errors
+        return ready, body
+
+
+# Create a single global instance to be imported by other modules
+health_probe = HealthProbe()
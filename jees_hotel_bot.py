@@ -1,51 +1,297 @@
-import sys
+import logging
 import os
-from flask import Flask, request, jsonify
-from waitress import serve
-from markupsafe import Markup
-from setuptools._distutils import msvccompiler
-from config import *
-from handlers import *
+import sys
+import time
+from datetime import datetime
+from flask import Flask, Response, g, request
+from werkzeug.middleware.proxy_fix import ProxyFix
+from config import ADMIN_TOKEN, DEBUG_MODE, SERVE_ONLY, SUPPORTED_LANGUAGES, TENANT_API_KEY_HEADER, TRUSTED_PROXY_COUNT
 from context import context_manager
-from nlp import NLPProcessor
-from chat_handlers import generate_response, handle_language_selection
+from admission import admission_controller
+from sharding import user_locks
+from preload import startup_report, warm_up, warm_up_in_background
+from suggest import suggestion_service
+from archive import history_archive
+from profiling import intent_profiler
+from booking import booking_service
+from tenants import tenant_registry
+from request_watchdog import request_watchdog
+from escalation import escalation_outbox
+from health import health_probe
+from synonym_learning import synonym_learner
+from logging_setup import REQUEST_ID_HEADER, bind_request_id, clear_request_id, logging_stats, setup_logging
+from serialization import RequestError, batch_response, chat_response, decode_request, json_response
+from chat_handlers import generate_response
 from nlp import nlp_processor  # global NLPProcessor
 
+# Before the app exists, so Flask's logger goes through the queue instead of its own handler.
+setup_logging()
+access_log = logging.getLogger('jees.access')
+chat_log = logging.getLogger('jees.chat')
+
 app = Flask(__name__)
+if TRUSTED_PROXY_COUNT:
+    # Take the guest's address from X-Forwarded-For so rate limits and sessions are per guest.
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_COUNT)
+
+@app.before_request
+def bind_correlation_id():
+    # Every log line of the request carries this id; clients may pass their own.
+    g.request_id = bind_request_id(request.headers.get(REQUEST_ID_HEADER))
+    g.started = time.perf_counter()
+
+@app.after_request
+def log_request(response):
+    response.headers[REQUEST_ID_HEADER] = g.request_id
+    if request.path.startswith('/api'):
+        access_log.info("request", extra={'fields': {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'ms': round((time.perf_counter() - g.started) * 1000, 2),
+        }})
+    return response
+
+@app.teardown_request
+def unbind_correlation_id(exc):
+    clear_request_id()
+
+@app.before_request
+def require_admin_token():
+    # /admin/* needs X-Admin-Token when ADMIN_TOKEN is set, otherwise a loopback client.
+    if not request.path.startswith('/admin/'):
+        return None
+    if SERVE_ONLY:
+        return json_response({"error": "Not found"}, 404)
+    if ADMIN_TOKEN:
+        if request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+            return json_response({"error": "Forbidden"}, 403)
+    elif request.remote_addr not in ('127.0.0.1', '::1'):
+        return json_response({"error": "Forbidden"}, 403)
+    return None
+
+def request_tenant():
+    # The hotel is picked by API key or Host; its guests' sessions are its own.
+    return tenant_registry.for_request(request.host, request.headers.get(TENANT_API_KEY_HEADER))
 
 @app.route('/')
 def home():
     return "Welcome to Jees Hotel Chatbot! Use /chatbot at the end of the URL to start chatting"
 
+@app.route('/healthz', methods=['GET'])
+def liveness_probe():
+    # Liveness: answers as long as the process does, warm or not.
+    return json_response(health_probe.liveness())
+
+@app.route('/readyz', methods=['GET'])
+def readiness_probe():
+    # Readiness: 503 until warm-up and its self-test passed and the session store answers.
+    ready, body = health_probe.readiness()
+    return json_response(body, 200 if ready else 503)
+
 @app.route('/api', methods=['POST'])
+@admission_controller.guard
+@request_watchdog.guard
 def api_handler():
     try:
-        data = request.get_json()
-        action = data.get("action")
+        # Decoded and validated against the request schemas in one pass.
+        action, data = decode_request(request.get_data(cache=False))
+    except RequestError as e:
+        return json_response({"error": str(e)}, e.status)
+    request_watchdog.mark('decode')
 
+    try:
+        # Synonyms approved on another worker (a stat() every few seconds at most).
+        synonym_learner.refresh()
+        tenant = request_tenant()
+        user_id = tenant.user_id(request.remote_addr)
+        if context_manager.check_rate_limit(user_id):
+            return chat_response("Please wait a moment before sending another message.")
+        request_watchdog.mark('rate_limit')
+        messages = [data['message']] if action == "chat" else data['messages']
+        request_watchdog.update(messages=messages)
+        responses = []
+        # Messages from the same user are processed one at a time, in order.
+        with user_locks.lock_for(user_id), tenant_registry.activate(tenant):
+            request_watchdog.mark('lock_wait')
+            for message in messages:
+                with intent_profiler.profile_request() as tag:
+                    responses.append(generate_response(user_id, message))
+                    profile = context_manager.get_user_profile(user_id)
+                    tag.update(intent=profile['current_topic'], lang=profile['preferred_language'])
+                    request_watchdog.update(**tag)
+                chat_log.debug("message handled", extra={'fields': dict(tag)})
         if action == "chat":
-            user_id = request.remote_addr
-            if context_manager.check_rate_limit(user_id):
-                return jsonify({"response": "Please wait a moment before sending another message."})
-            if not data or 'message' not in data:
-                return jsonify({"error": "Invalid request"}), 400
-            response = generate_response(user_id, data['message'])
-            return jsonify({"response": response})
-        else:
-            return jsonify({"error": "Invalid action"}), 400
-
-    except Exception as e:
-        app.logger.error(f"API error: {str(e)}")
-        return jsonify({"error": "Internal server error"}), 500
+            return chat_response(responses[0])
+        return batch_response(responses)
+
+    except Exception:
+        app.logger.exception("API error")
+        return json_response({"error": "Internal server error"}, 500)
+
+@app.route('/api/suggest', methods=['GET'])
+def suggest_handler():
+    # Keystroke autocomplete: a pure index lookup, never touches the NLP path.
+    tenant = request_tenant()
+    lang = request.args.get('lang')
+    if not lang:
+        profile = context_manager.peek_user_profile(tenant.user_id(request.remote_addr))
+        lang = profile.get('preferred_language') if profile else None
+    with tenant_registry.activate(tenant):
+        suggestions = suggestion_service.complete(
+            request.args.get('q', ''), lang, request.args.get('k', type=int)
+        )
+    return json_response({"suggestions": suggestions})
+
+@app.route('/admin/admission', methods=['GET'])
+def admission_status():
+    # Expose the admission controller state for monitoring.
+    return json_response(admission_controller.snapshot())
+
+@app.route('/admin/shards', methods=['GET'])
+def shard_status():
+    # Expose per-user lock striping contention for monitoring.
+    return json_response(user_locks.snapshot())
+
+@app.route('/admin/startup', methods=['GET'])
+def startup_status():
+    # Warm-up stage timings and this worker's shared/private memory split.
+    return json_response(startup_report())
+
+@app.route('/admin/sessions', methods=['GET'])
+def session_status():
+    # Local session cache hit rate, write-throughs, conflicts and invalidations.
+    return json_response(context_manager.sessions.snapshot())
+
+@app.route('/admin/events', methods=['GET'])
+def event_log_status():
+    # Event log segments, appends since the last compaction, last restore time.
+    return json_response(context_manager.events.snapshot() if context_manager.events else {})
+
+@app.route('/admin/tenants', methods=['GET'])
+def tenant_status():
+    # Compiled tenants in this worker's LRU, compiles and evictions.
+    return json_response(tenant_registry.snapshot())
+
+@app.route('/admin/faq', methods=['GET', 'POST'])
+def faq_status():
+    # GET: passages, answer rate, lookup time. POST: re-index changed content.
+    faq = tenant_registry.default.faq
+    if request.method == 'POST':
+        return json_response(faq.refresh())
+    return json_response(faq.stats())
+
+@app.route('/admin/slow', methods=['GET', 'POST'])
+def slow_requests():
+    # GET: the last N slow requests (?n=). POST: {"threshold_ms", "enabled"}.
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        request_watchdog.configure(threshold_ms=data.get('threshold_ms'), enabled=data.get('enabled'))
+    n = request.args.get('n', default=20, type=int)
+    return json_response(dict(request_watchdog.snapshot(), requests=request_watchdog.recent(n)))
+
+@app.route('/admin/fuzzy/settings', methods=['GET', 'POST'])
+def fuzzy_settings():
+    # GET: scorer and threshold per language. POST: {"lang", "scorer", "threshold"},
+    # applied to this worker's default tenant (see fuzzy_tuning.py for picking them).
+    processor = tenant_registry.default.nlp
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            processor.configure_fuzzy(data.get('lang'), data.get('scorer'), data.get('threshold'))
+        except (TypeError, ValueError) as e:
+            return json_response({"error": str(e)}, 400)
+    return json_response({lang or 'raw': dict(zip(('scorer', 'threshold'), processor.fuzzy_config(lang)))
+                          for lang in [None] + SUPPORTED_LANGUAGES})
+
+@app.route('/admin/escalations', methods=['GET'])
+def escalation_status():
+    # Outbox depth and delivery counters of live-agent handoffs.
+    return json_response(escalation_outbox.snapshot())
+
+@app.route('/admin/synonyms', methods=['GET', 'POST'])
+def learned_synonyms():
+    # GET: ranked proposals from fallback traffic. POST {"action": "analyze"} re-clusters in
+    # the background; {"action": "approve", "id", "target"?, "phrase"?} applies one.
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        if data.get('action') == 'analyze':
+            return json_response({"started": synonym_learner.analyze_in_background()})
+        if data.get('action') == 'approve':
+            try:
+                return json_response(synonym_learner.approve(data.get('id'), data.get('target'), data.get('phrase')))
+            except KeyError as e:
+                return json_response({"error": f"Unknown proposal or target: {e.args[0]}"}, 400)
+        return json_response({"error": "Invalid action"}, 400)
+    n = request.args.get('n', default=50, type=int)
+    return json_response(dict(synonym_learner.snapshot(), proposals=synonym_learner.proposals[:n],
+                              entries=synonym_learner.entries()))
+
+@app.route('/admin/logging', methods=['GET'])
+def logging_status():
+    # Queue depth, dropped records and batched writes of the logging pipeline.
+    return json_response(logging_stats())
+
+@app.route('/admin/fuzzy', methods=['GET'])
+def fuzzy_gate_status():
+    # How many tokens / canonical groups the fuzzy keyword gate skipped, per language.
+    return json_response(nlp_processor.fuzzy_gate_stats())
+
+@app.route('/admin/history/intents', methods=['GET'])
+def history_intents():
+    # Intent counts per hour over the archived turns of the last N hours.
+    hours = request.args.get('hours', default=24, type=int)
+    since = datetime.now().timestamp() - hours * 3600
+    return json_response({"turns": len(history_archive),
+                          "counts": history_archive.intent_counts_per_hour(since=since)})
+
+@app.route('/admin/history/messages', methods=['GET'])
+def history_messages():
+    # A user's last N archived messages.
+    user = request.args.get('user', '')
+    n = request.args.get('n', default=20, type=int)
+    return json_response({"user": user, "messages": history_archive.last_messages(user, n)})
+
+@app.route('/admin/booking', methods=['GET'])
+def booking_status():
+    # Booking-engine cache, coalescing and circuit-breaker counters.
+    return json_response(booking_service.snapshot())
+
+@app.route('/admin/profiling', methods=['GET', 'POST'])
+def profiling_control():
+    # GET: status and hotspot table. POST: {"enabled", "sample_rate", "mode", "reset"}.
+    if request.method == 'POST':
+        options = request.get_json(silent=True) or {}
+        if options.get('reset'):
+            intent_profiler.reset()
+        try:
+            intent_profiler.configure(enabled=options.get('enabled'),
+                                      sample_rate=options.get('sample_rate'),
+                                      mode=options.get('mode'))
+        except ValueError as e:
+            return json_response({"error": str(e)}, 400)
+    status = intent_profiler.snapshot()
+    status['hotspots'] = intent_profiler.hotspots(
+        top=request.args.get('top', default=20, type=int),
+        intent=request.args.get('intent'),
+        lang=request.args.get('lang'),
+    )
+    return json_response(status)
+
+@app.route('/admin/profiling/flamegraph', methods=['GET'])
+def profiling_flamegraph():
+    # Collapsed stacks, ready for flamegraph.pl or speedscope.
+    return Response(intent_profiler.collapsed_stacks(), mimetype='text/plain',
+                    headers={'Content-Disposition': 'attachment; filename=intents.folded'})
 
 @app.route('/chatbot', methods=['GET'])
 def chatbot_interface():
     # Handle GET requests by serving the chatbot web interface.
-    user_id = request.remote_addr
+    user_id = request_tenant().user_id(request.remote_addr)
     # Reset the user’s chosen language on each page refresh
-    profile = context_manager.get_user_profile(user_id)
-    profile['preferred_language'] = None
-    profile['state'] = 'awaiting_language'
+    with user_locks.lock_for(user_id):
+        context_manager.update_profile(user_id, {'preferred_language': None,
+                                                 'state': 'awaiting_language'})
 
     # Return the HTML for the chat interface
     return '''
@@ -169,18 +415,75 @@ def chatbot_interface():
         .bot-message a:hover {
           text-decoration: underline;
         }
+        #suggestions {
+          display: flex;
+          flex-wrap: wrap;
+          gap: 6px;
+          padding: 0 15px;
+          background: rgba(255, 255, 255, 0.75);
+        }
+        #suggestions button {
+          border: 1px solid var(--primary-color);
+          background: var(--white);
+          color: var(--primary-color);
+          border-radius: 15px;
+          padding: 4px 10px;
+          margin-top: 8px;
+          font-size: 13px;
+          cursor: pointer;
+        }
       </style>
     </head>
     <body>
       <div id="chat-container">
         <div id="chat-box"></div>
+        <div id="suggestions"></div>
         <div id="message-input">
-          <input type="text" id="message" placeholder="Type your message..." onkeypress="checkEnter(event)">
+          <input type="text" id="message" placeholder="Type your message..." onkeypress="checkEnter(event)" oninput="scheduleSuggest()" autocomplete="off">
           <button id="send-btn" onclick="sendMessage()">Send</button>
         </div>
       </div>
 
       <script>
+        // Debounced autocomplete: one request per pause in typing, cached per prefix.
+        const suggestCache = new Map();
+        let suggestTimer = null;
+        let suggestAbort = null;
+
+        function scheduleSuggest() {
+          clearTimeout(suggestTimer);
+          suggestTimer = setTimeout(fetchSuggestions, 150);
+        }
+
+        async function fetchSuggestions() {
+          const q = document.getElementById("message").value.trim().toLowerCase();
+          if (!q) return renderSuggestions([]);
+          if (suggestCache.has(q)) return renderSuggestions(suggestCache.get(q));
+          if (suggestAbort) suggestAbort.abort();
+          suggestAbort = new AbortController();
+          try {
+            const res = await fetch("/api/suggest?q=" + encodeURIComponent(q), { signal: suggestAbort.signal });
+            const data = await res.json();
+            suggestCache.set(q, data.suggestions);
+            renderSuggestions(data.suggestions);
+          } catch (e) { /* aborted or offline: keep the current suggestions */ }
+        }
+
+        function renderSuggestions(items) {
+          const box = document.getElementById("suggestions");
+          box.innerHTML = "";
+          items.forEach(text => {
+            const chip = document.createElement("button");
+            chip.textContent = text;
+            chip.onclick = () => {
+              document.getElementById("message").value = text;
+              renderSuggestions([]);
+              sendMessage();
+            };
+            box.appendChild(chip);
+          });
+        }
+
         async function sendMessage() {
           const input = document.getElementById("message");
           const message = input.value.trim();
@@ -209,8 +512,9 @@ def chatbot_interface():
           // Append bot's response
           chatBox.innerHTML += `<div class="message bot-message"><p>${botMessage}</p></div>`;
 
-          // Clear input and scroll to bottom
+          // Clear input and suggestions, then scroll to bottom
           input.value = "";
+          renderSuggestions([]);
           chatBox.scrollTop = chatBox.scrollHeight;
         }
 
@@ -226,4 +530,13 @@ def chatbot_interface():
     '''
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    SERVE_ONLY = SERVE_ONLY or '--serve-only' in sys.argv
+    if SERVE_ONLY:
+        # Minimal production server: accept requests at once, warm up meanwhile.
+        from waitress import serve
+        warm_up_in_background()
+        serve(app, host='0.0.0.0', port=int(os.environ.get('PORT', 8000)))
+    else:
+        warm_up()
+        intent_profiler.install_signal_handler()
+        app.run(debug=DEBUG_MODE)
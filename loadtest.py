@@ -0,0 +1,204 @@
+# loadtest.py
+"""
+Deterministic load-test harness with a simulated guest population.
+
+Each simulated guest walks the real conversation flow: GET /chatbot, pick a
+language, then a scripted mix of greetings, room, location and fallback
+messages (repeated fallbacks escalate to a live agent). Every guest has its
+own remote address and every choice comes from a seeded RNG, so two runs with
+the same seed send exactly the same traffic.
+
+In-process (default) the Flask test client is used directly. With --url the
+requests go to a running server; guests are then told apart with
+X-Forwarded-For, so start the server with JEES_TRUSTED_PROXIES=1.
+
+    python loadtest.py --sessions 2000 --concurrency 200 --seed 7
+    python loadtest.py --url http://127.0.0.1:8000 --sessions 500 --json report.json
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+RATE_LIMIT_TEXT = "Please wait a moment before sending another message."
+
+# name -> (weight, language choice, messages)
+SCENARIOS: Dict[str, Tuple[int, str, List[str]]] = {
+    'greeting': (25, '1', ["hello", "good morning", "thank you"]),
+    'rooms': (25, '1', ["tell me about the rooms", "deluxe room", "how much is it?", "book a room"]),
+    'location': (15, '1', ["where are you located?", "directions please"]),
+    'somali': (15, '2', ["asalaamu calaykum", "wa xagee meeshu?", "mahadsanid"]),
+    'fallback_escalation': (20, '1', ["asdf qwer", "zzz what", "blorp", "still nothing"]),
+}
+
+
+def guest_address(index: int) -> str:
+    return f"10.{(index >> 16) & 255}.{(index >> 8) & 255}.{index & 255}"
+
+
+class InProcessTransport:
+    def __init__(self):
+        from jees_hotel_bot import app
+        self.app = app
+        self._local = threading.local()
+
+    def _client(self):
+        if not hasattr(self._local, 'client'):
+            self._local.client = self.app.test_client()
+        return self._local.client
+
+    def request(self, method: str, path: str, address: str, body: Dict = None) -> Tuple[int, Any]:
+        client = self._client()
+        environ = {'REMOTE_ADDR': address}
+        if method == 'GET':
+            response = client.get(path, environ_base=environ)
+        else:
+            response = client.post(path, json=body, environ_base=environ)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpTransport:
+    def __init__(self, base_url: str, timeout: float = 30.0):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def request(self, method: str, path: str, address: str, body: Dict = None) -> Tuple[int, Any]:
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method, headers={
+            'Content-Type': 'application/json', 'X-Forwarded-For': address,
+        })
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as res:
+                payload = res.read()
+                status = res.status
+        except urllib.error.HTTPError as e:
+            payload, status = e.read(), e.code
+        try:
+            return status, json.loads(payload)
+        except ValueError:
+            return status, None
+
+
+class LoadTest:
+    def __init__(self, transport, sessions: int, concurrency: int, seed: int, think_time: float):
+        self.transport = transport
+        self.sessions = sessions
+        self.concurrency = concurrency
+        self.seed = seed
+        self.think_time = think_time
+        self._lock = threading.Lock()
+        self.results: Dict[str, Dict[str, Any]] = defaultdict(
+            lambda: {'latencies': [], 'errors': 0, 'rate_limited': 0, 'shed': 0})
+
+    def _record(self, step: str, latency: float, status: int, payload: Any):
+        with self._lock:
+            result = self.results[step]
+            result['latencies'].append(latency)
+            if status == 503:
+                result['shed'] += 1
+            elif status >= 400:
+                result['errors'] += 1
+            elif isinstance(payload, dict) and payload.get('response') == RATE_LIMIT_TEXT:
+                result['rate_limited'] += 1
+
+    def _call(self, step: str, method: str, path: str, address: str, body: Dict = None):
+        start = time.perf_counter()
+        try:
+            status, payload = self.transport.request(method, path, address, body)
+        except Exception:
+            status, payload = 599, None
+        self._record(step, time.perf_counter() - start, status, payload)
+
+    def run_session(self, index: int):
+        rng = random.Random(self.seed * 1_000_003 + index)
+        names = list(SCENARIOS)
+        name = rng.choices(names, weights=[SCENARIOS[n][0] for n in names])[0]
+        _, language, messages = SCENARIOS[name]
+        address = guest_address(index)
+
+        self._call(f"{name}:0 page", 'GET', '/chatbot', address)
+        steps = [language] + messages
+        for number, message in enumerate(steps, start=1):
+            if self.think_time:
+                time.sleep(self.think_time * rng.uniform(1.0, 1.2))
+            self._call(f"{name}:{number} {message[:24]}", 'POST', '/api', address,
+                       {'action': 'chat', 'message': message})
+
+    def run(self) -> Dict[str, Any]:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            list(pool.map(self.run_session, range(self.sessions)))
+        elapsed = time.perf_counter() - start
+        return self.report(elapsed)
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        steps = {}
+        total = errors = 0
+        for step in sorted(self.results):
+            result = self.results[step]
+            latencies = sorted(result['latencies'])
+            count = len(latencies)
+            total += count
+            errors += result['errors']
+            steps[step] = {
+                'requests': count,
+                'error_rate': round(result['errors'] / count, 4),
+                'rate_limited': result['rate_limited'],
+                'shed': result['shed'],
+                'p50_ms': round(1000 * percentile(latencies, 50), 2),
+                'p95_ms': round(1000 * percentile(latencies, 95), 2),
+                'p99_ms': round(1000 * percentile(latencies, 99), 2),
+            }
+        return {
+            'sessions': self.sessions,
+            'requests': total,
+            'elapsed_s': round(elapsed, 3),
+            'throughput_rps': round(total / elapsed, 1) if elapsed else 0.0,
+            'error_rate': round(errors / total, 4) if total else 0.0,
+            'steps': steps,
+        }
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"{report['sessions']} sessions, {report['requests']} requests in {report['elapsed_s']}s "
+          f"-> {report['throughput_rps']} req/s, error rate {report['error_rate']:.2%}")
+    print(f"{'step':<40}{'reqs':>7}{'err%':>7}{'ratelim':>9}{'shed':>6}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for step, row in report['steps'].items():
+        print(f"{step:<40}{row['requests']:>7}{row['error_rate'] * 100:>7.2f}{row['rate_limited']:>9}"
+              f"{row['shed']:>6}{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{row['p99_ms']:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated guest load test for the Jees Hotel chatbot")
+    parser.add_argument('--sessions', type=int, default=1000, help="number of simulated guests")
+    parser.add_argument('--concurrency', type=int, default=100, help="guests active at the same time")
+    parser.add_argument('--seed', type=int, default=1, help="seed for the scenario mix")
+    parser.add_argument('--think-time', type=float, default=2.1,
+                        help="seconds between a guest's messages (the rate limit is 2s)")
+    parser.add_argument('--url', help="base URL of a running server; in-process if omitted")
+    parser.add_argument('--json', help="also write the report to this file")
+    args = parser.parse_args()
+
+    transport = HttpTransport(args.url) if args.url else InProcessTransport()
+    report = LoadTest(transport, args.sessions, args.concurrency, args.seed, args.think_time).run()
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(report, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,76 @@
 # nlp.py
-import spacy
-import spacy.cli
-from typing import List, Dict, Any
+import re
+import threading
+from typing import List, Dict, Any, Tuple
 from rapidfuzz import process, fuzz
+from werkzeug.local import LocalProxy
 from datetime import datetime
-from config import HOTEL_INFO
-# context.py
-import os
-# Attempt loading spacy
-try:
-    nlp = spacy.load("en_core_web_sm")
-except OSError:
-    spacy.cli.download("en_core_web_sm")
-    nlp = spacy.load("en_core_web_sm")
+from config import HOTEL_INFO, FUZZY_GATE_ENABLED, FUZZY_SCORER, FUZZY_THRESHOLD, FUZZY_LANGUAGE_SETTINGS
+from fuzzy_gate import SynonymGate
+from normalize import normalizer_for, tokenize
+from stay_parser import parse_stay
+
+ENTITY_KINDS = ('room_types', 'dates', 'numbers', 'stay')
+# Scorers expand_to_canonical_fuzzy can be configured with (see fuzzy_tuning.py).
+FUZZY_SCORERS = {
+    'WRatio': fuzz.WRatio,
+    'QRatio': fuzz.QRatio,
+    'ratio': fuzz.ratio,
+    'partial_ratio': fuzz.partial_ratio,
+    'token_sort_ratio': fuzz.token_sort_ratio,
+    'token_set_ratio': fuzz.token_set_ratio,
+}
+SPACY_MODEL = "en_core_web_sm"
+
+_spacy_model = None
+_spacy_lock = threading.Lock()
+
+
+def spacy_model():
+    """
+    The spaCy pipeline, loaded on first use: importing spaCy and the model takes
+    most of a second, and only English tokenization and NER need it. Warm-up
+    loads it before the first request (see preload.py).
+    """
+    global _spacy_model
+    if _spacy_model is None:
+        with _spacy_lock:
+            if _spacy_model is None:
+                import spacy
+                try:
+                    model = spacy.load(SPACY_MODEL)
+                except OSError:
+                    import spacy.cli
+                    spacy.cli.download(SPACY_MODEL)
+                    model = spacy.load(SPACY_MODEL)
+                _spacy_model = model
+    return _spacy_model
+
+
+# The pipeline under its old name, for callers outside the hot path.
+nlp = LocalProxy(spacy_model)
+
 # ======================
 # Enhanced NLP Utilities
 # ======================
+def _language_view(canonical_map: Dict[str, List[str]], lang: str):
+    """ canonical_map normalized for a language, and its synonym -> canonical index. """
+    normalize = normalizer_for(lang)
+    lang_map = {
+        canonical: list(dict.fromkeys(normalize(s) for s in synonyms))
+        for canonical, synonyms in canonical_map.items()
+    }
+    index = {}
+    for canonical, synonyms in lang_map.items():
+        for synonym in synonyms:
+            index.setdefault(synonym, canonical)
+    return lang_map, index
+
 class NLPProcessor:
     """
     Advanced NLP processing with entity recognition and canonical synonym expansion.
     """
-    def __init__(self):
+    def __init__(self, canonical_map: Dict[str, List[str]] = None, hotel_info: Dict[str, Any] = None):
     # This dictionary maps your *canonical* keyword to a list of 10 or more synonyms.
     # For example, "book" covers synonyms like "reserve", "schedule", "arrange".
          self.canonical_map = {
@@ -77,20 +127,153 @@ class NLPProcessor:
             "meshu xagay ku taal"
         ]
     }
+         if canonical_map is not None:
+             self.canonical_map = canonical_map
+         self.hotel_info = hotel_info if hotel_info is not None else HOTEL_INFO  # rooms for the matcher
+         self.synonym_index = None
+         self.language_maps = {}     # lang -> canonical_map with normalized synonyms
+         self.language_indexes = {}  # lang -> normalized synonym -> canonical
+         self.fuzzy_gates = {}       # lang (None = raw canonical_map) -> SynonymGate
+         # lang -> {'scorer', 'threshold'} overrides of FUZZY_SCORER / FUZZY_THRESHOLD
+         self.fuzzy_settings = {lang: dict(settings) for lang, settings in FUZZY_LANGUAGE_SETTINGS.items()}
+         self._room_pattern = None
+         self._room_aliases = {}
+         self.ner_calls = 0           # spaCy NER invocations, for monitoring
 
-    def fuzzy_match_token(self, token: str, synonyms: list, threshold=80) -> bool:
+    def build_index(self) -> Dict[str, str]:
+        """
+        Precompute the exact-match synonym -> canonical lookup used by expand_synonyms.
+        The first canonical group listing a synonym wins, as in a linear scan.
+        Per-language normalized views are dropped and rebuilt on next use.
+        """
+        index = {}
+        for canonical, synonyms in self.canonical_map.items():
+            for synonym in synonyms:
+                index.setdefault(synonym, canonical)
+        self.synonym_index = index
+        self.language_maps = {}
+        self.language_indexes = {}
+        self.fuzzy_gates = {}
+        return index
+
+    def language_map(self, lang: str) -> Dict[str, List[str]]:
+        """
+        canonical_map with every synonym passed through the language's normalizer,
+        so normalized input and synonyms agree on spelling variants.
+        """
+        lang_map = self.language_maps.get(lang)
+        if lang_map is None:
+            lang_map, index = _language_view(self.canonical_map, lang)
+            self.language_indexes[lang] = index
+            self.language_maps[lang] = lang_map
+        return lang_map
+
+    def add_synonyms(self, canonical: str, synonyms: List[str]) -> List[str]:
+        """
+        Add synonyms to a canonical group (created if new) while serving, e.g.
+        entries approved in synonym_learning.py. The new map, indexes and gates
+        are built aside and then swapped in, so a concurrent message sees either
+        the old or the new vocabulary. Returns the synonyms actually added.
+        """
+        known = set(self.canonical_map.get(canonical, []))
+        added = [s for s in dict.fromkeys(s.lower().strip() for s in synonyms) if s and s not in known]
+        if not added:
+            return []
+        canonical_map = {group: list(members) for group, members in self.canonical_map.items()}
+        canonical_map.setdefault(canonical, []).extend(added)
+        index = dict(self.synonym_index) if self.synonym_index is not None else None
+        if index is not None:
+            for synonym in added:
+                index.setdefault(synonym, canonical)
+        views = {lang: _language_view(canonical_map, lang) for lang in self.language_maps}
+        gates = {}
+        for lang, gate in self.fuzzy_gates.items():
+            gate_map = canonical_map if lang is None else (views.get(lang) or _language_view(canonical_map, lang))[0]
+            gates[lang] = SynonymGate(gate_map, gate.threshold)
+
+        self.canonical_map = canonical_map
+        self.synonym_index = index
+        self.language_maps = {lang: view[0] for lang, view in views.items()}
+        self.language_indexes = {lang: view[1] for lang, view in views.items()}
+        self.fuzzy_gates = gates
+        return added
+
+    def fuzzy_config(self, lang: str = None) -> Tuple[str, float]:
+        """ The (scorer, threshold) fuzzy matching uses for a language. """
+        settings = self.fuzzy_settings.get(lang, {})
+        return settings.get('scorer', FUZZY_SCORER), settings.get('threshold', FUZZY_THRESHOLD)
+
+    def configure_fuzzy(self, lang: str = None, scorer: str = None, threshold: float = None) -> Tuple[str, float]:
+        """
+        Change a language's scorer and/or threshold at run time (this process only).
+        The WRatio gate for the new threshold is built here rather than on the next message.
+        """
+        if scorer is not None and scorer not in FUZZY_SCORERS:
+            raise ValueError(f"Unknown scorer: {scorer}")
+        settings = dict(self.fuzzy_settings.get(lang, {}))
+        if scorer is not None:
+            settings['scorer'] = scorer
+        if threshold is not None:
+            settings['threshold'] = float(threshold)
+        self.fuzzy_settings[lang] = settings
+        scorer, threshold = self.fuzzy_config(lang)
+        if FUZZY_GATE_ENABLED and scorer == 'WRatio':
+            self.fuzzy_gate(lang, threshold)
+        return scorer, threshold
+
+    def fuzzy_gate(self, lang: str = None, threshold: float = None) -> SynonymGate:
+        """
+        WRatio upper-bound gate for the language's canonical map (see fuzzy_gate.py),
+        rebuilt when the threshold changes.
+        """
+        if threshold is None:
+            threshold = self.fuzzy_config(lang)[1]
+        gate = self.fuzzy_gates.get(lang)
+        if gate is None or gate.threshold != threshold:
+            canonical_map = self.canonical_map if lang is None else self.language_map(lang)
+            gate = self.fuzzy_gates[lang] = SynonymGate(canonical_map, threshold)
+        return gate
+
+    def fuzzy_gate_stats(self) -> Dict[str, Any]:
+        return {lang or 'raw': gate.stats() for lang, gate in self.fuzzy_gates.items()}
+
+    def fuzzy_match_token(self, token: str, synonyms: list, threshold=80, scorer=fuzz.WRatio) -> bool:
         """ Return True if the token closely matches any of the synonyms. """
-        best_match, score, index = process.extractOne(token, synonyms, scorer=fuzz.WRatio)
+        best_match, score, index = process.extractOne(token, synonyms, scorer=scorer)
         return score >= threshold
 
-    def expand_to_canonical_fuzzy(self, text: str) -> List[str]:
-        tokens = text.lower().split()
+    def expand_to_canonical_fuzzy(self, text: str, lang: str = None, scorer: str = None,
+                                  threshold: float = None) -> List[str]:
+        """
+        Map each token to the first canonical keyword it fuzzily matches.
+        Somali text and synonyms go through the language's normalizer and
+        rule-based tokenizer (see normalize.py); English keeps a bare split(),
+        since the tokenizer would cut "check-in" into short tokens ("in") that
+        fuzzy-match unrelated synonyms.
+        Scorer and threshold default to the language's configuration (fuzzy_config).
+        """
+        configured_scorer, configured_threshold = self.fuzzy_config(lang)
+        scorer = scorer or configured_scorer
+        threshold = configured_threshold if threshold is None else threshold
+        if lang is None:
+            tokens = text.lower().split()
+            canonical_map = self.canonical_map
+        elif lang == 'en':
+            tokens = text.lower().split()
+            canonical_map = self.language_map(lang)
+        else:
+            tokens = tokenize(normalizer_for(lang)(text))
+            canonical_map = self.language_map(lang)
+        # Only synonyms the gate cannot rule out get exact WRatio scoring. The bound
+        # only holds for WRatio: other scorers are run against every synonym.
+        gate = self.fuzzy_gate(lang, threshold) if FUZZY_GATE_ENABLED and scorer == 'WRatio' else None
+        score = FUZZY_SCORERS[scorer]
         expanded_tokens = []
 
         for token in tokens:
             matched_canonical = None
-            for canonical, synonyms in self.canonical_map.items():
-                if self.fuzzy_match_token(token, synonyms):
+            for canonical, synonyms in (gate.candidates(token) if gate else canonical_map.items()):
+                if self.fuzzy_match_token(token, synonyms, threshold, score):
                     matched_canonical = canonical
                     break
             if matched_canonical:
@@ -100,22 +283,27 @@ class NLPProcessor:
 
         return expanded_tokens
 
-    def expand_synonyms(self, text: str) -> List[str]:
+    def expand_synonyms(self, text: str, lang: str = None) -> List[str]:
         """
         Convert tokens in 'text' to their canonical form if they match
         any known synonyms in self.canonical_map.
+        Somali text skips spaCy and uses the rule-based normalizer/tokenizer.
         """
+        if lang is not None and lang != 'en':
+            self.language_map(lang)
+            synonym_index = self.language_indexes[lang]
+            return [synonym_index.get(token, token)
+                    for token in tokenize(normalizer_for(lang)(text))]
+
         # Use spaCy to tokenize and normalize to lowercase
-        doc = nlp(text.lower())
+        doc = spacy_model()(text.lower())
         expanded_tokens = []
 
+        synonym_index = self.synonym_index or self.build_index()
+
         for token in doc:
-            matched_canonical = None
-            # Check each canonical keyword and its synonyms
-            for canonical, synonyms in self.canonical_map.items():
-                if token.text in synonyms:
-                    matched_canonical = canonical
-                    break
+            # Look up the canonical keyword for this token, if any
+            matched_canonical = synonym_index.get(token.text)
 
             # If we found a match, use the canonical form; otherwise keep the original token
             if matched_canonical:
@@ -125,30 +313,71 @@ class NLPProcessor:
 
         return expanded_tokens
 
-    def extract_entities(self, text: str) -> Dict:
+    def room_type_pattern(self):
+        """
+        Compiled matcher for room names and their short forms ("super deluxe",
+        "twin room", "suite"...). Longer aliases are tried first so "super deluxe
+        room" never matches as plain "deluxe room".
+        """
+        if self._room_pattern is None:
+            aliases = {}
+            for room in self.hotel_info["rooms"]:
+                full = room["type"].lower()
+                base = full[:-len(" room")] if full.endswith(" room") else full
+                for alias in [full, base] + base.split("/"):
+                    aliases.setdefault(alias, full)
+                    aliases.setdefault(f"{alias} room", full)
+            ordered = sorted(aliases, key=len, reverse=True)
+            self._room_aliases = aliases
+            self._room_pattern = re.compile(
+                r"\b(" + "|".join(re.escape(a) for a in ordered) + r")s?\b"
+            )
+        return self._room_pattern
+
+    def match_room_types(self, text: str) -> List[str]:
         """
-        Extract relevant entities (room types, dates, numbers) using spaCy.
+        Cheap, NER-free room type matcher. Returns full room type names
+        (lowercased, as in hotel_info) in the order they are mentioned.
         """
-        doc = nlp(text.lower())
+        pattern = self.room_type_pattern()
+        found = []
+        for match in pattern.finditer(text.lower()):
+            room_type = self._room_aliases[match.group(1)]
+            if room_type not in found:
+                found.append(room_type)
+        return found
+
+    def extract_entities(self, text: str, kinds: List[str] = None) -> Dict:
+        """
+        Extract relevant entities (room types, dates, numbers, stay).
+        Room types come from the compiled room matcher and 'stay' (check-in,
+        check-out, nights) from the rule-based stay parser; spaCy NER only runs
+        when 'dates' or 'numbers' are among the requested kinds (default: all).
+        """
+        kinds = ENTITY_KINDS if kinds is None else kinds
         entities = {
             'room_types': [],
             'dates': [],
-            'numbers': []
+            'numbers': [],
+            'stay': []
         }
 
-        # spaCy entity recognition for DATE and CARDINAL
-        for ent in doc.ents:
-            if ent.label_ == 'DATE':
-                entities['dates'].append(ent.text)
-            elif ent.label_ == 'CARDINAL':
-                entities['numbers'].append(ent.text)
-
-        # Check if user mentioned any known hotel room type by name
-        room_types = [room["type"].lower() for room in HOTEL_INFO["rooms"]]
-        entities['room_types'] = [
-            token.text for token in doc 
-            if token.text.lower() in room_types
-        ]
+        if 'room_types' in kinds:
+            entities['room_types'] = self.match_room_types(text)
+
+        if 'stay' in kinds:
+            stay = parse_stay(text)
+            entities['stay'] = [stay] if stay else []
+
+        if 'dates' in kinds or 'numbers' in kinds:
+            # spaCy entity recognition for DATE and CARDINAL
+            doc = spacy_model()(text.lower())
+            self.ner_calls += 1
+            for ent in doc.ents:
+                if ent.label_ == 'DATE':
+                    entities['dates'].append(ent.text)
+                elif ent.label_ == 'CARDINAL':
+                    entities['numbers'].append(ent.text)
 
         return entities
 nlp_processor = NLPProcessor()  # Global instance for app.py
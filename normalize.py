@@ -0,0 +1,85 @@
+# normalize.py
+"""
+Language-specific text normalization and tokenization.
+
+Somali input used to go through the English spaCy tokenizer (or a bare
+split()), so spelling variants such as "asalaamu calaykum", "Mahadsanid!" or
+words with diacritics never matched canonical_map. Each language here gets a
+normalizer built from precompiled translate tables and regexes:
+
+    1. Unicode folding   - NFKD, drop combining marks, casefold
+    2. Punctuation       - mapped to spaces with one str.translate call
+    3. Spelling variants - Somali only: long vowels, doubled consonants, the
+                           optional ayn 'c', 'ai'/'ei' diphthongs
+    4. Tokenization      - a single regex findall, no spaCy involved
+
+Synonyms are passed through the same normalizer, so both sides agree.
+"""
+import re
+import string
+import unicodedata
+from typing import Callable, Dict, List
+
+# Every ASCII punctuation mark plus common typographic ones becomes a space.
+# Apostrophes (Somali glottal stop, "su'aal") are removed so "su'aal" == "suaal".
+_PUNCTUATION_TABLE = str.maketrans(
+    {**{ch: ' ' for ch in string.punctuation + '“”‘’«»…–—¡¿'},
+     "'": None, '’': None, '‘': None, 'ʼ': None, '`': None}
+)
+_WHITESPACE = re.compile(r"\s+")
+_TOKEN = re.compile(r"[^\W_]+")
+
+# Somali spelling-variant collapsing, applied in order.
+_SOMALI_RULES = [
+    (re.compile(r"\bc(?=[aeiou])"), ""),        # optional ayn at word start: calaykum -> alaykum
+    (re.compile(r"([a-z])\1+"), r"\1"),          # long vowels, doubled consonants: assalaamu -> asalamu
+    (re.compile(r"[ae]i\b|[ae]i(?=[^aeiou])"), "ay"),  # alaikum -> alaykum
+]
+
+
+def fold_unicode(text: str) -> str:
+    """Strip accents/diacritics and casefold (e.g. 'Mahadsanîd' -> 'mahadsanid')."""
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+
+def normalize_en(text: str) -> str:
+    text = fold_unicode(text).translate(_PUNCTUATION_TABLE)
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def normalize_so(text: str) -> str:
+    text = fold_unicode(text).translate(_PUNCTUATION_TABLE)
+    for pattern, replacement in _SOMALI_RULES:
+        text = pattern.sub(replacement, text)
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def tokenize(normalized: str) -> List[str]:
+    """Rule-based tokenizer for text that has already been normalized."""
+    return _TOKEN.findall(normalized)
+
+
+NORMALIZERS: Dict[str, Callable[[str], str]] = {
+    'en': normalize_en,
+    'so': normalize_so,
+}
+
+
+def normalizer_for(lang: str) -> Callable[[str], str]:
+    return NORMALIZERS.get(lang, normalize_en)
+
+
+if __name__ == "__main__":
+    # Quick comparison with the spaCy tokenizer this replaces for Somali users.
+    import timeit
+    from nlp import nlp
+
+    sample = "Asalaamu calaykum! Mahadsanid, wa xage meeshu hotelka ku taal?"
+    print(normalize_so(sample), tokenize(normalize_so(sample)))
+    runs = 2000
+    rule = timeit.timeit(lambda: tokenize(normalize_so(sample)), number=runs) / runs
+    spacy_time = timeit.timeit(lambda: [t.text for t in nlp(sample.lower())], number=runs) / runs
+    print(f"rule-based: {rule * 1e6:.1f} us/message, spaCy: {spacy_time * 1e6:.1f} us/message")
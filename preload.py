@@ -0,0 +1,198 @@
+# preload.py
+"""
+Pre-warmed, fork-friendly application preload.
+
+warm_up() runs in the gunicorn master (see gunicorn.conf.py) before workers
+are forked: it loads the spaCy pipeline, builds the synonym and intent
+indexes, renders the static templates and answers a few synthetic queries,
+then freezes the heap with gc.freeze() so the garbage collector never touches
+(and copy-on-write never duplicates) those pages in the workers.
+
+Other modules can add their own stage with the @warmup_stage decorator.
+A stage that raises is recorded with its error instead of aborting the
+start; the last stage is a self-test of the chat path, and /readyz (see
+health.py) only reports ready once every stage, self-test included, passed.
+
+Importing the web app does none of this work (spaCy is only loaded by its
+stage or the first English message), so in serve-only mode (JEES_SERVE_ONLY)
+a worker starts serving right away and warms up in the background instead.
+"""
+import gc
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from config import SUPPORTED_LANGUAGES, EVENT_RESTORE_ON_START
+from context import context_manager
+
+_stages: List[Dict[str, Any]] = []
+_report: Dict[str, Any] = {'warmed': False, 'warming': False, 'ok': False, 'stages': []}
+
+WARMUP_USER_ID = '__warmup__'
+WARMUP_MESSAGES = ['1', 'hello', 'where is the hotel location', 'tell me about the rooms']
+# Self-test: the topic these warm-up messages must be recognised as
+WARMUP_EXPECTED_TOPICS = {'hello': 'greetings', 'where is the hotel location': 'location'}
+
+
+def warmup_stage(name: str):
+    """
+    Register a callable as a named warm-up stage. It may return a detail value
+    (e.g. an index size) that is recorded in the startup report.
+    """
+    def decorator(func: Callable) -> Callable:
+        _stages.append({'name': name, 'func': func})
+        return func
+    return decorator
+
+
+@warmup_stage('spacy_model')
+def _warm_spacy():
+    from nlp import spacy_model
+    model = spacy_model()
+    model("warm up the pipeline")
+    return {'pipeline': list(model.pipe_names)}
+
+
+@warmup_stage('event_replay')
+def _warm_sessions():
+    if not EVENT_RESTORE_ON_START:
+        return {'restored': 0}
+    return context_manager.restore_from_events()
+
+
+@warmup_stage('synonym_index')
+def _warm_synonyms():
+    from nlp import nlp_processor
+    return {'entries': len(nlp_processor.build_index())}
+
+
+@warmup_stage('learned_synonyms')
+def _warm_learned_synonyms():
+    from synonym_learning import synonym_learner
+    return {'applied': synonym_learner.refresh(force=True)}
+
+
+@warmup_stage('fuzzy_gates')
+def _warm_fuzzy_gates():
+    from nlp import nlp_processor
+    gates = [nlp_processor.fuzzy_gate(lang) for lang in [None] + SUPPORTED_LANGUAGES]
+    return {'languages': len(gates)}
+
+
+@warmup_stage('intent_index')
+def _warm_intents():
+    from handlers import intent_handler
+    return {'handlers': len(intent_handler.compile())}
+
+
+@warmup_stage('dialog')
+def _warm_dialog():
+    from chat_handlers import dialog
+    return {'states': len(dialog.compile())}
+
+
+@warmup_stage('templates')
+def _warm_templates():
+    from handlers import render_room_list
+    return {'room_list_chars': len(render_room_list())}
+
+
+@warmup_stage('faq_index')
+def _warm_faq():
+    from tenants import current_tenant
+    return current_tenant().faq.stats()['passages']
+
+
+@warmup_stage('warmup_query')
+def _warm_query():
+    from chat_handlers import generate_response
+    try:
+        for message in WARMUP_MESSAGES:
+            if not generate_response(WARMUP_USER_ID, message):
+                raise RuntimeError(f"self-test: no reply to {message!r}")
+            expected = WARMUP_EXPECTED_TOPICS.get(message)
+            topic = context_manager.get_user_profile(WARMUP_USER_ID)['current_topic']
+            if expected and topic != expected:
+                raise RuntimeError(f"self-test: {message!r} was taken as {topic!r}, expected {expected!r}")
+    finally:
+        context_manager.forget_user(WARMUP_USER_ID)
+    return {'messages': len(WARMUP_MESSAGES), 'checked': len(WARMUP_EXPECTED_TOPICS)}
+
+
+def warm_up(freeze: bool = True) -> Dict[str, Any]:
+    """
+    Run every registered stage once and record its timing. Safe to call again;
+    later calls simply re-run the stages.
+    """
+    stages = []
+    _report['warming'] = True
+    started = time.perf_counter()
+    for stage in _stages:
+        stage_start = time.perf_counter()
+        entry = {'stage': stage['name'], 'ok': True, 'detail': None}
+        try:
+            entry['detail'] = stage['func']()
+        except Exception as e:
+            entry.update(ok=False, error=f"{type(e).__name__}: {e}")
+        entry['ms'] = round(1000 * (time.perf_counter() - stage_start), 3)
+        stages.append(entry)
+
+    if freeze and hasattr(gc, 'freeze'):
+        # Move everything allocated so far into the permanent generation.
+        gc.collect()
+        gc.freeze()
+
+    _report.update({
+        'warmed': True,
+        'warming': False,
+        'ok': all(stage['ok'] for stage in stages),
+        'finished_at': round(time.time(), 3),
+        'pid': os.getpid(),
+        'total_ms': round(1000 * (time.perf_counter() - started), 3),
+        'frozen_objects': gc.get_freeze_count() if hasattr(gc, 'get_freeze_count') else 0,
+        'stages': stages,
+    })
+    return _report
+
+
+def warm_up_in_background() -> threading.Thread:
+    """
+    Serve-only start: run the stages in a thread while the worker already
+    accepts requests (the heap is not frozen, it is no longer shared anyway).
+    """
+    thread = threading.Thread(target=warm_up, kwargs={'freeze': False}, name='warm-up', daemon=True)
+    thread.start()
+    return thread
+
+
+def memory_report(pid: Optional[int] = None) -> Dict[str, int]:
+    """
+    Shared vs private memory (kB) for a process, from /proc/<pid>/smaps_rollup.
+    Returns an empty dict where procfs is unavailable (e.g. macOS, Windows).
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid or 'self'}/smaps_rollup") as fh:
+            for line in fh:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == 'kB':
+                    fields[parts[0].rstrip(':')] = int(parts[1])
+    except OSError:
+        return {}
+    return {
+        'rss_kb': fields.get('Rss', 0),
+        'pss_kb': fields.get('Pss', 0),
+        'shared_kb': fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0),
+        'private_kb': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+    }
+
+
+def warm_state() -> Dict[str, Any]:
+    """The warm-up report as it stands (no /proc reads; cheap enough for probes)."""
+    return _report
+
+
+def startup_report() -> Dict[str, Any]:
+    """Warm-up timings from the master plus this worker's memory split."""
+    return dict(_report, worker_pid=os.getpid(), memory=memory_report())
@@ -0,0 +1,210 @@
+# profiling.py
+"""
+Opt-in, intent-level request profiling.
+
+When enabled (at runtime, through /admin/profiling or the toggle signal), a
+configurable fraction of chat requests is profiled and tagged with the intent
+it matched and the user's language:
+
+- 'cprofile' mode runs cProfile around generate_response and aggregates the
+  stats per (intent, language) tag, for top-N hotspot tables;
+- 'stack' mode registers the request thread with a background sampler that
+  walks its stack every few milliseconds, giving collapsed stacks that
+  flamegraph.pl / speedscope render directly;
+- 'both' does both.
+
+Nothing is collected (and the sampler thread is stopped) while disabled.
+"""
+import cProfile
+import os
+import pstats
+import random
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import (
+    PROFILING_SAMPLE_RATE,
+    PROFILING_MODE,
+    PROFILING_STACK_INTERVAL_MS,
+    PROFILING_MAX_STACKS,
+    PROFILING_TOGGLE_SIGNAL,
+)
+
+MODES = ('cprofile', 'stack', 'both')
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class IntentProfiler:
+    """
+    Samples requests and aggregates profiles per (intent, language).
+    """
+    def __init__(self, sample_rate: float = PROFILING_SAMPLE_RATE, mode: str = PROFILING_MODE):
+        self.enabled = False
+        self.sample_rate = sample_rate
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._stats: Dict[Tuple[str, str], pstats.Stats] = {}
+        self._requests: Counter = Counter()
+        self._stacks: Counter = Counter()
+        self._active: Dict[int, List[Tuple[str, ...]]] = {}
+        self._sampler: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------
+    # Control
+    # ------------------------------------------------------------------
+    def configure(self, enabled: bool = None, sample_rate: float = None, mode: str = None):
+        if mode is not None:
+            if mode not in MODES:
+                raise ValueError(f"mode must be one of {MODES}")
+            self.mode = mode
+        if sample_rate is not None:
+            self.sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+        if enabled is not None:
+            self.enabled = bool(enabled)
+        if self.enabled and self.mode != 'cprofile':
+            self._start_sampler()
+
+    def toggle(self, *_signal_args):
+        """Flip profiling on/off; also usable directly as a signal handler."""
+        self.configure(enabled=not self.enabled)
+
+    def install_signal_handler(self):
+        """Toggle profiling with PROFILING_TOGGLE_SIGNAL (must run in the main thread)."""
+        signum = getattr(signal, PROFILING_TOGGLE_SIGNAL, None)
+        if signum is not None and threading.current_thread() is threading.main_thread():
+            signal.signal(signum, self.toggle)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._requests.clear()
+            self._stacks.clear()
+
+    # ------------------------------------------------------------------
+    # Collection
+    # ------------------------------------------------------------------
+    def _start_sampler(self):
+        with self._lock:
+            if self._sampler is None or not self._sampler.is_alive():
+                self._sampler = threading.Thread(target=self._sample_loop, name='intent-profiler',
+                                                 daemon=True)
+                self._sampler.start()
+
+    def _sample_loop(self):
+        interval = PROFILING_STACK_INTERVAL_MS / 1000.0
+        while self.enabled and self.mode != 'cprofile':
+            frames = sys._current_frames()
+            for ident, samples in list(self._active.items()):
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if stack:
+                    samples.append(tuple(reversed(stack)))
+            time.sleep(interval)
+
+    @contextmanager
+    def profile_request(self):
+        """
+        Profile the block if this request is sampled. Yields a tag dict the caller
+        fills in with 'intent' and 'lang' once they are known.
+        """
+        tag: Dict[str, Any] = {'intent': None, 'lang': None}
+        if not self.enabled or random.random() >= self.sample_rate:
+            yield tag
+            return
+
+        profiler = None
+        ident = threading.get_ident()
+        if self.mode in ('cprofile', 'both'):
+            profiler = cProfile.Profile()
+        if self.mode in ('stack', 'both'):
+            self._active[ident] = []
+        try:
+            if profiler:
+                try:
+                    profiler.enable()
+                except ValueError:
+                    # Another profiler already owns this thread/interpreter.
+                    profiler = None
+            yield tag
+        finally:
+            if profiler:
+                profiler.disable()
+            samples = self._active.pop(ident, [])
+            self._record(tag, profiler, samples)
+
+    def _record(self, tag: Dict[str, Any], profiler: Optional[cProfile.Profile],
+                samples: List[Tuple[str, ...]]):
+        key = (str(tag.get('intent') or 'unknown'), str(tag.get('lang') or 'none'))
+        with self._lock:
+            self._requests[key] += 1
+            if profiler is not None:
+                if key in self._stats:
+                    self._stats[key].add(profiler)
+                else:
+                    self._stats[key] = pstats.Stats(profiler)
+            for stack in samples:
+                collapsed = ';'.join(key + stack)
+                if collapsed in self._stacks or len(self._stacks) < PROFILING_MAX_STACKS:
+                    self._stacks[collapsed] += 1
+                else:
+                    self._stacks[';'.join(key) + ';[truncated]'] += 1
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+    def collapsed_stacks(self) -> str:
+        """Collapsed-stack text ('frame;frame;frame count' per line) for flame graphs."""
+        with self._lock:
+            return ''.join(f"{stack} {count}\n" for stack, count in sorted(self._stacks.items()))
+
+    def hotspots(self, top: int = 20, intent: str = None, lang: str = None) -> List[Dict[str, Any]]:
+        """
+        Top-N functions by own time, over all tags or one intent/language.
+        """
+        rows: Dict[Tuple[str, int, str], List[float]] = {}
+        with self._lock:
+            for (tag_intent, tag_lang), stats in self._stats.items():
+                if (intent and tag_intent != intent) or (lang and tag_lang != lang):
+                    continue
+                for func, (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+                    row = rows.setdefault(func, [0, 0.0, 0.0])
+                    row[0] += ncalls
+                    row[1] += tottime
+                    row[2] += cumtime
+        ranked = sorted(rows.items(), key=lambda item: -item[1][1])[:top]
+        return [
+            {
+                'function': f"{name} ({os.path.basename(filename)}:{line})",
+                'calls': calls,
+                'own_ms': round(1000 * own, 3),
+                'cumulative_ms': round(1000 * cumulative, 3),
+            }
+            for (filename, line, name), (calls, own, cumulative) in ranked
+        ]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'mode': self.mode,
+                'sample_rate': self.sample_rate,
+                'profiled_requests': {f"{intent}/{lang}": count
+                                      for (intent, lang), count in self._requests.items()},
+                'distinct_stacks': len(self._stacks),
+            }
+
+
+# Create a single global instance to be imported by other modules
+intent_profiler = IntentProfiler()
@@ -0,0 +1,213 @@
+# request_watchdog.py
+"""
+Slow-request watchdog.
+
+Every /api request runs under watch() (the guard decorator). The request
+thread records its messages, intent and language with update() and marks the end of
+each stage it goes through (decode, rate_limit, lock_wait, profile,
+room_match, expand, faq, handler, log) with mark(), which only costs a
+perf_counter() call. A monitor thread checks the requests in flight every
+WATCHDOG_POLL_MS; when one passes WATCHDOG_THRESHOLD_MS it takes a stack
+sample of the request thread right then, so the trace shows where the time
+is going rather than where the request happened to finish.
+
+When a flagged request completes, a record goes into a bounded ring buffer
+(served by /admin/slow) and, as the fields of a 'jees.watchdog' warning,
+into the JSON-lines log (see logging_setup.py):
+
+    elapsed and threshold, stage timings, the stage that was running at the
+    threshold and its stack sample, the matched intent and language, and the
+    messages with e-mail addresses and card / phone numbers redacted.
+"""
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Dict, List, Optional
+
+from config import (
+    WATCHDOG_ENABLED,
+    WATCHDOG_THRESHOLD_MS,
+    WATCHDOG_POLL_MS,
+    WATCHDOG_BUFFER_SIZE,
+    WATCHDOG_STACK_DEPTH,
+)
+
+_log = logging.getLogger('jees.watchdog')
+
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+# Digit runs with separators; only those with 9+ digits (phones, cards) are redacted,
+# so dates and prices stay readable.
+_NUMBER_RUN = re.compile(r"\+?\d[\d\s().-]{5,}\d")
+
+
+def _redact_number(match) -> str:
+    digits = sum(ch.isdigit() for ch in match.group(0))
+    if digits >= 13:
+        return "<card>"
+    return "<phone>" if digits >= 9 else match.group(0)
+
+
+def redact(text: str) -> str:
+    """The message with e-mail addresses and phone / card numbers masked."""
+    return _NUMBER_RUN.sub(_redact_number, _EMAIL.sub("<email>", text))
+
+
+class _Watch:
+    __slots__ = ('started', 'deadline', 'last_mark', 'stage', 'stages', 'tag', 'flagged_stage', 'stack')
+
+    def __init__(self, threshold: float):
+        self.started = self.last_mark = time.perf_counter()
+        self.deadline = self.started + threshold
+        self.stage = 'start'                 # the last stage that completed
+        self.stages: Dict[str, float] = {}
+        self.tag: Dict[str, Any] = {'messages': [], 'intent': None, 'lang': None}
+        self.flagged_stage: Optional[str] = None
+        self.stack: Optional[List[str]] = None
+
+
+class RequestWatchdog:
+    """
+    Flags requests slower than a threshold and keeps the last few in a ring buffer.
+    """
+    def __init__(self, threshold_ms: float = WATCHDOG_THRESHOLD_MS, enabled: bool = WATCHDOG_ENABLED,
+                 buffer_size: int = WATCHDOG_BUFFER_SIZE):
+        self.enabled = enabled
+        self.threshold_ms = threshold_ms
+        self.records: deque = deque(maxlen=buffer_size)
+        self._active: Dict[int, _Watch] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pid = None
+
+        # Counters exposed through snapshot()
+        self.watched = 0
+        self.slow = 0
+
+    # ------------------------------------------------------------------
+    # Request side
+    # ------------------------------------------------------------------
+    @contextmanager
+    def watch(self):
+        """Watch the block as one request."""
+        if not self.enabled:
+            yield
+            return
+        self._ensure_monitor()
+        ident = threading.get_ident()
+        watch = _Watch(self.threshold_ms / 1000.0)
+        self._local.watch = watch
+        self._active[ident] = watch
+        try:
+            yield
+        finally:
+            self._active.pop(ident, None)
+            self._local.watch = None
+            self.watched += 1
+            elapsed = time.perf_counter() - watch.started
+            if watch.flagged_stage is not None or elapsed * 1000 >= self.threshold_ms:
+                self._record(watch, elapsed)
+
+    def guard(self, view):
+        """Decorator running a Flask view under watch()."""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            with self.watch():
+                return view(*args, **kwargs)
+        return wrapper
+
+    def update(self, **fields):
+        """Set 'messages', 'intent' or 'lang' of this thread's request."""
+        watch = getattr(self._local, 'watch', None)
+        if watch is not None:
+            watch.tag.update(fields)
+
+    def mark(self, stage: str):
+        """End the current stage of this thread's request (no-op outside watch())."""
+        watch = getattr(self._local, 'watch', None)
+        if watch is None:
+            return
+        now = time.perf_counter()
+        watch.stages[stage] = watch.stages.get(stage, 0.0) + now - watch.last_mark
+        watch.last_mark = now
+        watch.stage = stage
+
+    # ------------------------------------------------------------------
+    # Monitor side
+    # ------------------------------------------------------------------
+    def _ensure_monitor(self):
+        # Threads do not survive fork(), so each worker starts its own.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                threading.Thread(target=self._monitor, name='request-watchdog', daemon=True).start()
+                self._pid = os.getpid()
+
+    def _monitor(self):
+        interval = WATCHDOG_POLL_MS / 1000.0
+        while True:
+            time.sleep(interval)
+            now = time.perf_counter()
+            overdue = [(ident, watch) for ident, watch in list(self._active.items())
+                       if watch.flagged_stage is None and now >= watch.deadline]
+            if not overdue:
+                continue
+            frames = sys._current_frames()
+            for ident, watch in overdue:
+                frame = frames.get(ident)
+                watch.stack = [
+                    f"{os.path.basename(entry.filename)}:{entry.lineno} {entry.name}"
+                    for entry in traceback.extract_stack(frame, limit=WATCHDOG_STACK_DEPTH)
+                ] if frame is not None else []
+                watch.flagged_stage = watch.stage
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+    def _record(self, watch: _Watch, elapsed: float):
+        record = {
+            'time': round(time.time(), 3),
+            'elapsed_ms': round(elapsed * 1000, 2),
+            'threshold_ms': self.threshold_ms,
+            'intent': watch.tag.get('intent'),
+            'lang': watch.tag.get('lang'),
+            'messages': [redact(message) for message in watch.tag.get('messages') or []],
+            'stages_ms': {name: round(seconds * 1000, 2) for name, seconds in watch.stages.items()},
+            # The stack was sampled while the stage after 'after_stage' was running.
+            'after_stage': watch.flagged_stage,
+            'stack': watch.stack or [],
+        }
+        self.slow += 1
+        self.records.append(record)
+        _log.warning("slow request", extra={'fields': record})
+
+    def configure(self, threshold_ms: float = None, enabled: bool = None):
+        if threshold_ms is not None:
+            self.threshold_ms = max(float(threshold_ms), 1.0)
+        if enabled is not None:
+            self.enabled = bool(enabled)
+
+    def recent(self, n: int = 20) -> List[Dict[str, Any]]:
+        """The last n slow requests, newest first."""
+        return list(self.records)[::-1][:n]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'threshold_ms': self.threshold_ms,
+            'watched': self.watched,
+            'slow': self.slow,
+            'buffered': len(self.records),
+            'in_flight': len(self._active),
+        }
+
+
+# Create a single global instance to be imported by other modules
+request_watchdog = RequestWatchdog()
@@ -0,0 +1,111 @@
+# serialization.py
+"""
+One JSON path for requests, responses, session snapshots and logs.
+
+orjson encodes straight to bytes (several times faster than the stdlib json
+module that request.get_json()/jsonify go through); if it is not installed
+the stdlib is used with the same interface. Session records hold only JSON
+types (timestamps are unix floats), so nothing needs a custom encoder.
+
+API requests are decoded from the raw body and checked against the
+predeclared REQUEST_SCHEMAS in the same pass. Chat replies are encoded by
+splicing the encoded text into a fixed prefix/suffix, and the bytes go
+straight into the Response without Flask's JSON provider.
+"""
+import json
+from typing import Any, Dict, List, Tuple
+
+from flask import Response
+
+from config import API_MAX_MESSAGE_LENGTH, API_BATCH_MAX_MESSAGES
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback, same behaviour, slower
+    orjson = None
+
+JSON_MIMETYPE = 'application/json'
+
+
+if orjson is not None:
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+    loads = orjson.loads
+    DecodeError = orjson.JSONDecodeError
+else:
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+
+    def loads(data):
+        return json.loads(data)
+
+    DecodeError = ValueError
+
+
+class RequestError(Exception):
+    """The request body does not match its schema; 'status' is the HTTP code."""
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+# action -> {field: (type, item type or None, maximum length)}
+REQUEST_SCHEMAS: Dict[str, Dict[str, Tuple[type, Any, int]]] = {
+    'chat': {'message': (str, None, API_MAX_MESSAGE_LENGTH)},
+    'batch': {'messages': (list, str, API_BATCH_MAX_MESSAGES)},
+}
+
+
+def decode_request(body: bytes) -> Tuple[str, Dict[str, Any]]:
+    """
+    Parse an /api body and validate it against REQUEST_SCHEMAS.
+    Returns (action, data); raises RequestError on anything malformed.
+    """
+    try:
+        data = loads(body)
+    except DecodeError:
+        raise RequestError("Invalid request")
+    if not isinstance(data, dict):
+        raise RequestError("Invalid request")
+    action = data.get('action')
+    schema = REQUEST_SCHEMAS.get(action)
+    if schema is None:
+        raise RequestError("Invalid action")
+    for field, (kind, item_kind, max_length) in schema.items():
+        value = data.get(field)
+        if not isinstance(value, kind) or len(value) > max_length:
+            raise RequestError("Invalid request")
+        if item_kind is not None and not all(
+                isinstance(item, item_kind) and len(item) <= API_MAX_MESSAGE_LENGTH for item in value):
+            raise RequestError("Invalid request")
+    return action, data
+
+
+def json_response(obj: Any, status: int = 200) -> Response:
+    return Response(dumps(obj), status=status, mimetype=JSON_MIMETYPE)
+
+
+def chat_response(text: str) -> Response:
+    # {"response": <text>} without building and walking a dict.
+    return Response(b'{"response":' + dumps(text) + b'}', mimetype=JSON_MIMETYPE)
+
+
+def batch_response(texts: List[str]) -> Response:
+    return Response(b'{"responses":' + dumps(texts) + b'}', mimetype=JSON_MIMETYPE)
+
+
+if __name__ == "__main__":
+    # Compare with the stdlib path the chat API used before.
+    import timeit
+    from datetime import datetime
+
+    reply = "Here are the comprehensive details for the Deluxe Room:\n- Price: $49/night " * 4
+    body = b'{"action": "chat", "message": "how much is the deluxe room for 3 nights?"}'
+    runs = 20000
+    fast = timeit.timeit(lambda: (decode_request(body), dumps({"response": reply})), number=runs) / runs
+    slow = timeit.timeit(lambda: (json.loads(body), json.dumps({"response": reply})), number=runs) / runs
+    print(f"{'orjson' if orjson else 'stdlib'}: {fast * 1e6:.2f} us/request, stdlib json: {slow * 1e6:.2f} us/request")
+    history = [{'timestamp': datetime.now().timestamp(), 'message': 'hello', 'intent': 'greetings'}] * 50
+    print(f"50-turn history: {len(dumps(history))} bytes in "
+          f"{timeit.timeit(lambda: dumps(history), number=2000) / 2000 * 1e6:.1f} us")
@@ -0,0 +1,338 @@
+# sessions.py
+"""
+Session storage with a per-process cache in front of a shared store.
+
+Each user's session is one record, {'profile': {...}, 'context': {...}},
+stamped with a version that the store bumps on every write.
+
+- MemorySessionStore keeps records in this process (the default, and the
+  behaviour of a single worker);
+- SQLiteSessionStore keeps them in a file every worker on the host opens
+  (JEES_SESSION_STORE), so a user's requests may land on any worker.
+
+TwoTierSessionCache serves reads from a small LRU of (version, record) and
+only goes to the store on a miss, so a hot session such as the
+preferred_language lookup on every message never leaves the process. Writes
+go through mutate(): the change is applied, then written through with a
+compare-and-set on the version. When another worker wrote first, the record
+is reloaded and the change applied again, so no update is lost. Each write
+also appends (user, version) to an invalidation log that every worker tails
+from a background thread, evicting its local copy when a newer version
+appears elsewhere. A local copy can thus lag another worker's write by about
+SESSION_INVALIDATION_POLL_MS, far less than the 2s between a guest's messages.
+"""
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import (
+    SESSION_STORE_PATH,
+    SESSION_LOCAL_CACHE_SIZE,
+    SESSION_INVALIDATION_POLL_MS,
+    SESSION_INVALIDATION_KEEP,
+    SESSION_WRITE_RETRIES,
+)
+from serialization import dumps, loads
+
+Record = Dict[str, Dict[str, Any]]
+
+
+class VersionConflict(Exception):
+    """The stored record changed since it was read."""
+
+
+class MemorySessionStore:
+    """
+    Process-local store. Records are kept by reference, exactly like the plain
+    dicts ContextManager used before, and nothing needs to be invalidated.
+    """
+    shared = False
+
+    def __init__(self):
+        self._records: Dict[str, Tuple[int, Record]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, user_id: str) -> Optional[Tuple[int, Record]]:
+        return self._records.get(user_id)
+
+    def save(self, user_id: str, record: Record, expected_version: int, origin: str) -> int:
+        with self._lock:
+            current = self._records.get(user_id)
+            if (current[0] if current else 0) != expected_version:
+                raise VersionConflict(user_id)
+            self._records[user_id] = (expected_version + 1, record)
+        return expected_version + 1
+
+    def delete(self, user_id: str, origin: str):
+        self._records.pop(user_id, None)
+
+    def seed(self, records: Dict[str, Record]):
+        """Load records rebuilt elsewhere (the event log) into an empty store."""
+        with self._lock:
+            for user_id, record in records.items():
+                self._records.setdefault(user_id, (1, record))
+
+    def ping(self) -> bool:
+        return True
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+
+class SQLiteSessionStore:
+    """
+    Store shared by the workers of one host through a SQLite file (WAL mode).
+    Every write also appends to the invalidation log in the same transaction.
+    """
+    shared = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._pid = None
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        # Connections must not cross fork(): reopen in every worker process.
+        if self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False,
+                                         isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    user_id TEXT PRIMARY KEY, version INTEGER NOT NULL, payload BLOB NOT NULL);
+                CREATE TABLE IF NOT EXISTS invalidations (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL,
+                    version INTEGER NOT NULL, origin TEXT NOT NULL);
+            """)
+            self._pid = os.getpid()
+        return self._conn
+
+    def load(self, user_id: str) -> Optional[Tuple[int, Record]]:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT version, payload FROM sessions WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], loads(row[1])
+
+    def save(self, user_id: str, record: Record, expected_version: int, origin: str) -> int:
+        payload = dumps(record)
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                if expected_version == 0:
+                    cursor = db.execute(
+                        "INSERT OR IGNORE INTO sessions (user_id, version, payload) VALUES (?, 1, ?)",
+                        (user_id, payload))
+                else:
+                    cursor = db.execute(
+                        "UPDATE sessions SET version = version + 1, payload = ? "
+                        "WHERE user_id = ? AND version = ?",
+                        (payload, user_id, expected_version))
+                if cursor.rowcount != 1:
+                    raise VersionConflict(user_id)
+                seq = db.execute(
+                    "INSERT INTO invalidations (user_id, version, origin) VALUES (?, ?, ?)",
+                    (user_id, expected_version + 1, origin)).lastrowid
+                if seq % 1000 == 0:
+                    db.execute("DELETE FROM invalidations WHERE seq <= ?",
+                               (seq - SESSION_INVALIDATION_KEEP,))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return expected_version + 1
+
+    def delete(self, user_id: str, origin: str):
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+            # Version 2**62 evicts every cached copy, whatever its version.
+            db.execute("INSERT INTO invalidations (user_id, version, origin) VALUES (?, ?, ?)",
+                       (user_id, 2 ** 62, origin))
+            db.execute("COMMIT")
+
+    def last_seq(self) -> int:
+        with self._lock:
+            return self._db().execute("SELECT COALESCE(MAX(seq), 0) FROM invalidations").fetchone()[0]
+
+    def invalidations(self, after_seq: int) -> List[Tuple[int, str, int, str]]:
+        with self._lock:
+            return self._db().execute(
+                "SELECT seq, user_id, version, origin FROM invalidations WHERE seq > ? ORDER BY seq",
+                (after_seq,)).fetchall()
+
+    def ping(self) -> bool:
+        """A trivial query, for the readiness probe (COUNT(*) is a table scan)."""
+        with self._lock:
+            return self._db().execute("SELECT 1").fetchone()[0] == 1
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+class TwoTierSessionCache:
+    """
+    Per-process LRU of version-stamped records in front of a session store.
+    """
+    def __init__(self, store, factory: Callable[[], Record],
+                 capacity: int = SESSION_LOCAL_CACHE_SIZE):
+        self.store = store
+        self.factory = factory
+        self.capacity = capacity
+        self._local: 'OrderedDict[str, list]' = OrderedDict()
+        self._lock = threading.RLock()
+        self._pid = None
+        self.origin = None
+        self._listener: Optional[threading.Thread] = None
+        self._last_seq = 0
+
+        # Counters exposed through snapshot()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.conflicts = 0
+        self.invalidated = 0
+
+    # ------------------------------------------------------------------
+    # Invalidation bus
+    # ------------------------------------------------------------------
+    def _ensure_listener(self):
+        # Threads do not survive fork(), so each worker starts its own.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._local.clear()
+            self.origin = f"{socket.gethostname()}:{os.getpid()}"
+            if self.store.shared:
+                self._last_seq = self.store.last_seq()
+                self._listener = threading.Thread(target=self._listen, name='session-invalidations',
+                                                  daemon=True)
+                self._listener.start()
+            self._pid = os.getpid()
+
+    def _listen(self):
+        interval = SESSION_INVALIDATION_POLL_MS / 1000.0
+        while True:
+            try:
+                for seq, user_id, version, origin in self.store.invalidations(self._last_seq):
+                    self._last_seq = seq
+                    if origin != self.origin:
+                        self._invalidate(user_id, version)
+            except sqlite3.Error:
+                pass
+            time.sleep(interval)
+
+    def _invalidate(self, user_id: str, version: int):
+        with self._lock:
+            entry = self._local.get(user_id)
+            # Older messages arriving late never evict a newer local copy.
+            if entry is not None and entry[0] < version:
+                del self._local[user_id]
+                self.invalidated += 1
+
+    # ------------------------------------------------------------------
+    # Reads and writes
+    # ------------------------------------------------------------------
+    def _entry(self, user_id: str) -> list:
+        self._ensure_listener()
+        with self._lock:
+            entry = self._local.get(user_id)
+            if entry is not None:
+                self._local.move_to_end(user_id)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        loaded = self.store.load(user_id)
+        entry = list(loaded) if loaded else [0, self.factory()]
+        with self._lock:
+            self._local[user_id] = entry
+            while len(self._local) > self.capacity:
+                self._local.popitem(last=False)
+        return entry
+
+    def get(self, user_id: str) -> Record:
+        """The user's record; a fresh default one (not yet stored) for new users."""
+        return self._entry(user_id)[1]
+
+    def peek(self, user_id: str) -> Optional[Record]:
+        """
+        The user's record if they have one, without creating it. Read-only: a
+        miss goes to the store but caches nothing, so lookups for unknown
+        users (e.g. /api/suggest) cannot evict real sessions from the LRU.
+        """
+        self._ensure_listener()
+        with self._lock:
+            entry = self._local.get(user_id)
+            if entry is not None:
+                return entry[1] if entry[0] else None
+        loaded = self.store.load(user_id)
+        return loaded[1] if loaded else None
+
+    def mutate(self, user_id: str, change: Callable[[Record], None]) -> Record:
+        """
+        Apply change(record) and write it through. On a version conflict the
+        record is reloaded from the store and the change applied again.
+        """
+        if not self.store.shared:
+            # Records are shared by reference, so a retry would apply the change twice.
+            with self._lock:
+                entry = self._entry(user_id)
+                change(entry[1])
+                entry[0] = self.store.save(user_id, entry[1], entry[0], self.origin)
+                self.writes += 1
+                return entry[1]
+
+        for _ in range(SESSION_WRITE_RETRIES):
+            entry = self._entry(user_id)
+            change(entry[1])
+            try:
+                entry[0] = self.store.save(user_id, entry[1], entry[0], self.origin)
+                self.writes += 1
+                return entry[1]
+            except VersionConflict:
+                self.conflicts += 1
+                with self._lock:
+                    self._local.pop(user_id, None)
+        raise VersionConflict(user_id)
+
+    def delete(self, user_id: str):
+        self._ensure_listener()
+        with self._lock:
+            self._local.pop(user_id, None)
+        self.store.delete(user_id, self.origin)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            cached = len(self._local)
+        lookups = self.hits + self.misses
+        return {
+            'store': type(self.store).__name__,
+            'stored_sessions': len(self.store),
+            'cached_sessions': cached,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'hits': self.hits,
+            'misses': self.misses,
+            'writes': self.writes,
+            'conflicts': self.conflicts,
+            'invalidated': self.invalidated,
+        }
+
+
+def create_store(path: str = SESSION_STORE_PATH):
+    return SQLiteSessionStore(path) if path else MemorySessionStore()
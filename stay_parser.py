@@ -0,0 +1,194 @@
+# stay_parser.py
+"""
+Rule-based date and stay-length parsing for availability questions.
+
+Turns mentions like "2 nights from next friday", "March 3 to 7",
+"from 12/05 until 15/05" or "tomorrow for a week" into a check-in date, a
+check-out date and a night count. Everything is driven by a few precompiled
+regexes; dateutil's relativedelta does the calendar arithmetic (weekdays,
+weekends, year rollover). A message without any digit, month, weekday or relative-day word is
+rejected by a single regex search, which is far cheaper than running spaCy NER.
+
+Numeric dates are read day first (12/05 is 12 May), as written in Somaliland.
+"""
+import re
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from dateutil.relativedelta import relativedelta, MO, TU, WE, TH, FR, SA, SU
+
+_NUMBER_WORDS = {
+    'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6,
+    'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12,
+    'thirteen': 13, 'fourteen': 14,
+    # Somali
+    'hal': 1, 'kow': 1, 'laba': 2, 'saddex': 3, 'afar': 4, 'shan': 5, 'lix': 6,
+    'toddoba': 7, 'siddeed': 8, 'sagaal': 9, 'toban': 10,
+}
+_MONTHS = {'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+           'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12}
+_WEEKDAYS = {'monday': MO, 'tuesday': TU, 'wednesday': WE, 'thursday': TH,
+             'friday': FR, 'saturday': SA, 'sunday': SU}
+
+_NUM = r"(?:\d{1,2}|" + "|".join(sorted(_NUMBER_WORDS, key=len, reverse=True)) + r")"
+_MONTH = (r"(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|"
+          r"sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)")
+_DAY = r"\d{1,2}(?:st|nd|rd|th)?"
+_WEEKDAY = "|".join(_WEEKDAYS)
+
+# Cheap gate: nothing temporal in the message -> no further work.
+_HAS_TEMPORAL = re.compile(
+    r"\d|\b(?:" + _MONTH + r"|" + _WEEKDAY + r"|today|tonight|tomorrow|weekend|nights?|weeks?|habeen\w*)\b"
+)
+
+_DATE = re.compile(
+    r"\b(?:"
+    r"(?P<iso>(?P<iso_y>\d{4})-(?P<iso_m>\d{1,2})-(?P<iso_d>\d{1,2}))"
+    r"|(?P<numeric>(?P<num_d>\d{1,2})[/.](?P<num_m>\d{1,2})(?:[/.](?P<num_y>\d{2,4}))?)"
+    r"|(?P<month_day>(?P<md_m>" + _MONTH + r")\.?\s+(?P<md_d>" + _DAY + r")(?:,?\s+(?P<md_y>\d{4}))?)"
+    r"|(?P<day_month>(?P<dm_d>" + _DAY + r")\s+(?:of\s+)?(?P<dm_m>" + _MONTH + r")(?:\s+(?P<dm_y>\d{4}))?)"
+    r"|(?P<relative>day after tomorrow|today|tonight|tomorrow)"
+    r"|(?:(?P<which>next|this|coming)\s+)?(?P<weekday>" + _WEEKDAY + r")"
+    r"|in\s+(?P<in_days>" + _NUM + r")\s+days?"
+    r"|(?:(?P<weekend_which>next|this)\s+)?(?P<weekend>weekend)"
+    r")\b"
+)
+# "March 3 to 7": a bare day number closing a range opened by a full date.
+_BARE_DAY_END = re.compile(r"\s*(?:to|until|till|through|-|–|—)\s*(?P<day>\d{1,2})(?:st|nd|rd|th)?\b(?!\s*[/.])")
+_NIGHTS = re.compile(r"\b(?P<count>" + _NUM + r")\s+(?:nights?|habeen(?:o)?)\b")
+_WEEKS = re.compile(r"\b(?P<count>" + _NUM + r")\s+weeks?\b")
+_RANGE_GAP = re.compile(
+    r"^\s*(?:to|until|till|through|and|-|–|—|,?\s*(?:and\s+)?(?:check(?:ing)?[\s-]?out|leaving)(?:\s+on)?)\s*$"
+)
+_PRICE = re.compile(r"(\d+(?:\.\d+)?)")
+
+
+def _count(text: str) -> int:
+    return int(text) if text.isdigit() else _NUMBER_WORDS[text]
+
+
+def _roll_forward(value: date, today: date, explicit_year: bool) -> date:
+    # "March 3" said in November means next March.
+    if not explicit_year and value < today:
+        return value + relativedelta(years=1)
+    return value
+
+
+def _resolve(match, today: date) -> Tuple[Optional[date], Optional[int]]:
+    """Date for one _DATE match, plus a night count for 'weekend'."""
+    groups = match.groupdict()
+    try:
+        if groups['iso']:
+            return date(int(groups['iso_y']), int(groups['iso_m']), int(groups['iso_d'])), None
+        if groups['numeric']:
+            year = groups['num_y']
+            if year:
+                year = int(year) + (2000 if len(year) == 2 else 0)
+            value = date(year or today.year, int(groups['num_m']), int(groups['num_d']))
+            return _roll_forward(value, today, bool(year)), None
+        if groups['month_day'] or groups['day_month']:
+            month = groups['md_m'] or groups['dm_m']
+            day = re.match(r"\d+", groups['md_d'] or groups['dm_d']).group()
+            year = groups['md_y'] or groups['dm_y']
+            value = date(int(year) if year else today.year, _MONTHS[month[:3]], int(day))
+            return _roll_forward(value, today, bool(year)), None
+    except (ValueError, OverflowError):
+        return None, None
+
+    if groups['relative']:
+        offset = {'today': 0, 'tonight': 0, 'tomorrow': 1, 'day after tomorrow': 2}[groups['relative']]
+        return today + timedelta(days=offset), None
+    if groups['weekday']:
+        weekday = _WEEKDAYS[groups['weekday']]
+        # "next friday" is the first Friday after today; a bare/"this" Friday may be today.
+        skip = 1 if groups['which'] in ('next', 'coming') else 0
+        return today + relativedelta(days=skip, weekday=weekday(+1)), None
+    if groups['in_days']:
+        return today + timedelta(days=_count(groups['in_days'])), None
+    if groups['weekend']:
+        # "this weekend": the coming Friday (or today); "next weekend": a week later.
+        friday = today + relativedelta(weekday=FR(+1))
+        if groups['weekend_which'] == 'next':
+            friday += timedelta(days=7)
+        return friday, 2
+    return None, None
+
+
+def parse_stay(text: str, today: date = None) -> Optional[Dict[str, Optional[str]]]:
+    """
+    Parse a stay out of free text. Returns None when nothing temporal is found,
+    otherwise {'check_in': 'YYYY-MM-DD' | None, 'check_out': ... | None, 'nights': int | None}.
+    """
+    text = text.lower()
+    if not _HAS_TEMPORAL.search(text):
+        return None
+    today = today or date.today()
+
+    dates: List[date] = []
+    nights: Optional[int] = None
+    ranged = False
+    matches = list(_DATE.finditer(text))
+    for index, match in enumerate(matches):
+        value, weekend_nights = _resolve(match, today)
+        if value is None:
+            continue
+        dates.append(value)
+        nights = nights or weekend_nights
+        if index == 0 and (match.group('month_day') or match.group('day_month')):
+            end = _BARE_DAY_END.match(text, match.end())
+            if end:
+                try:
+                    dates.append(value.replace(day=int(end.group('day'))))
+                    ranged = True
+                except ValueError:
+                    pass
+    if not ranged and len(dates) >= 2 and len(matches) >= 2:
+        ranged = bool(_RANGE_GAP.match(text[matches[0].end():matches[1].start()]))
+
+    nights_match = _NIGHTS.search(text)
+    if nights_match:
+        nights = _count(nights_match.group('count'))
+    else:
+        weeks_match = _WEEKS.search(text)
+        if weeks_match:
+            nights = 7 * _count(weeks_match.group('count'))
+
+    if not dates and nights is None:
+        return None
+
+    check_in = dates[0] if dates else None
+    check_out = None
+    if ranged:
+        check_out = dates[1]
+        if check_out <= check_in:
+            check_out += relativedelta(years=1)
+        nights = (check_out - check_in).days
+    elif check_in is not None and nights:
+        check_out = check_in + timedelta(days=nights)
+
+    return {
+        'check_in': check_in.isoformat() if check_in else None,
+        'check_out': check_out.isoformat() if check_out else None,
+        'nights': nights,
+    }
+
+
+def nightly_rate(price: str) -> Optional[float]:
+    """'$49/night' -> 49.0"""
+    match = _PRICE.search(price.replace(',', ''))
+    return float(match.group(1)) if match else None
+
+
+if __name__ == "__main__":
+    # Compare the compiled-pattern path with running full spaCy NER on the same messages.
+    import timeit
+    from nlp import nlp
+
+    samples = ["2 nights from next friday", "March 3 to 7", "from 12/05 until 15/05",
+               "tomorrow for a week", "do you have parking?", "deluxe room this weekend"]
+    for sample in samples:
+        print(f"{sample!r:32} -> {parse_stay(sample)}")
+    runs = 500
+    rules = timeit.timeit(lambda: [parse_stay(s) for s in samples], number=runs) / runs / len(samples)
+    ner = timeit.timeit(lambda: [nlp(s).ents for s in samples], number=runs) / runs / len(samples)
+    print(f"stay parser: {rules * 1e6:.1f} us/message, spaCy NER: {ner * 1e6:.1f} us/message")
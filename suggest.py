@@ -0,0 +1,141 @@
+# suggest.py
+"""
+Prefix autocomplete for the chat widget.
+
+Suggestions come from the canonical_map synonyms, the room types, the phrases
+registered with the IntentHandler and the curated SUGGESTION_PHRASES, per
+tenant (see tenants.py) and language. Every word-start suffix of a phrase is stored in one sorted array,
+so a lookup is a pair of binary searches; the answers for one- and
+two-character prefixes (the widest ranges) are precomputed. Keystroke traffic
+never reaches the NLP path.
+"""
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Tuple
+
+from config import (
+    SUGGESTION_PHRASES, SUGGESTION_LIMIT, SUPPORTED_LANGUAGES, DEFAULT_LANGUAGE
+)
+from preload import warmup_stage
+from tenants import current_tenant
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Lower rank sorts first: curated phrases, then rooms, intents and synonyms.
+RANK_CURATED, RANK_ROOM, RANK_INTENT, RANK_SYNONYM = range(4)
+
+
+def normalize_query(text: str) -> str:
+    return _WHITESPACE.sub(" ", text.strip().lower())
+
+
+class SuggestionIndex:
+    """
+    Sorted-array prefix index for one language.
+    """
+    def __init__(self, phrases: List[Tuple[str, int]], limit: int = SUGGESTION_LIMIT):
+        self.limit = limit
+        best: Dict[str, Tuple[int, str]] = {}
+        for display, rank in phrases:
+            key = normalize_query(display)
+            if key and (key not in best or rank < best[key][0]):
+                best[key] = (rank, display)
+
+        # Phrase ids are assigned in ranking order, so smaller id == better suggestion.
+        ordered = sorted(best.values(), key=lambda item: (item[0], len(item[1]), item[1]))
+        self.phrases: List[str] = [display for _, display in ordered]
+
+        # Mid-phrase matches are offset by the phrase count so they rank after
+        # every phrase that starts with the prefix.
+        count = len(self.phrases)
+        entries = []
+        for phrase_id, display in enumerate(self.phrases):
+            words = normalize_query(display).split(" ")
+            for start in range(len(words)):
+                entries.append((" ".join(words[start:]), phrase_id + (count if start else 0)))
+        entries.sort()
+        self.keys: List[str] = [key for key, _ in entries]
+        self.ids: List[int] = [phrase_id for _, phrase_id in entries]
+
+        self.short_prefixes: Dict[str, List[str]] = {}
+        for key in self.keys:
+            for size in (1, 2):
+                prefix = key[:size]
+                if len(prefix) == size and prefix not in self.short_prefixes:
+                    self.short_prefixes[prefix] = self._scan(prefix)
+
+    def _scan(self, prefix: str) -> List[str]:
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_right(self.keys, prefix + "\uffff", lo)
+        count = len(self.phrases)
+        found: List[str] = []
+        seen = set()
+        for entry_id in sorted(set(self.ids[lo:hi])):
+            phrase_id = entry_id % count
+            if phrase_id not in seen:
+                seen.add(phrase_id)
+                found.append(self.phrases[phrase_id])
+                if len(found) == self.limit:
+                    break
+        return found
+
+    def complete(self, text: str, limit: int = None) -> List[str]:
+        prefix = normalize_query(text)
+        if not prefix:
+            return []
+        limit = min(limit or self.limit, self.limit)
+        cached = self.short_prefixes.get(prefix)
+        if cached is not None:
+            return cached[:limit]
+        if len(prefix) <= 2:
+            return []
+        return self._scan(prefix)[:limit]
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class SuggestionService:
+    """
+    Holds one SuggestionIndex per tenant and supported language and rebuilds
+    them on demand. Lookups and rebuilds are for the current tenant.
+    """
+    def __init__(self):
+        self._indexes: Dict[str, Dict[str, SuggestionIndex]] = {}   # tenant id -> lang -> index
+        self._lock = threading.Lock()
+
+    def _collect(self, tenant, lang: str) -> List[Tuple[str, int]]:
+        phrases = [(phrase, RANK_CURATED) for phrase in SUGGESTION_PHRASES.get(lang, [])]
+        phrases += [(room['type'], RANK_ROOM) for room in tenant.hotel_info['rooms']]
+        for handler in tenant.intent_handler.handlers:
+            phrases += [(" ".join(pattern), RANK_INTENT) for pattern in handler['patterns']]
+        for synonyms in tenant.nlp.canonical_map.values():
+            phrases += [(synonym, RANK_SYNONYM) for synonym in synonyms]
+        return phrases
+
+    def rebuild(self) -> Dict[str, int]:
+        """(Re)build the current tenant's language indexes; returns the number of keys per language."""
+        tenant = current_tenant()
+        indexes = {lang: SuggestionIndex(self._collect(tenant, lang)) for lang in SUPPORTED_LANGUAGES}
+        with self._lock:
+            self._indexes = dict(self._indexes, **{tenant.id: indexes})
+        return {lang: len(index) for lang, index in indexes.items()}
+
+    def complete(self, text: str, lang: str, limit: int = None) -> List[str]:
+        if lang not in SUPPORTED_LANGUAGES:
+            lang = DEFAULT_LANGUAGE
+        indexes = self._indexes.get(current_tenant().id)
+        if indexes is None:
+            self.rebuild()
+            indexes = self._indexes[current_tenant().id]
+        return indexes[lang].complete(text, limit)
+
+
+# Create a single global instance to be imported by other modules
+suggestion_service = SuggestionService()
+
+
+@warmup_stage('suggestion_index')
+def _warm_suggestions():
+    return suggestion_service.rebuild()
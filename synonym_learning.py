@@ -0,0 +1,358 @@
+# synonym_learning.py
+"""
+Synonym and intent-pattern proposals learned from fallback traffic.
+
+Every turn logged with the 'fallback' intent is a message the bot did not
+understand. analyze() gathers them from the session event log (current
+histories) and the history archive (older turns) and, per language:
+
+1. normalizes each message (normalize.py) and keeps the
+   SYNONYM_LEARNING_MAX_MESSAGES most frequent distinct ones;
+2. embeds them as hashed character-trigram vectors (NumPy, L2-normalized)
+   and computes the full cosine similarity matrix in one product;
+3. clusters greedily: the most frequent unassigned message leads a cluster
+   holding every unassigned message at least SYNONYM_LEARNING_CLUSTER_SIMILARITY
+   similar to it;
+4. compares each cluster's centroid with every canonical group's synonyms and
+   every intent handler's trigger phrases. The closest one, if at least
+   SYNONYM_LEARNING_ASSIGN_SIMILARITY similar, is the proposal's target;
+   otherwise the proposal has no target and the reviewer picks one.
+
+Clusters with at least SYNONYM_LEARNING_MIN_COUNT messages become proposals,
+ranked by message count and distinct users. The proposed phrase is the
+cluster leader without stopwords: whole sentences make poor fuzzy synonyms,
+since every word of a synonym matches on its own.
+
+approve() appends the entry to LEARNED_SYNONYMS_FILE and applies it to the
+default tenant: NLPProcessor.add_synonyms() for synonyms,
+IntentHandler.add_patterns() for patterns, both swapped in while serving.
+Other workers pick approved entries up from the file within
+SYNONYM_LEARNING_RELOAD_SECONDS (refresh()), and every worker applies them
+at warm-up.
+
+    python synonym_learning.py            # print the ranked proposals
+    python synonym_learning.py --json proposals.json
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import (
+    DEFAULT_LANGUAGE,
+    EVENT_LOG_ENABLED,
+    LEARNED_SYNONYMS_FILE,
+    SYNONYM_LEARNING_MIN_COUNT,
+    SYNONYM_LEARNING_MAX_MESSAGES,
+    SYNONYM_LEARNING_CLUSTER_SIMILARITY,
+    SYNONYM_LEARNING_ASSIGN_SIMILARITY,
+    SYNONYM_LEARNING_RELOAD_SECONDS,
+)
+from archive import history_archive
+from events import event_log
+from faq import STOPWORDS
+from normalize import normalizer_for, tokenize
+from tenants import tenant_registry
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development server only
+    fcntl = None
+
+# Hashed trigram space; collisions only add a little noise to the similarities.
+DIMENSIONS = 2048
+
+Entry = Dict[str, Any]
+
+
+def normalize_message(message: str, lang: str) -> str:
+    return ' '.join(tokenize(normalizer_for(lang)(message)))
+
+
+def vectorize(texts: List[str]) -> np.ndarray:
+    """L2-normalized hashed character-trigram counts, one row per text."""
+    vectors = np.zeros((len(texts), DIMENSIONS), dtype=np.float32)
+    for row, text in enumerate(texts):
+        padded = f" {text} "
+        for i in range(len(padded) - 2):
+            vectors[row, zlib.crc32(padded[i:i + 3].encode('utf-8')) % DIMENSIONS] += 1.0
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def cluster(vectors: np.ndarray, threshold: float) -> List[np.ndarray]:
+    """
+    Leader clustering over rows sorted by frequency: each unassigned row takes
+    every unassigned row at least 'threshold' similar to it.
+    """
+    similarity = vectors @ vectors.T
+    assigned = np.zeros(len(vectors), dtype=bool)
+    clusters = []
+    for leader in range(len(vectors)):
+        if assigned[leader]:
+            continue
+        members = np.flatnonzero((similarity[leader] >= threshold) & ~assigned)
+        assigned[members] = True
+        clusters.append(members)
+    return clusters
+
+
+def proposal_id(kind: str, target: Optional[str], phrase: str, lang: str) -> str:
+    return hashlib.sha1(f"{kind}|{target}|{lang}|{phrase}".encode('utf-8')).hexdigest()[:12]
+
+
+class SynonymLearner:
+    """
+    Builds proposals from fallback messages and applies approved entries.
+    """
+    def __init__(self, path: str = LEARNED_SYNONYMS_FILE):
+        self.path = path
+        self.proposals: List[Entry] = []
+        self.last_analysis: Dict[str, Any] = {}
+        self._applied: set = set()
+        self._mtime: Optional[float] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self._analyzing = False
+
+    # ------------------------------------------------------------------
+    # Collecting
+    # ------------------------------------------------------------------
+    def collect_fallbacks(self) -> List[Tuple[str, str, str]]:
+        """(user, language, message) of every fallback turn still on record for the default tenant."""
+        other_tenants = tuple(f"{tenant_id}:" for tenant_id in tenant_registry.definitions)
+        languages: Dict[str, str] = {}
+        found: List[Tuple[str, str, str]] = []
+        if EVENT_LOG_ENABLED and event_log.factory is not None:
+            sessions, _ = event_log.restore(event_log.factory)
+            for user_id, session in sessions.items():
+                profile = session['profile']
+                languages[user_id] = profile.get('preferred_language') or DEFAULT_LANGUAGE
+                found.extend((user_id, languages[user_id], turn['message'])
+                             for turn in profile['conversation_history'] if turn['intent'] == 'fallback')
+        for turn in history_archive.messages_with_intent('fallback'):
+            found.append((turn['user'], languages.get(turn['user'], DEFAULT_LANGUAGE), turn['message']))
+        # Warm-up and benchmark users start with '__'.
+        return [item for item in found
+                if not item[0].startswith('__') and not (other_tenants and item[0].startswith(other_tenants))]
+
+    # ------------------------------------------------------------------
+    # Analysis
+    # ------------------------------------------------------------------
+    def _targets(self, lang: str) -> Tuple[List[Tuple[str, str]], np.ndarray, set]:
+        """(kind, target) per known phrase, their vectors, and the known synonyms."""
+        tenant = tenant_registry.default
+        labels, phrases = [], []
+        for canonical, synonyms in tenant.nlp.canonical_map.items():
+            for synonym in synonyms:
+                labels.append(('synonym', canonical))
+                phrases.append(normalize_message(synonym, lang))
+        for handler in tenant.intent_handler.handlers:
+            key = ' '.join(handler['patterns'][0])
+            for pattern in handler['patterns']:
+                labels.append(('pattern', key))
+                phrases.append(normalize_message(' '.join(pattern), lang))
+        return labels, vectorize(phrases), set(phrases)
+
+    def _phrase(self, text: str, lang: str) -> str:
+        stopwords = STOPWORDS.get(lang, set())
+        content = [word for word in text.split() if word not in stopwords]
+        return ' '.join(content) or text
+
+    def analyze(self) -> List[Entry]:
+        """Cluster the fallback messages and rank the proposals (see the module docstring)."""
+        start = time.perf_counter()
+        fallbacks = self.collect_fallbacks()
+        counts: Dict[str, Counter] = defaultdict(Counter)
+        users: Dict[Tuple[str, str], set] = defaultdict(set)
+        for user_id, lang, message in fallbacks:
+            text = normalize_message(message, lang)
+            if text:
+                counts[lang][text] += 1
+                users[(lang, text)].add(user_id)
+
+        proposals: List[Entry] = []
+        for lang, texts in counts.items():
+            top = texts.most_common(SYNONYM_LEARNING_MAX_MESSAGES)
+            vectors = vectorize([text for text, _ in top])
+            labels, target_vectors, known = self._targets(lang)
+            for members in cluster(vectors, SYNONYM_LEARNING_CLUSTER_SIMILARITY):
+                weights = np.array([top[i][1] for i in members], dtype=np.float32)
+                count = int(weights.sum())
+                if count < SYNONYM_LEARNING_MIN_COUNT:
+                    continue
+                leader = top[members[0]][0]
+                phrase = self._phrase(leader, lang)
+                if phrase in known:
+                    continue
+                centroid = weights @ vectors[members]
+                centroid /= np.linalg.norm(centroid) or 1.0
+                similarities = target_vectors @ centroid
+                best = int(np.argmax(similarities)) if len(similarities) else -1
+                score = float(similarities[best]) if best >= 0 else 0.0
+                kind, target = labels[best] if score >= SYNONYM_LEARNING_ASSIGN_SIMILARITY else ('synonym', None)
+                proposals.append({
+                    'id': proposal_id(kind, target, phrase, lang),
+                    'kind': kind,
+                    'target': target,
+                    'similarity': round(score, 3),
+                    'phrase': phrase,
+                    'lang': lang,
+                    'count': count,
+                    'users': len(set().union(*(users[(lang, top[i][0])] for i in members))),
+                    'examples': [top[i][0] for i in members[:5]],
+                })
+
+        proposals.sort(key=lambda p: (-p['count'], -p['users'], p['phrase']))
+        self.proposals = proposals
+        self.last_analysis = {
+            'time': round(time.time(), 3),
+            'fallback_messages': len(fallbacks),
+            'distinct_messages': sum(len(texts) for texts in counts.values()),
+            'proposals': len(proposals),
+            'seconds': round(time.perf_counter() - start, 3),
+        }
+        return proposals
+
+    def analyze_in_background(self) -> bool:
+        """Run analyze() in a background thread; False if one is already running."""
+        with self._lock:
+            if self._analyzing:
+                return False
+            self._analyzing = True
+
+        def run():
+            try:
+                self.analyze()
+            finally:
+                self._analyzing = False
+
+        threading.Thread(target=run, name='synonym-learning', daemon=True).start()
+        return True
+
+    # ------------------------------------------------------------------
+    # Approved entries
+    # ------------------------------------------------------------------
+    def entries(self) -> List[Entry]:
+        try:
+            with open(self.path, encoding='utf-8') as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return []
+
+    def approve(self, proposal: str, target: str = None, phrase: str = None) -> Entry:
+        """
+        Approve a proposal by id, optionally with another target or phrase, and
+        apply it. A target naming an intent handler's trigger makes it a pattern,
+        any other one a synonym (of a new canonical group if need be). Raises
+        KeyError for an unknown proposal.
+        """
+        found = next((p for p in self.proposals if p['id'] == proposal), None)
+        if found is None:
+            raise KeyError(proposal)
+        kind = found['kind']
+        if target and target != found['target']:
+            handlers = tenant_registry.default.intent_handler.handlers
+            is_trigger = any(target.lower().split() in handler['patterns'] for handler in handlers)
+            kind = 'pattern' if is_trigger and target not in tenant_registry.default.nlp.canonical_map \
+                else 'synonym'
+        target = target or found['target']
+        if not target:
+            raise KeyError("a target is required for this proposal")
+        phrase = (phrase or found['phrase']).strip().lower()
+        entry = {'id': proposal_id(kind, target, phrase, found['lang']), 'kind': kind,
+                 'target': target, 'phrase': phrase, 'lang': found['lang'], 'approved': round(time.time(), 3)}
+        with self._lock:
+            self.apply(entry)
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path + '.lock', 'ab') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                entries = [e for e in self.entries() if e['id'] != entry['id']] + [entry]
+                temp = self.path + '.tmp'
+                with open(temp, 'w', encoding='utf-8') as fh:
+                    json.dump(entries, fh, ensure_ascii=False, indent=1)
+                os.replace(temp, self.path)
+            finally:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+        self.proposals = [p for p in self.proposals if p['id'] != proposal]
+        return entry
+
+    def apply(self, entry: Entry) -> bool:
+        """Apply one entry to the default tenant (once). Raises KeyError for an unknown intent."""
+        if entry['id'] in self._applied:
+            return False
+        tenant = tenant_registry.default
+        if entry['kind'] == 'pattern':
+            tenant.intent_handler.add_patterns(entry['target'], [entry['phrase']])
+        else:
+            tenant.nlp.add_synonyms(entry['target'], [entry['phrase']])
+        self._applied.add(entry['id'])
+        return True
+
+    def refresh(self, force: bool = False) -> int:
+        """
+        Apply entries other workers approved since the last check. Cheap enough
+        to call per request: the file is only stat'ed every
+        SYNONYM_LEARNING_RELOAD_SECONDS. Returns the number of entries applied.
+        """
+        now = time.monotonic()
+        if not force and now - self._checked < SYNONYM_LEARNING_RELOAD_SECONDS:
+            return 0
+        self._checked = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return 0
+        if mtime == self._mtime and not force:
+            return 0
+        with self._lock:
+            self._mtime = mtime
+            applied = 0
+            for entry in self.entries():
+                try:
+                    applied += self.apply(entry)
+                except KeyError:
+                    continue   # an intent that no longer exists
+            return applied
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'analyzing': self._analyzing,
+            'last_analysis': self.last_analysis,
+            'applied': len(self._applied),
+            'proposals': len(self.proposals),
+        }
+
+
+# Create a single global instance to be imported by other modules
+synonym_learner = SynonymLearner()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Propose synonyms and intent patterns from fallback traffic")
+    parser.add_argument('--json', help="also write the proposals to this file")
+    args = parser.parse_args()
+
+    ranked = synonym_learner.analyze()
+    print(json.dumps(synonym_learner.last_analysis))
+    for item in ranked:
+        target = item['target'] or '(choose a target)'
+        print(f"{item['count']:>6} msgs {item['users']:>5} users  {item['kind']:<8} {target:<16}"
+              f" {item['phrase']!r:<30} sim {item['similarity']:.2f}  [{item['id']}]  e.g. {item['examples'][:3]}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as fh:
+            json.dump(ranked, fh, ensure_ascii=False, indent=2)
@@ -0,0 +1,212 @@
+# tenants.py
+"""
+Several hotels (tenants) served from one deployment.
+
+A tenant is a knowledge base: HOTEL_INFO, RESPONSES and synonym additions
+layered over the built-in hotel. Tenants are defined in a JSON file
+(JEES_TENANTS_FILE):
+
+    {
+      "seaside": {
+        "hosts": ["chat.seaside-hotel.com"],
+        "api_keys": ["k-3f9c..."],
+        "hotel_info": {"name": "Seaside Hotel", "rooms": [...]},
+        "responses": {"en": {"room_list": "..."}},
+        "synonyms": {"location": ["where is seaside"]}
+      }
+    }
+
+hotel_info keys and per-language responses replace the defaults; synonyms
+are added to the default canonical groups. Requests are mapped to a tenant
+by API key (TENANT_API_KEY_HEADER) or Host; anything else is the default
+tenant, i.e. the single hotel in config.py.
+
+Definitions are only parsed at start. A tenant's synonym index, room
+matcher and intent table are compiled the first time it gets a request, and
+compiled tenants are kept in an LRU of TENANT_CACHE_SIZE per worker (the
+default tenant is never evicted). Rendered templates and the FAQ passage
+index (faq.py, built on the first question that needs it) live on the
+tenant, so they are dropped with it. All tenants share the spaCy model, the
+workers and the session store; non-default tenants' user ids are prefixed
+with the tenant id so their sessions never mix.
+
+Handlers keep using HOTEL_INFO, RESPONSES, nlp_processor and intent_handler:
+the names exported here are proxies to the tenant of the current request.
+"""
+import json
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+from werkzeug.local import LocalProxy
+
+from config import HOTEL_INFO as DEFAULT_HOTEL_INFO, RESPONSES as DEFAULT_RESPONSES
+from config import TENANTS_FILE, TENANT_CACHE_SIZE
+from faq import FAQIndex
+from nlp import NLPProcessor, nlp_processor as default_nlp_processor
+
+DEFAULT_TENANT = 'default'
+
+
+class Tenant:
+    """
+    One hotel's knowledge base and the structures compiled from it.
+    """
+    def __init__(self, tenant_id: str, hotel_info: Dict[str, Any], responses: Dict[str, Dict[str, Any]],
+                 processor: NLPProcessor):
+        self.id = tenant_id
+        self.hotel_info = hotel_info
+        self.responses = responses
+        self.nlp = processor
+        self.templates: Dict[str, str] = {}
+        self._intent_handler = None
+        self._faq = None
+
+    @property
+    def intent_handler(self):
+        if self._intent_handler is None:
+            from handlers import build_intent_handler
+            self._intent_handler = build_intent_handler()
+        return self._intent_handler
+
+    @property
+    def faq(self) -> FAQIndex:
+        if self._faq is None:
+            self._faq = FAQIndex(self.hotel_info, self.responses)
+        return self._faq
+
+    def compile(self) -> 'Tenant':
+        """Build the synonym index, room matcher and intent table."""
+        self.nlp.synonym_index or self.nlp.build_index()
+        self.nlp.room_type_pattern()
+        self.intent_handler.compile()
+        return self
+
+    def template(self, name: str, render: Callable[[], str]) -> str:
+        """A rendered template, computed once per tenant."""
+        text = self.templates.get(name)
+        if text is None:
+            text = self.templates[name] = render()
+        return text
+
+    def user_id(self, client_id: str) -> str:
+        return client_id if self.id == DEFAULT_TENANT else f"{self.id}:{client_id}"
+
+
+def load_definitions(path: Optional[str] = TENANTS_FILE) -> Dict[str, Dict[str, Any]]:
+    if not path:
+        return {}
+    with open(path, encoding='utf-8') as fh:
+        definitions = json.load(fh)
+    definitions.pop(DEFAULT_TENANT, None)   # the default tenant is config.py
+    return definitions
+
+
+class TenantRegistry:
+    """
+    Maps requests to tenants and keeps an LRU of compiled tenants.
+    """
+    def __init__(self, definitions: Dict[str, Dict[str, Any]] = None,
+                 capacity: int = TENANT_CACHE_SIZE):
+        self.definitions = load_definitions() if definitions is None else definitions
+        self.capacity = capacity
+        self._by_key: Dict[str, str] = {}
+        self._by_host: Dict[str, str] = {}
+        for tenant_id, spec in self.definitions.items():
+            for key in spec.get('api_keys', []):
+                self._by_key[key] = tenant_id
+            for host in spec.get('hosts', []):
+                self._by_host[host.lower()] = tenant_id
+        self.default = Tenant(DEFAULT_TENANT, DEFAULT_HOTEL_INFO, DEFAULT_RESPONSES, default_nlp_processor)
+        self._compiled: 'OrderedDict[str, Tenant]' = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters exposed through snapshot()
+        self.hits = 0
+        self.compiles = 0
+        self.evictions = 0
+
+    def resolve(self, host: str = None, api_key: str = None) -> str:
+        """Tenant id for a request: API key first, then Host (without port)."""
+        if api_key and api_key in self._by_key:
+            return self._by_key[api_key]
+        if host:
+            return self._by_host.get(host.split(':', 1)[0].lower(), DEFAULT_TENANT)
+        return DEFAULT_TENANT
+
+    def _build(self, tenant_id: str) -> Tenant:
+        spec = self.definitions[tenant_id]
+        hotel_info = dict(DEFAULT_HOTEL_INFO, **spec.get('hotel_info', {}))
+        overrides = spec.get('responses', {})
+        responses = {lang: dict(DEFAULT_RESPONSES.get(lang, {}), **overrides.get(lang, {}))
+                     for lang in list(DEFAULT_RESPONSES) + [l for l in overrides if l not in DEFAULT_RESPONSES]}
+        canonical_map = {canonical: list(synonyms)
+                         for canonical, synonyms in default_nlp_processor.canonical_map.items()}
+        for canonical, synonyms in spec.get('synonyms', {}).items():
+            group = canonical_map.setdefault(canonical, [])
+            group.extend(s.lower() for s in synonyms if s.lower() not in group)
+        return Tenant(tenant_id, hotel_info, responses, NLPProcessor(canonical_map, hotel_info))
+
+    def get(self, tenant_id: str) -> Tenant:
+        """The compiled tenant, compiling it (and evicting the least recent) on a miss."""
+        if tenant_id == DEFAULT_TENANT or tenant_id not in self.definitions:
+            return self.default
+        with self._lock:
+            tenant = self._compiled.get(tenant_id)
+            if tenant is not None:
+                self._compiled.move_to_end(tenant_id)
+                self.hits += 1
+                return tenant
+            # Compiling under the lock keeps concurrent first requests from
+            # compiling the same tenant twice; it takes a few milliseconds.
+            tenant = self._build(tenant_id).compile()
+            self.compiles += 1
+            self._compiled[tenant_id] = tenant
+            while len(self._compiled) > self.capacity:
+                self._compiled.popitem(last=False)
+                self.evictions += 1
+            return tenant
+
+    def for_request(self, host: str = None, api_key: str = None) -> Tenant:
+        return self.get(self.resolve(host, api_key))
+
+    @contextmanager
+    def activate(self, tenant: Tenant):
+        """Make 'tenant' the current tenant for the code run inside the block."""
+        token = _current.set(tenant)
+        try:
+            yield tenant
+        finally:
+            _current.reset(token)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            compiled: List[str] = list(self._compiled)
+        return {
+            'defined': len(self.definitions) + 1,
+            'compiled': [DEFAULT_TENANT] + compiled,
+            'capacity': self.capacity,
+            'hits': self.hits,
+            'compiles': self.compiles,
+            'evictions': self.evictions,
+        }
+
+
+_current: ContextVar[Optional[Tenant]] = ContextVar('tenant', default=None)
+
+# Create a single global instance to be imported by other modules
+tenant_registry = TenantRegistry()
+
+
+def current_tenant() -> Tenant:
+    """The tenant of the request being handled (the default one outside requests)."""
+    return _current.get() or tenant_registry.default
+
+
+# Per-request views of the tenant's knowledge base, used by the handlers.
+HOTEL_INFO = LocalProxy(lambda: current_tenant().hotel_info)
+RESPONSES = LocalProxy(lambda: current_tenant().responses)
+nlp_processor = LocalProxy(lambda: current_tenant().nlp)
+intent_handler = LocalProxy(lambda: current_tenant().intent_handler)
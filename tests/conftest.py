@@ -0,0 +1,11 @@
+# conftest.py
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Sessions, event segments, archives, inventories and logs use relative paths
+# (config.py): keep them in a scratch directory instead of the checkout.
+os.chdir(tempfile.mkdtemp(prefix='jees-tests-'))
@@ -0,0 +1,13 @@
+# test_archive.py
+from archive import _InternTable
+
+
+def test_intern_codes_survive_a_reload(tmp_path):
+    path = str(tmp_path / 'intents.txt')
+    table = _InternTable(path)
+    names = ["rooms", "odd\rname", "line\u2028separator", "next\x85line", "multi\nline", "faq"]
+    codes = [table.intern(name) for name in names]
+
+    reloaded = _InternTable(path)
+    assert [reloaded.names[code] for code in codes] == [name.replace('\n', ' ') for name in names]
+    assert reloaded.intern("faq") == codes[-1]
@@ -0,0 +1,154 @@
+# test_dialog.py
+import itertools
+
+import pytest
+
+from config import API_ENDPOINTS, SUGGESTION_PHRASES
+from dialog import ANY, NORMAL, UNKNOWN, DialogMachine
+from chat_handlers import dialog, generate_response
+from context import context_manager
+
+_users = itertools.count()
+
+
+def reply(text):
+    return lambda message, user_id, lang: text
+
+
+def decline(message, user_id, lang):
+    return None
+
+
+@pytest.fixture
+def machine():
+    machine = DialogMachine()
+    machine.add_intent("greetings", ["greetings"])
+    machine.add_intent("booking", ["booking", "book"])
+    machine.add_transition(ANY, "greetings", reply("hi"), next_state=NORMAL)
+    machine.add_transition(ANY, "booking", reply("book here"), next_state='booking')
+    machine.add_transition(ANY, UNKNOWN, decline, topic="faq")
+    machine.add_transition(ANY, UNKNOWN, reply("sorry"), topic="fallback")
+    return machine
+
+
+def respond(machine, state, intent):
+    return machine.respond(state, "message", "user", "en", lambda: intent)
+
+
+def test_earlier_intent_wins(machine):
+    assert machine.intent_of_tokens(["book", "greetings"]) == "greetings"
+    assert machine.intent_of_tokens(["nothing", "here"]) is None
+
+
+def test_transition_moves_state(machine):
+    assert respond(machine, NORMAL, "booking") == ("booking", "book here", 'booking')
+    assert respond(machine, 'booking', "greetings") == ("greetings", "hi", NORMAL)
+
+
+def test_state_table_overrides_shared_table(machine):
+    machine.add_transition('quoted', "affirm", reply("booked"), next_state='booking', topic="booking")
+    assert respond(machine, 'quoted', "affirm") == ("booking", "booked", 'booking')
+    # Outside 'quoted' there is no affirm transition: the UNKNOWN chain answers.
+    assert respond(machine, NORMAL, "affirm") == ("fallback", "sorry", NORMAL)
+
+
+def test_declined_chain_falls_through_to_unknown(machine):
+    machine.add_transition(ANY, "help", decline)
+    assert respond(machine, NORMAL, "help") == ("fallback", "sorry", NORMAL)
+
+
+def test_capture_skips_classification(machine):
+    machine.capture('awaiting_language', reply("pick a language"), topic="language_selection")
+
+    def classify():
+        raise AssertionError("captured states are not classified")
+
+    assert machine.respond('awaiting_language', "hello", "user", "en", classify) == \
+        ("language_selection", "pick a language", None)
+
+
+def test_compile_is_cached_until_changed(machine):
+    tables = machine.compile()
+    assert machine.compile() is tables
+    machine.add_state('rooms')
+    assert machine.compile() is not tables
+    assert 'rooms' in machine.states
+
+
+@pytest.fixture
+def user():
+    user_id = f"__dialog_test_{next(_users)}"
+    yield user_id
+    context_manager.forget_user(user_id)
+
+
+def walk(user_id, messages):
+    steps = []
+    for message in messages:
+        assert generate_response(user_id, message)
+        profile = context_manager.get_user_profile(user_id)
+        steps.append((profile['current_topic'], profile['state']))
+    return steps
+
+
+def test_room_price_booking_flow(user):
+    assert walk(user, [
+        "1",
+        "tell me about the deluxe room",
+        "how much for 3 nights from next friday",
+        "yes",
+        "where is the hotel location",
+    ]) == [
+        ("language_selection", NORMAL),
+        ("rooms", 'rooms'),
+        ("rooms", 'quoted'),
+        ("booking", 'booking'),
+        ("location", NORMAL),
+    ]
+
+
+def test_affirmation_outside_flow_is_not_a_booking(user):
+    steps = walk(user, ["1", "yes"])
+    assert steps[-1] == ("fallback", NORMAL)
+
+
+def test_unknown_message_keeps_flow_state(user):
+    steps = walk(user, ["1", "tell me about the deluxe room", "asdf qwer"])
+    assert steps[-1] == ("fallback", 'rooms')
+
+
+def test_booking_without_dates_links_the_portal(user):
+    walk(user, ["1", "tell me about the deluxe room"])
+    reply = generate_response(user, "yes")
+    assert context_manager.get_user_profile(user)['state'] == 'booking'
+    assert f"<a href='{API_ENDPOINTS['booking']}' target='_blank'>" in reply
+    assert reply.endswith("</a>")
+
+
+def test_somali_yes_books_the_quoted_room(user):
+    assert walk(user, [
+        "2",
+        "tell me about the deluxe room",
+        "how much for 3 nights from next friday",
+        "haa",
+    ]) == [
+        ("language_selection", NORMAL),
+        ("rooms", 'rooms'),
+        ("rooms", 'quoted'),
+        ("booking", 'booking'),
+    ]
+
+
+def test_somali_copula_is_not_a_confirmation(user):
+    # "waa" is Somali's "is", in almost any sentence; only "haa" means yes.
+    steps = walk(user, ["2", "tell me about the deluxe room", "qolku waa mid fiican"])
+    assert steps[-1][0] != "booking"
+    assert steps[-1][1] == 'rooms'
+
+
+@pytest.mark.parametrize("lang, phrase", [
+    (lang, phrase) for lang, phrases in SUGGESTION_PHRASES.items() for phrase in phrases
+])
+def test_suggested_phrases_are_understood(user, lang, phrase):
+    choice = {'en': "1", 'so': "2"}[lang]
+    assert walk(user, [choice, phrase])[-1][0] != "fallback"
@@ -0,0 +1,31 @@
+# test_entity_memory.py
+import itertools
+
+import pytest
+
+from context import context_manager
+from entity_memory import memory_for, resolve_entities
+
+_users = itertools.count()
+
+
+@pytest.fixture
+def user():
+    user_id = f"__entity_memory_test_{next(_users)}"
+    yield user_id
+    context_manager.forget_user(user_id)
+
+
+def test_lookups_store_nothing(user):
+    assert memory_for(user).latest('room_types') is None
+    resolve_entities(user, "what time is breakfast", ['room_types'])
+    assert 'entity_memory' not in context_manager.get_context(user)
+
+
+def test_a_set_slot_is_saved_and_carried_over(user):
+    resolve_entities(user, "tell me about the deluxe room", ['room_types'])
+    assert context_manager.get_context(user)['entity_memory']['room_types']
+
+    entities = resolve_entities(user, "how much is it", ['room_types'])
+    assert entities['room_types'] == [memory_for(user).latest('room_types')]
+    assert entities['carried_over'] == ['room_types']
@@ -0,0 +1,81 @@
+# test_escalation.py
+import json
+import logging
+
+import pytest
+
+from context import context_manager
+from escalation import EscalationOutbox, LogSink, MemorySink, escalation_outbox
+from handlers import handle_fallback
+from logging_setup import JsonLinesFormatter
+
+
+@pytest.fixture
+def user():
+    user_id = "__escalation_test__"
+    yield user_id
+    context_manager.forget_user(user_id)
+
+
+def test_handoff_is_delivered_with_history(user):
+    context_manager.log_interaction(user, "do you have parking", "fallback")
+    sink = MemorySink()
+    outbox = EscalationOutbox(sink=sink, enabled=True)
+
+    assert outbox.escalate(user, 'en', 'live_chat', "i want a person")
+    assert sink.wait(1)
+    event = sink.events[0]
+    assert (event['user'], event['reason'], event['message']) == (user, 'live_chat', "i want a person")
+    assert [turn['message'] for turn in event['history']] == ["do you have parking"]
+    assert outbox.drain()
+    assert outbox.snapshot()['delivered'] == 1
+
+
+def test_cooldown_suppresses_repeats(user):
+    sink = MemorySink()
+    outbox = EscalationOutbox(sink=sink, enabled=True)
+    assert outbox.escalate(user, 'en', 'fallback')
+    assert not outbox.escalate(user, 'en', 'fallback')
+    assert outbox.drain()
+    assert len(sink.events) == 1
+    assert outbox.snapshot()['suppressed'] == 1
+
+
+def test_failed_delivery_is_retried(user):
+    sink = MemorySink()
+    calls = []
+
+    def flaky(event):
+        calls.append(event)
+        if len(calls) == 1:
+            raise ConnectionError("desk unreachable")
+        sink(event)
+
+    outbox = EscalationOutbox(sink=flaky, enabled=True)
+    assert outbox.escalate(user, 'en', 'live_chat')
+    assert sink.wait(1)
+    assert outbox.drain()
+    assert outbox.snapshot()['retries'] == 1
+
+
+def test_third_fallback_escalates(user, monkeypatch):
+    sink = MemorySink()
+    monkeypatch.setattr(escalation_outbox, 'sink', sink)
+    monkeypatch.setattr(escalation_outbox, 'enabled', True)
+    monkeypatch.setattr(escalation_outbox, '_last', {})
+    for _ in range(2):
+        handle_fallback(user, 'en', "asdf")
+    assert not sink.events
+    assert "WhatsApp" in handle_fallback(user, 'en', "asdf")
+    assert sink.wait(1)
+    assert sink.events[0]['reason'] == 'fallback'
+
+
+def test_log_sink_keeps_the_log_message(caplog):
+    event = {'id': 'x', 'time': 0, 'tenant': 'default', 'user': 'u', 'lang': 'en',
+             'reason': 'live_chat', 'message': "call me on 0612345678", 'history': []}
+    with caplog.at_level(logging.WARNING, logger='jees.escalation'):
+        LogSink()(event)
+    line = json.loads(JsonLinesFormatter().format(caplog.records[-1]))
+    assert line['message'] == "escalation"
+    assert "0612345678" not in line['guest_message']
@@ -0,0 +1,73 @@
+# test_events.py
+import os
+
+from events import EventLog
+from serialization import loads
+
+
+def new_session():
+    return {'context': {}, 'profile': {'preferred_language': None, 'conversation_history': [],
+                                       'message_count': 0, 'last_interaction': 0, 'current_topic': None}}
+
+
+def write_events(log, user_id):
+    log.append(user_id, 'profile', {'preferred_language': 'so', 'state': 'normal'})
+    log.append(user_id, 'context', {'room': 'Deluxe Room'})
+    for n in range(3):
+        log.append(user_id, 'turn', [1000.0 + n, f"message {n}", 'rooms'])
+    log.append(user_id, 'archived', 1)
+
+
+def test_segment_lines_are_timestamped_events(tmp_path):
+    log = EventLog(str(tmp_path))
+    write_events(log, 'guest')
+    with open(log._segment_path(1), 'rb') as fh:
+        lines = [loads(line) for line in fh.read().splitlines()]
+    assert [line[1:3] for line in lines[:2]] == [['guest', 'profile'], ['guest', 'context']]
+    assert lines[2][3] == [1000.0, "message 0", 'rooms']
+    assert all(isinstance(line[0], float) for line in lines)
+
+
+def test_restore_replays_segments(tmp_path):
+    write_events(EventLog(str(tmp_path)), 'guest')
+    sessions, position = EventLog(str(tmp_path)).restore(new_session)
+
+    profile = sessions['guest']['profile']
+    assert profile['preferred_language'] == 'so'
+    assert [turn['message'] for turn in profile['conversation_history']] == ["message 1", "message 2"]
+    assert profile['message_count'] == 3 and profile['current_topic'] == 'rooms'
+    assert sessions['guest']['context'] == {'room': 'Deluxe Room'}
+    assert position == (1, os.path.getsize(tmp_path / 'events-000001.log'))
+
+
+def test_compaction_round_trip(tmp_path):
+    log = EventLog(str(tmp_path))
+    write_events(log, 'guest')
+    write_events(log, 'leaving')
+    before, _ = log.restore(new_session)
+
+    log.compact(new_session)
+    assert sorted(os.listdir(tmp_path)) == ['events-000002.log', 'snapshot-000001.json']
+    assert log.restore(new_session)[0] == before
+
+    # Events after the compaction land in the new segment and replay over the snapshot.
+    log.append('guest', 'cleared')
+    log.append('leaving', 'forgotten')
+    sessions, position = EventLog(str(tmp_path)).restore(new_session)
+    assert list(sessions) == ['guest']
+    assert sessions['guest']['context'] == {}
+    assert sessions['guest']['profile'] == before['guest']['profile']
+    assert position[0] == 2
+
+    # A replica still at the folded segment must restore from the snapshot.
+    assert log.tail((1, 0)) == ([], None)
+
+
+def test_torn_and_partial_lines_are_skipped(tmp_path):
+    log = EventLog(str(tmp_path))
+    write_events(log, 'guest')
+    with open(log._segment_path(1), 'ab') as fh:
+        fh.write(b'[1000.0, "guest", "tu\n[1000.0, "guest", "turn", [1')
+    events, end = log.read_segment(1)
+    assert len(events) == 6
+    assert end < os.path.getsize(log._segment_path(1))
@@ -0,0 +1,73 @@
+# test_faq.py
+import copy
+import threading
+
+from config import HOTEL_INFO, RESPONSES
+from faq import FAQIndex
+
+
+def test_answers_policy_question():
+    index = FAQIndex(HOTEL_INFO, RESPONSES)
+    assert "check-out" in index.answer("what time is check out", 'en').lower()
+
+
+def test_refresh_swaps_whole_indexes():
+    index = FAQIndex(HOTEL_INFO, RESPONSES)
+    before = index.indexes['en']
+    passages = dict(before.passages)
+    changed = copy.deepcopy(RESPONSES)
+    changed['en']['wifi'] = "The wifi password is at the front desk."
+
+    changes = index.refresh(responses=changed)
+
+    assert changes['en']['added'] == 1
+    assert index.indexes['en'] is not before
+    assert before.passages == passages      # the old index was not touched
+    assert "front desk" in index.answer("wifi password", 'en')
+
+
+def test_lookups_during_refresh():
+    index = FAQIndex(HOTEL_INFO, RESPONSES)
+    variants = []
+    for n in range(2):
+        responses = copy.deepcopy(RESPONSES)
+        responses['en']['wifi'] = f"Wifi variant {n}: ask reception for the code."
+        variants.append(responses)
+    errors = []
+    stop = threading.Event()
+
+    def refresh():
+        n = 0
+        while not stop.is_set():
+            index.refresh(responses=variants[n % 2])
+            n += 1
+
+    thread = threading.Thread(target=refresh)
+    thread.start()
+    try:
+        for _ in range(2000):
+            try:
+                assert index.search("is the wifi free", 'en') is not None
+            except Exception as e:   # e.g. "dictionary changed size during iteration"
+                errors.append(e)
+                break
+    finally:
+        stop.set()
+        thread.join()
+    assert not errors
+
+
+def test_no_answer_off_topic():
+    index = FAQIndex(HOTEL_INFO, RESPONSES)
+    assert index.answer("what is the weather like", 'en') is None
+    assert index.answer("who won the football match", 'en') is None
+
+
+def test_no_answer_on_a_single_shared_term():
+    index = FAQIndex(HOTEL_INFO, RESPONSES)
+    # Each shares one rare word with some passage, which BM25 alone scores above FAQ_MIN_SCORE.
+    assert index.answer("room availability", 'en') is None
+    assert index.answer("is wifi free", 'en') is None
+    for word in ("room", "hotel", "spa"):
+        assert index.answer(word, 'en') is None
+    assert index.answer("caawimaad", 'so') is None
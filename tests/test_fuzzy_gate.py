@@ -0,0 +1,52 @@
+# test_fuzzy_gate.py
+import random
+
+import pytest
+from rapidfuzz import fuzz
+
+import nlp
+from fuzzy_gate import SynonymGate
+from nlp import nlp_processor
+
+
+def token_sample(seed: int = 7, size: int = 400):
+    """Synonym words, typos of them (drop / swap / insert a letter) and noise."""
+    rng = random.Random(seed)
+    words = sorted({word for synonyms in nlp_processor.canonical_map.values()
+                    for synonym in synonyms for word in synonym.split()})
+    tokens = set(words)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    while len(tokens) < len(words) + size:
+        word = rng.choice(words)
+        i = rng.randrange(len(word))
+        kind = rng.randrange(4)
+        if kind == 0 and len(word) > 1:
+            tokens.add(word[:i] + word[i + 1:])
+        elif kind == 1 and i + 1 < len(word):
+            tokens.add(word[:i] + word[i + 1] + word[i] + word[i + 2:])
+        elif kind == 2:
+            tokens.add(word[:i] + rng.choice(letters) + word[i:])
+        else:
+            tokens.add("".join(rng.choice(letters) for _ in range(rng.randint(1, 12))))
+    return sorted(tokens)
+
+
+@pytest.mark.parametrize("threshold", [70, 80, 90])
+def test_gate_never_prunes_a_match(threshold):
+    gate = SynonymGate(nlp_processor.canonical_map, threshold)
+    for token in token_sample():
+        kept = {(canonical, synonym) for canonical, synonyms in gate.candidates(token)
+                for synonym in synonyms}
+        for canonical, synonyms in nlp_processor.canonical_map.items():
+            for synonym in synonyms:
+                if fuzz.WRatio(token, synonym) >= threshold:
+                    assert (canonical, synonym) in kept, (token, synonym)
+
+
+@pytest.mark.parametrize("lang", [None, 'en', 'so'])
+def test_gated_expansion_matches_ungated(lang, monkeypatch):
+    sentences = [" ".join(token_sample()[i:i + 5]) for i in range(0, 400, 5)]
+    gated = [nlp_processor.expand_to_canonical_fuzzy(text, lang) for text in sentences]
+    monkeypatch.setattr(nlp, 'FUZZY_GATE_ENABLED', False)
+    ungated = [nlp_processor.expand_to_canonical_fuzzy(text, lang) for text in sentences]
+    assert gated == ungated
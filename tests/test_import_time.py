@@ -0,0 +1,8 @@
+# test_import_time.py
+from check_import_time import check
+from config import IMPORT_FORBIDDEN_MODULES, IMPORT_TIME_BUDGET_MS
+
+
+def test_web_app_imports_within_budget():
+    # A fresh interpreter: over budget, or spaCy (etc.) imported at startup, fails.
+    assert check('jees_hotel_bot', IMPORT_TIME_BUDGET_MS, IMPORT_FORBIDDEN_MODULES, top=10)
@@ -0,0 +1,29 @@
+# test_sessions.py
+from sessions import MemorySessionStore, SQLiteSessionStore, TwoTierSessionCache
+
+
+def new_session():
+    return {'context': {}, 'profile': {'preferred_language': None}}
+
+
+def test_peek_unknown_user_caches_nothing(tmp_path):
+    for store in (MemorySessionStore(), SQLiteSessionStore(str(tmp_path / 'sessions.db'))):
+        cache = TwoTierSessionCache(store, new_session, capacity=2)
+        cache.mutate('guest-a', lambda record: record['profile'].update(preferred_language='en'))
+        cache.mutate('guest-b', lambda record: record['profile'].update(preferred_language='so'))
+
+        for n in range(10):
+            assert cache.peek(f"stranger-{n}") is None
+
+        assert cache.snapshot()['cached_sessions'] == 2
+        assert cache.peek('guest-a')['profile']['preferred_language'] == 'en'
+        assert len(store) == 2
+
+
+def test_peek_reads_store_on_local_miss(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / 'sessions.db'))
+    writer = TwoTierSessionCache(store, new_session)
+    writer.mutate('guest', lambda record: record['profile'].update(preferred_language='so'))
+    reader = TwoTierSessionCache(store, new_session)
+    assert reader.peek('guest')['profile']['preferred_language'] == 'so'
+    assert reader.snapshot()['cached_sessions'] == 0
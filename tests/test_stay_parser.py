@@ -0,0 +1,55 @@
+# test_stay_parser.py
+from datetime import date
+
+import pytest
+
+from stay_parser import nightly_rate, parse_stay
+
+TODAY = date(2026, 11, 18)   # a Wednesday
+
+
+@pytest.mark.parametrize("text, check_in, check_out, nights", [
+    ("2 nights from next friday", '2026-11-20', '2026-11-22', 2),
+    ("tomorrow for a week", '2026-11-19', '2026-11-26', 7),
+    ("in three days for 2 nights", '2026-11-21', '2026-11-23', 2),
+    ("2026-12-24 to 2026-12-26", '2026-12-24', '2026-12-26', 2),
+    # day first, as written in Somaliland
+    ("from 12/05 until 15/05", '2027-05-12', '2027-05-15', 3),
+    ("12.05.27", '2027-05-12', None, None),
+    # a bare day number closes a range opened by a full date
+    ("March 3 to 7", '2027-03-03', '2027-03-07', 4),
+    ("march 3 2027 to 7", '2027-03-03', '2027-03-07', 4),
+    # past dates without a year roll over to next year; ranges across new year
+    ("dec 30 to jan 2", '2026-12-30', '2027-01-02', 3),
+    ("the 12th of december", '2026-12-12', None, None),
+    ("December 1st, 2027", '2027-12-01', None, None),
+    # weekdays: a bare or "this" weekday may be today, "next" skips today
+    ("this wednesday", '2026-11-18', None, None),
+    ("next wednesday", '2026-11-25', None, None),
+    ("friday", '2026-11-20', None, None),
+    # weekends are Friday to Sunday
+    ("deluxe room this weekend", '2026-11-20', '2026-11-22', 2),
+    ("next weekend", '2026-11-27', '2026-11-29', 2),
+    # a length without dates
+    ("3 weeks", None, None, 21),
+    ("laba habeen", None, None, 2),
+    ("saddex habeeno", None, None, 3),
+])
+def test_parses_stay(text, check_in, check_out, nights):
+    assert parse_stay(text, TODAY) == {'check_in': check_in, 'check_out': check_out, 'nights': nights}
+
+
+@pytest.mark.parametrize("text", [
+    "do you have parking?",
+    "how much is it",
+    "room 12",            # a number is not a date
+    "31/02",              # no such day
+])
+def test_rejects_non_stays(text):
+    assert parse_stay(text, TODAY) is None
+
+
+def test_nightly_rate():
+    assert nightly_rate("$49/night") == 49.0
+    assert nightly_rate("$1,200/night") == 1200.0
+    assert nightly_rate("on request") is None
@@ -0,0 +1,57 @@
+# test_tenants.py
+import pytest
+
+from booking import LocalBookingEngine
+from context import context_manager
+from tenants import tenant_registry
+
+SEASIDE = {
+    "hosts": ["chat.seaside.test"],
+    "hotel_info": {"name": "Seaside Hotel", "rooms": [
+        {"type": "Sea View Suite", "price": "$120/night", "description": "Balcony over the bay."},
+    ]},
+}
+
+
+@pytest.fixture
+def seaside(monkeypatch):
+    monkeypatch.setattr(tenant_registry, 'definitions', {'seaside': SEASIDE})
+    monkeypatch.setattr(tenant_registry, '_by_host', {'chat.seaside.test': 'seaside'})
+    tenant = tenant_registry.get('seaside')
+    yield tenant
+    tenant_registry._compiled.pop('seaside', None)
+
+
+@pytest.fixture
+def client():
+    from jees_hotel_bot import app
+    return app.test_client()
+
+
+def test_chat_page_resets_the_tenants_session(seaside, client):
+    guest = seaside.user_id('127.0.0.1')
+    context_manager.update_profile(guest, {'preferred_language': 'so', 'state': 'normal'})
+    context_manager.update_profile('127.0.0.1', {'preferred_language': 'en', 'state': 'normal'})
+    try:
+        assert client.get('/chatbot', headers={'Host': 'chat.seaside.test'}).status_code == 200
+        assert context_manager.get_user_profile(guest)['preferred_language'] is None
+        assert context_manager.get_user_profile('127.0.0.1')['preferred_language'] == 'en'
+    finally:
+        context_manager.forget_user(guest)
+        context_manager.forget_user('127.0.0.1')
+
+
+def test_suggestions_use_the_tenants_rooms(seaside, client):
+    response = client.get('/api/suggest?q=sea%20vi&lang=en', headers={'Host': 'chat.seaside.test'})
+    assert "Sea View Suite" in response.get_json()['suggestions']
+    response = client.get('/api/suggest?q=sea%20vi&lang=en')
+    assert "Sea View Suite" not in response.get_json()['suggestions']
+
+
+def test_local_inventory_is_per_tenant(seaside):
+    engine = LocalBookingEngine()
+    default_rooms = set(engine.availability('2030-01-01', '2030-01-03'))
+    with tenant_registry.activate(seaside):
+        assert set(engine.availability('2030-01-01', '2030-01-03')) == {"Sea View Suite"}
+    assert "Sea View Suite" not in default_rooms
+    assert default_rooms == set(engine.availability('2030-01-01', '2030-01-03'))